@@ -0,0 +1,330 @@
+# benchmarks/bench_server.py
+
+# In-process benchmarks of the API's hot paths. The FastAPI app from index.py is
+# driven over ASGI (httpx.ASGITransport: no sockets, no live server) against a
+# synthetic store of each of --sizes phone numbers. Gemini is replaced by a
+# deterministic fake model, so extraction runs offline and repeatably through the real
+# pipeline (upload, job queue, streamed answer parsing, validation, extraction cache).
+# Each size runs in a fresh process in its own temporary directory, so stores and
+# peak RSS do not carry over between sizes.
+#
+#   python backend/benchmarks/bench_server.py --output bench.json
+#   python backend/benchmarks/bench_server.py --sizes 1000,10000,100000,1000000 --engine sqlite
+#   python backend/benchmarks/bench_server.py --compare bench.json   # Against an earlier run
+#
+# Reports p50/p99 latency and throughput per operation, the time to seed, save and
+# load the store, and peak RSS, as JSON (stdout, or --output) with the git revision,
+# plus a summary table on stderr.
+
+from typing import Awaitable, Callable, Dict, List, Optional
+import os
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server")
+
+# ------------------------------------------------------
+# Synthetic data
+# ------------------------------------------------------
+def synthetic_number(index: int) -> str:
+    """A distinct valid number per index (index * a prime, mod 8 * 10**9, is a bijection)."""
+    key = 2_000_000_000 + (index * 2_654_435_761) % 8_000_000_000
+    digits = str(key)
+    return f"{digits[:3]}-{digits[3:6]}-{digits[6:]}"
+
+def fake_image(numbers: List[str]) -> bytes:
+    """PNG-typed bytes with the numbers written in them as text (see FakeGeminiModel)."""
+    return b"\x89PNG\r\n\x1a\n" + " ".join(numbers).encode()
+
+class FakeGeminiModel:
+    """Stands in for the Gemini Flash-8B client: answers with the numbers written as text
+    in each uploaded image (one array, or one per image when several are sent), fenced
+    as the real model often answers, streamed in `chunk_size` character chunks after
+    `latency` seconds."""
+
+    model_name = "models/fake-gemini"
+
+    def __init__(self, latency: float = 0.0, chunk_size: int = 16):
+        self.latency = latency
+        self.chunk_size = chunk_size
+
+    def start_chat(self, history: list):
+        return _FakeChat(self, [part for part in history[0]["parts"] if isinstance(part, bytes)])
+
+class _FakeChunk:
+    def __init__(self, text: str):
+        self.text = text
+
+class _FakeChat:
+    def __init__(self, model: FakeGeminiModel, images: List[bytes]):
+        self.model = model
+        self.images = images
+
+    def send_message(self, content, stream: bool = False):
+        from gemini_utils import gemini_flash8b_find_phone_numbers
+        per_image = [gemini_flash8b_find_phone_numbers(image.decode("latin-1")) for image in self.images]
+        answer = f"```json\n{json.dumps(per_image[0] if len(per_image) == 1 else per_image)}\n```"
+        if self.model.latency:
+            time.sleep(self.model.latency)
+        size = self.model.chunk_size
+        return (_FakeChunk(answer[start:start + size]) for start in range(0, len(answer), size))
+
+def install_fake_gemini(latency: float):
+    import gemini_utils
+    import extractors
+    gemini_utils._gemini_flash8b_model = FakeGeminiModel(latency)  # Returned by the lazy provider
+    extractors.gemini_flash8b_upload_file = lambda image, mime_type=None, display_name=None: image.read()
+
+# ------------------------------------------------------
+# Measuring
+# ------------------------------------------------------
+def percentile(sorted_values: List[float], percent: float) -> float:
+    # Nearest rank
+    return sorted_values[max(0, math.ceil(percent / 100 * len(sorted_values)) - 1)]
+
+async def measure(
+    requests: int,
+    call: Callable[[int], Awaitable],
+    setup: Optional[Callable[[int], Awaitable]] = None,
+    concurrency: int = 1,
+) -> dict:
+    """Latency and throughput of `requests` calls (`concurrency` at a time). `setup(i)`
+    runs untimed before call i. Raises if a call gets an error response."""
+    latencies: List[float] = []
+    busy = 0.0
+
+    async def timed(i: int):
+        started = time.perf_counter()
+        response = await call(i)
+        latencies.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            raise RuntimeError(f"Request {i} failed with {response.status_code}: {response.text[:200]}")
+
+    for start in range(0, requests, concurrency):
+        batch = range(start, min(start + concurrency, requests))
+        if setup is not None:
+            for i in batch:
+                await setup(i)
+        started = time.perf_counter()
+        await asyncio.gather(*(timed(i) for i in batch))
+        busy += time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3),
+        "throughput_rps": round(requests / busy, 1) if busy else None,
+    }
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)  # Bytes on macOS, KB elsewhere
+
+# ------------------------------------------------------
+# One dataset size (runs in its own process, inside a temporary directory)
+# ------------------------------------------------------
+async def run_size(size: int, args: argparse.Namespace) -> dict:
+    sys.path.insert(0, os.path.abspath(SERVER_DIR))
+    import logging
+    import httpx
+    from index import app
+    from models.index import PhoneNumber
+    from database import put_phone_numbers, phone_numbers_db, phone_numbers_tombstones, storage
+    logging.getLogger().setLevel(logging.WARNING)  # The app logs every request at INFO
+    install_fake_gemini(args.model_latency)
+    rng = random.Random(args.seed)
+    result = {"size": size}
+
+    # Seed the store directly (not through the API) in one write, so the journal is
+    # checkpointed once rather than every PHONE_NUMBERS_CHECKPOINT_EVERY records; then
+    # time a full save and a load
+    started = time.perf_counter()
+    put_phone_numbers([
+        PhoneNumber(number=synthetic_number(index), has_redeem_value=index % 2 == 0, number_of_points=index % 100)
+        for index in range(size)
+    ])
+    result["seed_seconds"] = round(time.perf_counter() - started, 3)
+    started = time.perf_counter()
+    storage.save_phone_numbers(phone_numbers_db, dict(phone_numbers_tombstones))
+    result["save_seconds"] = round(time.perf_counter() - started, 3)
+    started = time.perf_counter()
+    storage.load_phone_numbers()
+    result["load_seconds"] = round(time.perf_counter() - started, 3)
+    result["store_bytes"] = sum(os.path.getsize(name) for name in os.listdir(".") if os.path.isfile(name))
+
+    ids = [str(phone_id) for phone_id in phone_numbers_db]
+    sampled = rng.sample(ids, min(len(ids), 2 * args.requests))
+    read_ids, delete_ids = sampled[:args.requests], sampled[args.requests:]
+    search_numbers = [synthetic_number(rng.randrange(size)) for _ in range(args.requests)]
+    next_index = iter(range(size, size + 10_000_000))  # Numbers not in the store yet
+    new_numbers = lambda count: [synthetic_number(next(next_index)) for _ in range(count)]
+    heavy = min(args.requests, args.heavy_requests)  # Operations over the whole store
+    concurrency = args.concurrency
+
+    operations: Dict[str, dict] = {}
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            phones, gemini = "/phone_numbers", "/gemini_flash8b"
+            png = {"content-type": "image/png"}
+            operations["get_by_id"] = await measure(
+                len(read_ids), lambda i: client.get(f"{phones}/{read_ids[i]}"), concurrency=concurrency)
+            operations["search"] = await measure(
+                args.requests, lambda i: client.get(f"{phones}/search_phone_number/{search_numbers[i]}"), concurrency=concurrency)
+            operations["get_all"] = await measure(heavy, lambda i: client.get(f"{phones}/"))
+            operations["update"] = await measure(
+                len(read_ids), lambda i: client.put(f"{phones}/{read_ids[i]}", json={"notes": f"benchmark {i}"}), concurrency=concurrency)
+            operations["upload_calculations"] = await measure(
+                heavy, lambda i: client.post(f"{phones}/upload_calculations/", params={"has_redeem_value": True, "number_of_points": i}))
+            created = new_numbers(args.requests)
+            operations["create"] = await measure(
+                args.requests, lambda i: client.post(f"{phones}/", json={"number": created[i], "has_redeem_value": True}), concurrency=concurrency)
+            durable = new_numbers(heavy)
+            operations["create_durable"] = await measure(
+                heavy, lambda i: client.post(f"{phones}/", params={"durable": True}, json={"number": durable[i], "has_redeem_value": True}))
+            operations["delete"] = await measure(
+                len(delete_ids), lambda i: client.delete(f"{phones}/{delete_ids[i]}"), concurrency=concurrency)
+
+            # Review confirmation: put numbers up for review (untimed), then confirm them
+            review = [new_numbers(args.review_numbers) for _ in range(args.requests)]
+            operations["confirm_numbers"] = await measure(
+                args.requests,
+                lambda i: client.post(f"{gemini}/confirm_numbers/"),
+                setup=lambda i: client.post(f"{gemini}/extract_text/", json={"text": " ".join(review[i])}),
+            )
+
+            # Extraction through the fake model: new images, the same image again (extraction
+            # cache), and batches packed several images per model request
+            images = [fake_image(new_numbers(3)) for _ in range(heavy)]
+            operations["extract_image"] = await measure(
+                heavy, lambda i: client.post(f"{gemini}/upload_image/", params={"wait": True}, content=images[i], headers=png), concurrency=concurrency)
+            operations["extract_image_cached"] = await measure(
+                heavy, lambda i: client.post(f"{gemini}/upload_image/", params={"wait": True}, content=images[i], headers=png), concurrency=concurrency)
+            batches = [[fake_image(new_numbers(3)) for _ in range(args.batch_images)] for _ in range(heavy)]
+            operations["extract_batch"] = await measure(
+                heavy, lambda i: client.post(f"{gemini}/upload_images/", files=[
+                    ("file", (f"{position}.png", image, "image/png")) for position, image in enumerate(batches[i])
+                ]))
+
+    result["operations"] = operations
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+# ------------------------------------------------------
+# Driver: one child process per size, results as JSON
+# ------------------------------------------------------
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], cwd=SERVER_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_size_in_child(size: int, args: argparse.Namespace, argv: List[str]) -> dict:
+    with tempfile.TemporaryDirectory(prefix=f"bench-{size}-") as directory:
+        result_file = os.path.join(directory, "result.json")
+        os.mkdir(os.path.join(directory, "data"))
+        env = dict(
+            os.environ,
+            STORAGE_ENGINE=args.engine,
+            EXTRACTOR="gemini",          # The real extractor, talking to FakeGeminiModel
+            IMAGE_PREPROCESS="false",    # Fake images are not decodable
+            GOOGLE_API_KEY=os.environ.get("GOOGLE_API_KEY") or "benchmark",
+        )
+        output = None if args.verbose else subprocess.DEVNULL
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), *argv, "--run-size", str(size), "--result-file", result_file],
+            cwd=os.path.join(directory, "data"), env=env, stdout=output, stderr=output,
+        )
+        if completed.returncode != 0 or not os.path.exists(result_file):
+            raise SystemExit(f"Benchmark for size {size} failed (exit code {completed.returncode}); rerun with --verbose.")
+        with open(result_file) as file:
+            return json.load(file)
+
+def print_summary(report: dict, baseline: Optional[dict]):
+    previous = {
+        (result["size"], name): stats
+        for result in (baseline or {}).get("results", [])
+        for name, stats in result["operations"].items()
+    }
+    for result in report["results"]:
+        print(
+            f"\n{result['size']:,} numbers: seed {result['seed_seconds']}s, save {result['save_seconds']}s, "
+            f"load {result['load_seconds']}s, store {result['store_bytes'] / 1e6:.1f} MB, peak RSS {result['peak_rss_mb']} MB",
+            file=sys.stderr,
+        )
+        print(f"  {'operation':<22}{'p50 ms':>10}{'p99 ms':>10}{'req/s':>10}" + ("  p50 vs baseline" if baseline else ""), file=sys.stderr)
+        for name, stats in result["operations"].items():
+            line = f"  {name:<22}{stats['p50_ms']:>10.2f}{stats['p99_ms']:>10.2f}{stats['throughput_rps'] or 0:>10.1f}"
+            before = previous.get((result["size"], name))
+            if before and before["p50_ms"]:
+                line += f"  {(stats['p50_ms'] / before['p50_ms'] - 1) * 100:+.0f}%"
+            print(line, file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the API in-process over ASGI.")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Comma-separated store sizes (e.g. up to 1000000)")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per operation")
+    parser.add_argument("--heavy-requests", type=int, default=5, help="Requests for whole-store operations and extraction")
+    parser.add_argument("--concurrency", type=int, default=1, help="Requests in flight at once (per-record operations)")
+    parser.add_argument("--review-numbers", type=int, default=10, help="Numbers confirmed per confirm_numbers request")
+    parser.add_argument("--batch-images", type=int, default=8, help="Images per extract_batch request")
+    parser.add_argument("--model-latency", type=float, default=0.0, help="Seconds the fake model takes per answer")
+    parser.add_argument("--engine", default="json", choices=["json", "sqlite"], help="Storage engine")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for the sampled ids and numbers")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="A previous JSON report to show the p50 change against")
+    parser.add_argument("--verbose", action="store_true", help="Show the benchmarked processes' output")
+    parser.add_argument("--run-size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_size is not None:
+        result = asyncio.run(run_size(args.run_size, args))
+        with open(args.result_file, "w") as file:
+            json.dump(result, file)
+        return
+
+    # Forward the options, minus the driver-only ones, to each child
+    argv = [
+        f"--requests={args.requests}", f"--heavy-requests={args.heavy_requests}", f"--concurrency={args.concurrency}",
+        f"--review-numbers={args.review_numbers}", f"--batch-images={args.batch_images}",
+        f"--model-latency={args.model_latency}", f"--engine={args.engine}", f"--seed={args.seed}",
+    ]
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("output", "compare", "verbose", "run_size", "result_file")},
+        "results": [],
+    }
+    for size in (int(size) for size in args.sizes.split(",")):
+        print(f"Benchmarking {size:,} numbers...", file=sys.stderr)
+        report["results"].append(run_size_in_child(size, args, argv))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+    print_summary(report, baseline)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
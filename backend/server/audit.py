@@ -0,0 +1,110 @@
+# audit.py
+
+# Append-only audit logs, one JSON object per line:
+# - the audit trail of operations that touch many records at once, so a single
+#   entry describes the whole batch
+# - the history segment holding every phone number's last_used / last_tried entries
+
+from typing import Dict, Iterator, List
+from uuid import UUID
+from datetime import datetime, timezone
+import os
+import json
+from snapshot import json_default
+from config import AUDIT_LOG_FILE
+
+def append_audit_entry(entry: dict, path: str = AUDIT_LOG_FILE) -> dict:
+    """Timestamp an entry and append it to the audit log. Returns the stored entry."""
+    entry = {"timestamp": datetime.now(timezone.utc), **entry}
+    line = json.dumps(entry, default=json_default, separators=(",", ":")) + "\n"
+    with open(path, "a") as file:
+        file.write(line)
+    return entry
+
+def read_audit_entries(path: str = AUDIT_LOG_FILE) -> Iterator[dict]:
+    """Yield audit entries oldest first, skipping a torn final line."""
+    if not os.path.exists(path):
+        return
+    with open(path, "r") as file:
+        for line in file:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+# ------------------------------------------------------
+# Per-number history segment
+# ------------------------------------------------------
+class HistorySegment:
+    """Append-only file of history entries ({"id", "timestamp", "ip", "action"}).
+
+    Nothing is read at startup. The first lookup scans the file once to index the
+    byte offsets of each number's entries; later appends extend the index, so a
+    lookup then reads only that number's lines. Each lookup also indexes whatever
+    was appended past the indexed end since (by other workers in multi-process mode).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._offsets: Dict[str, List[int]] = {}
+        self._indexed_size = 0  # Bytes of the file covered by _offsets
+
+    def append(self, entries: List[dict]):
+        if not entries:
+            return
+        with open(self.path, "a+b") as file:
+            offset = file.seek(0, os.SEEK_END)
+            lines = []
+            if offset:
+                file.seek(offset - 1)
+                if file.read(1) != b"\n":
+                    lines.append(b"\n")  # Terminate a line torn by a crash
+                    offset += 1
+            # Extend the index only if it covers the file up to here; otherwise the
+            # next lookup indexes these lines along with what it has not seen
+            indexed = offset == self._indexed_size
+            for entry in entries:
+                line = (json.dumps(entry, default=json_default, separators=(",", ":")) + "\n").encode()
+                if indexed:
+                    self._offsets.setdefault(str(entry["id"]), []).append(offset)
+                offset += len(line)
+                lines.append(line)
+            file.write(b"".join(lines))
+            if indexed:
+                self._indexed_size = offset
+
+    def _index_tail(self):
+        # Index the complete lines between the indexed end and the end of the file
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            size = 0
+        if size < self._indexed_size:  # Replaced or truncated: start over
+            self._offsets, self._indexed_size = {}, 0
+        if size == self._indexed_size:
+            return
+        with open(self.path, "rb") as file:
+            file.seek(self._indexed_size)
+            offset = self._indexed_size
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break  # Still being written (or torn); indexed once terminated
+                try:
+                    self._offsets.setdefault(json.loads(line)["id"], []).append(offset)
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    pass  # Torn or foreign line
+                offset += len(line)
+        self._indexed_size = offset
+
+    def read(self, phone_id: UUID) -> List[dict]:
+        """A phone number's entries, oldest first."""
+        self._index_tail()
+        positions = self._offsets.get(str(phone_id), [])
+        if not positions:
+            return []
+        entries = []
+        with open(self.path, "rb") as file:
+            for position in positions:
+                file.seek(position)
+                entries.append(json.loads(file.readline()))
+        return entries
@@ -20,3 +20,111 @@ GEMINI_FLASH8B_GENERATION_CONFIG = {
 # Filepaths for the JSON storage files
 PHONE_NUMBERS_JSON_FILE = "phone_numbers_db.json"
 GEMINI_TEMP_JSON_FILE = "gemini_flash8b_temp_db.json"
+
+# Storage engine behind database.py: "json" (files below) or "sqlite". A new SQLite
+# database is seeded once from the JSON files, if they hold any data
+STORAGE_ENGINE = os.environ.get("STORAGE_ENGINE", "json")
+SQLITE_DB_FILE = os.environ.get("SQLITE_DB_FILE", "blazin.db")
+
+# Phone number storage mode for the "json" engine:
+# - "journal": mutations are appended to PHONE_NUMBERS_LOG_FILE and periodically
+#   checkpointed into PHONE_NUMBERS_JSON_FILE (O(1) I/O per write)
+# - "json": every mutation rewrites PHONE_NUMBERS_JSON_FILE (legacy behavior)
+PHONE_NUMBERS_STORAGE_MODE = os.environ.get("PHONE_NUMBERS_STORAGE_MODE", "journal")
+PHONE_NUMBERS_LOG_FILE = "phone_numbers_db.log"
+# Snapshot format for the "json" engine: "binary" (memory-mapped, see snapshot.py)
+# or "json" (PHONE_NUMBERS_JSON_FILE). A missing binary snapshot is seeded from the JSON file.
+PHONE_NUMBERS_SNAPSHOT_FORMAT = os.environ.get("PHONE_NUMBERS_SNAPSHOT_FORMAT", "binary")
+PHONE_NUMBERS_SNAPSHOT_FILE = "phone_numbers_db.snap"
+# Ids of deleted phone numbers with the change sequence of their deletion (delta sync)
+PHONE_NUMBERS_TOMBSTONES_FILE = "phone_numbers_tombstones.json"
+# Number of journal records after which the log is folded into the snapshot
+PHONE_NUMBERS_CHECKPOINT_EVERY = int(os.environ.get("PHONE_NUMBERS_CHECKPOINT_EVERY", "1000"))
+# fsync the journal after every append (slower, survives power loss)
+PHONE_NUMBERS_LOG_FSYNC = os.environ.get("PHONE_NUMBERS_LOG_FSYNC", "false").lower() == "true"
+
+# Background persistence writer (group commit): pending mutations are flushed
+# together every PERSISTENCE_FLUSH_INTERVAL seconds or once
+# PERSISTENCE_FLUSH_MAX_PENDING records are waiting, whichever comes first
+PERSISTENCE_FLUSH_INTERVAL = float(os.environ.get("PERSISTENCE_FLUSH_INTERVAL", "0.05"))
+PERSISTENCE_FLUSH_MAX_PENDING = int(os.environ.get("PERSISTENCE_FLUSH_MAX_PENDING", "500"))
+# Default for the `durable` query parameter: wait for the flush that includes the change
+PERSISTENCE_DURABLE_DEFAULT = os.environ.get("PERSISTENCE_DURABLE_DEFAULT", "false").lower() == "true"
+
+# Review buffer (gemini_flash8b_temp_db): sessions expire after the TTL, and the
+# least recently used sessions are evicted beyond the entry/byte bounds
+REVIEW_SESSION_TTL_SECONDS = float(os.environ.get("REVIEW_SESSION_TTL_SECONDS", str(24 * 60 * 60)))
+REVIEW_MAX_SESSIONS = int(os.environ.get("REVIEW_MAX_SESSIONS", "10000"))
+REVIEW_MAX_BYTES = int(os.environ.get("REVIEW_MAX_BYTES", str(16 * 1024 * 1024)))
+REVIEW_SWEEP_INTERVAL = float(os.environ.get("REVIEW_SWEEP_INTERVAL", "60"))
+
+# Largest page GET /phone_numbers/ returns when `limit` is given
+PHONE_NUMBERS_MAX_PAGE_SIZE = int(os.environ.get("PHONE_NUMBERS_MAX_PAGE_SIZE", "1000"))
+
+# Most items POST /phone_numbers/batch accepts in one request
+PHONE_NUMBERS_MAX_BATCH_SIZE = int(os.environ.get("PHONE_NUMBERS_MAX_BATCH_SIZE", "10000"))
+
+# Append-only audit trail of bulk operations (JSON lines, see audit.py)
+AUDIT_LOG_FILE = os.environ.get("AUDIT_LOG_FILE", "phone_numbers_audit.log")
+
+# Number usage rules enforced by GET /phone_numbers/suggest (0 disables a limit)
+PHONE_NUMBER_MAX_USES_PER_DAY = int(os.environ.get("PHONE_NUMBER_MAX_USES_PER_DAY", "2"))
+PHONE_NUMBER_MAX_USES_PER_WEEK = int(os.environ.get("PHONE_NUMBER_MAX_USES_PER_WEEK", "0"))
+# How long POST /phone_numbers/suggest/reserve hides a number from other clients
+PHONE_NUMBER_RESERVATION_SECONDS = float(os.environ.get("PHONE_NUMBER_RESERVATION_SECONDS", "600"))
+# Append-only per-number history segment (last_used / last_tried entries), read by
+# GET /phone_numbers/{id}/history instead of being embedded in every record
+PHONE_NUMBERS_HISTORY_FILE = os.environ.get("PHONE_NUMBERS_HISTORY_FILE", "phone_numbers_history.log")
+
+# Multi-process mode (see serve.py): workers share the SQLite database and refresh
+# their in-memory copies from it. Enabled automatically when SERVER_WORKERS > 1.
+SERVER_WORKERS = int(os.environ.get("SERVER_WORKERS", "1"))
+SHARED_STORAGE = os.environ.get("SHARED_STORAGE", "false").lower() in ("1", "true", "yes") or SERVER_WORKERS > 1
+
+# Image uploads (POST /gemini_flash8b/upload_image/): request body limit, and how much
+# of an upload is buffered in memory before it spills to a temporary file
+UPLOAD_IMAGE_MAX_BYTES = int(os.environ.get("UPLOAD_IMAGE_MAX_BYTES", str(20 * 1024 * 1024)))
+UPLOAD_IMAGE_SPOOL_BYTES = int(os.environ.get("UPLOAD_IMAGE_SPOOL_BYTES", str(8 * 1024 * 1024)))
+
+# Extraction result cache: validated numbers per image (sha256 of the bytes plus the
+# model and prompt), least recently used first out. An empty file name keeps it in memory only.
+EXTRACTION_CACHE_MAX_ENTRIES = int(os.environ.get("EXTRACTION_CACHE_MAX_ENTRIES", "1000"))
+EXTRACTION_CACHE_FILE = os.environ.get("EXTRACTION_CACHE_FILE", "gemini_flash8b_extraction_cache.json")
+
+# Most characters POST /gemini_flash8b/extract_text/ scans per request (all documents)
+EXTRACT_TEXT_MAX_CHARS = int(os.environ.get("EXTRACT_TEXT_MAX_CHARS", "1000000"))
+
+# Extraction job queue (image uploads, see extraction_jobs.py). EXTRACTOR picks the
+# extractor: "gemini" or "fake" (local stand-in for tests and benchmarks, reads numbers
+# written as text in the image bytes after FAKE_EXTRACTOR_DELAY seconds). A bounded pool
+# of workers runs jobs with a per-attempt timeout and exponential backoff between
+# attempts; beyond EXTRACTION_MAX_PENDING waiting or running jobs, uploads get 503.
+# Finished jobs stay readable at GET /gemini_flash8b/jobs/{id} for the TTL.
+EXTRACTOR = os.environ.get("EXTRACTOR", "gemini")
+FAKE_EXTRACTOR_DELAY = float(os.environ.get("FAKE_EXTRACTOR_DELAY", "0"))
+EXTRACTION_WORKERS = int(os.environ.get("EXTRACTION_WORKERS", "4"))
+EXTRACTION_MAX_PENDING = int(os.environ.get("EXTRACTION_MAX_PENDING", "32"))
+EXTRACTION_TIMEOUT = float(os.environ.get("EXTRACTION_TIMEOUT", "60"))
+EXTRACTION_MAX_ATTEMPTS = int(os.environ.get("EXTRACTION_MAX_ATTEMPTS", "3"))
+EXTRACTION_RETRY_BACKOFF = float(os.environ.get("EXTRACTION_RETRY_BACKOFF", "1"))
+EXTRACTION_JOB_TTL_SECONDS = float(os.environ.get("EXTRACTION_JOB_TTL_SECONDS", "3600"))
+# Create the extractor's model client in the background at startup instead of on the
+# first extraction (the Gemini SDK takes about a second to import)
+EXTRACTOR_WARMUP = os.environ.get("EXTRACTOR_WARMUP", "false").lower() in ("1", "true", "yes")
+
+# Batch image uploads (POST /gemini_flash8b/upload_images/): most images per request,
+# whole body limit, and how many images are packed into one model request. Packs run
+# concurrently on the extraction workers (EXTRACTION_WORKERS bounds the parallelism).
+EXTRACTION_BATCH_MAX_IMAGES = int(os.environ.get("EXTRACTION_BATCH_MAX_IMAGES", "20"))
+UPLOAD_IMAGES_MAX_BYTES = int(os.environ.get("UPLOAD_IMAGES_MAX_BYTES", str(100 * 1024 * 1024)))
+EXTRACTION_PACK_SIZE = int(os.environ.get("EXTRACTION_PACK_SIZE", "4"))
+
+# Image preprocessing before upload (see preprocessing.py; needs Pillow, listed in
+# requirements.txt; without it images are uploaded as received): EXIF orientation, downscale to IMAGE_MAX_EDGE
+# pixels on the longer side, grayscale with autocontrast, JPEG at IMAGE_JPEG_QUALITY,
+# in IMAGE_PREPROCESS_PROCESSES worker processes. The original is kept if smaller.
+IMAGE_PREPROCESS = os.environ.get("IMAGE_PREPROCESS", "true").lower() in ("1", "true", "yes")
+IMAGE_MAX_EDGE = int(os.environ.get("IMAGE_MAX_EDGE", "1600"))
+IMAGE_GRAYSCALE = os.environ.get("IMAGE_GRAYSCALE", "true").lower() in ("1", "true", "yes")
+IMAGE_JPEG_QUALITY = int(os.environ.get("IMAGE_JPEG_QUALITY", "80"))
+IMAGE_PREPROCESS_PROCESSES = int(os.environ.get("IMAGE_PREPROCESS_PROCESSES", "2"))
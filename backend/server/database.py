@@ -1,55 +1,454 @@
 # database.py
 
-from typing import Dict, List
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from collections import OrderedDict
+from contextlib import contextmanager
 from uuid import UUID
-import os
+from bisect import bisect_right
 import json
+import time
 from models.index import PhoneNumber
+from models.phone_normalizer import phone_number_key, phone_number_key_area_code
+from config import (
+    STORAGE_ENGINE,
+    PERSISTENCE_FLUSH_INTERVAL,
+    PERSISTENCE_FLUSH_MAX_PENDING,
+    REVIEW_SESSION_TTL_SECONDS,
+    REVIEW_MAX_SESSIONS,
+    REVIEW_MAX_BYTES,
+    PHONE_NUMBER_MAX_USES_PER_DAY,
+    PHONE_NUMBER_MAX_USES_PER_WEEK,
+    PHONE_NUMBERS_HISTORY_FILE,
+    SHARED_STORAGE,
+    EXTRACTION_CACHE_MAX_ENTRIES,
+    EXTRACTION_CACHE_FILE,
+)
+from storage import create_storage
+from snapshot import raw_phone_number_records
+from persistence import PersistenceWriter
+from review_store import ReviewStore
+from audit import HistorySegment
+from extraction_cache import ExtractionCache
+from suggestions import SuggestionQueue
 
 # ------------------------------------------------------
-# Filepaths for the JSON storage files
+# Storage engine (selected by config.STORAGE_ENGINE, see storage.py)
 # ------------------------------------------------------
-PHONE_NUMBERS_JSON_FILE = "phone_numbers_db.json"
-GEMINI_TEMP_JSON_FILE = "gemini_flash8b_temp_db.json"
+storage = create_storage(STORAGE_ENGINE, lambda: phone_numbers_db, lambda: phone_numbers_tombstones)
+if SHARED_STORAGE and not hasattr(storage, "exclusive"):
+    raise RuntimeError("Multi-process mode (SERVER_WORKERS > 1 or SHARED_STORAGE) requires STORAGE_ENGINE=sqlite.")
+
+# Group-commit writer; started by the FastAPI lifespan. Until it runs (scripts,
+# tests importing this module) every save below writes synchronously.
+persistence_writer = PersistenceWriter(
+    storage,
+    lambda: phone_numbers_db,
+    lambda: phone_numbers_tombstones,
+    lambda: gemini_flash8b_temp_db,
+    PERSISTENCE_FLUSH_INTERVAL,
+    PERSISTENCE_FLUSH_MAX_PENDING,
+    lambda: gemini_flash8b_extraction_cache,
+)
 
 # ------------------------------------------------------
-# Load data from JSON files if they exist
+# Load data from storage
 # ------------------------------------------------------
 def load_phone_numbers_from_file() -> Dict[UUID, PhoneNumber]:
-    if os.path.exists(PHONE_NUMBERS_JSON_FILE):
-        with open(PHONE_NUMBERS_JSON_FILE, "r") as file:
-            try:
-                data = json.load(file)
-                # Convert back into proper UUID and datetime objects
-                return {UUID(k): PhoneNumber(**v) for k, v in data.items()}
-            except json.JSONDecodeError:
-                return {}
-    return {}
+    return storage.load_phone_numbers()
+
+def load_tombstones_from_file() -> Dict[UUID, int]:
+    return storage.load_tombstones()  # {deleted phone number id: change_seq}
 
 def load_gemini_temp_from_file() -> Dict[str, List[str]]:
-    if os.path.exists(GEMINI_TEMP_JSON_FILE):
-        with open(GEMINI_TEMP_JSON_FILE, "r") as file:
-            try:
-                data = json.load(file)
-                return data  # {ip_address: [phone_numbers]}
-            except json.JSONDecodeError:
-                return {}
-    return {}
+    return storage.load_gemini_temp()  # {ip_address: [phone_numbers]}
 
 # ------------------------------------------------------
-# Save data to JSON files
+# Save data to storage
 # ------------------------------------------------------
 def save_phone_numbers_to_file(phone_db: Dict[UUID, PhoneNumber]):
-    with open(PHONE_NUMBERS_JSON_FILE, "w") as file:
-        # Convert UUID keys to strings for JSON compatibility
-        json.dump({str(k): {**v.dict(), "id": str(v.id)} for k, v in phone_db.items()}, file, indent=4)
+    if persistence_writer.running:
+        persistence_writer.enqueue_full_save()
+    else:
+        storage.save_phone_numbers(phone_db, dict(phone_numbers_tombstones))
+
+def save_gemini_temp_to_file(gemini_temp_db: ReviewStore):
+    if persistence_writer.running:
+        persistence_writer.enqueue_gemini_temp_save()
+    else:
+        storage.save_gemini_temp(gemini_temp_db.copy())
+
+def save_extraction_cache(cache: ExtractionCache):
+    if persistence_writer.running:
+        persistence_writer.enqueue_extraction_cache_save()  # Written by the next flush, off the event loop
+    else:
+        cache.save()
+
+# ------------------------------------------------------
+# Persist single-record mutations (journal append, row upsert, or full rewrite)
+# ------------------------------------------------------
+def persist_phone_number(phone: PhoneNumber):
+    """Persist a created or updated phone number."""
+    if persistence_writer.running:
+        persistence_writer.enqueue_put(phone)
+    else:
+        storage.put_phone_number(phone)
+
+def persist_phone_numbers(phones: List[PhoneNumber]):
+    """Persist many created or updated phone numbers as a single write."""
+    if persistence_writer.running:
+        for phone in phones:
+            persistence_writer.enqueue_put(phone)  # Enqueued together, flushed as one batch
+    else:
+        storage.apply_phone_number_changes(phones, [])
+
+def persist_phone_number_deletion(phone_id: UUID, change_seq: int):
+    """Persist the removal of a phone number (and its tombstone)."""
+    if persistence_writer.running:
+        persistence_writer.enqueue_delete(phone_id, change_seq)
+    else:
+        storage.delete_phone_number(phone_id, change_seq)
+
+async def wait_for_persistence(durable: bool):
+    """When `durable`, wait for the background flush that includes the caller's changes."""
+    if durable and persistence_writer.running:
+        await persistence_writer.wait_for_flush()
+
+# ------------------------------------------------------
+# Secondary indexes: number key (phone_number_key, an int) -> phone number UUID,
+# and area code -> the UUIDs of its numbers
+# ------------------------------------------------------
+def _index_phone_number(number: str, phone_id: UUID):
+    key = phone_number_key(number)
+    if key is not None:  # Stored numbers are validated; anything else cannot be looked up
+        phone_numbers_index[key] = phone_id
+        phone_numbers_by_area.setdefault(phone_number_key_area_code(key), set()).add(phone_id)
+
+def _unindex_phone_number(number: str):
+    key = phone_number_key(number)
+    phone_id = phone_numbers_index.pop(key, None)
+    if phone_id is None:
+        return
+    area_code = phone_number_key_area_code(key)
+    area = phone_numbers_by_area.get(area_code)
+    if area is not None:
+        area.discard(phone_id)
+        if not area:
+            del phone_numbers_by_area[area_code]
+
+def rebuild_phone_numbers_index():
+    phone_numbers_index.clear()
+    phone_numbers_by_area.clear()
+    # numbers() reads the stored number without hydrating the record
+    for phone_id, number in phone_numbers_db.numbers():
+        _index_phone_number(number, phone_id)
 
-def save_gemini_temp_to_file(gemini_temp_db: Dict[str, List[str]]):
-    with open(GEMINI_TEMP_JSON_FILE, "w") as file:
-        json.dump(gemini_temp_db, file, indent=4)
+def find_phone_number_id(number: str) -> Optional[UUID]:
+    """O(1) lookup of the UUID stored for a number (in any format), if any."""
+    key = phone_number_key(number)
+    return phone_numbers_index.get(key) if key is not None else None
+
+def iter_phone_number_ids_in_area(area_code: str) -> Iterator[UUID]:
+    """Ids of the numbers in an area code, from the area index (no scan, no hydration)."""
+    return iter(list(phone_numbers_by_area.get(area_code, ())))
+
+# ------------------------------------------------------
+# Ordered view for cursor pagination: ids sorted by UUID value
+# ------------------------------------------------------
+# Built on the first paginated read, then maintained incrementally on insert/delete.
+_sorted_phone_ids: Optional[List[int]] = None
+
+def iter_phone_numbers_after(cursor: Optional[UUID]) -> Iterator[PhoneNumber]:
+    """Yield phone numbers in UUID order, starting after `cursor` (keyset pagination)."""
+    global _sorted_phone_ids
+    if _sorted_phone_ids is None:
+        _sorted_phone_ids = sorted(phone_id.int for phone_id in phone_numbers_db)
+    start = bisect_right(_sorted_phone_ids, cursor.int) if cursor is not None else 0
+    for position in range(start, len(_sorted_phone_ids)):
+        phone = phone_numbers_db.get(UUID(int=_sorted_phone_ids[position]))
+        if phone is not None:
+            yield phone
+
+def _track_sorted_id(phone_id: UUID, present: bool):
+    if _sorted_phone_ids is None:
+        return
+    position = bisect_right(_sorted_phone_ids, phone_id.int)
+    exists = position > 0 and _sorted_phone_ids[position - 1] == phone_id.int
+    if present and not exists:
+        _sorted_phone_ids.insert(position, phone_id.int)
+    elif not present and exists:
+        del _sorted_phone_ids[position - 1]
 
 # ------------------------------------------------------
-# In-memory storage, backed by JSON files
+# Pre-encoded JSON for the read routes
+# ------------------------------------------------------
+# Records are read far more often than they change, so each record's JSON bytes are
+# kept until it is replaced or removed, and the assembled full-list body until the
+# next change sequence. Bytes come from pydantic's JSON encoder, the same output as
+# the routes' response_model. Entries remember the model they were encoded from, so
+# a record swapped in any other way is simply re-encoded.
+_encoded_phone_numbers: Dict[UUID, Tuple[PhoneNumber, bytes]] = {}
+_encoded_phone_numbers_list: Optional[Tuple[int, bytes]] = None
+
+def encoded_phone_number(phone: PhoneNumber) -> bytes:
+    """JSON bytes of a stored record, encoded once per change."""
+    cached = _encoded_phone_numbers.get(phone.id)
+    if cached is not None and cached[0] is phone:
+        return cached[1]
+    encoded = phone.json().encode()
+    _encoded_phone_numbers[phone.id] = (phone, encoded)
+    return encoded
+
+def encoded_phone_numbers_list() -> bytes:
+    """JSON array of every record (GET /phone_numbers/), rebuilt only after a change."""
+    global _encoded_phone_numbers_list
+    change_seq = current_change_seq()
+    if _encoded_phone_numbers_list is None or _encoded_phone_numbers_list[0] != change_seq:
+        body = b"[" + b",".join(encoded_phone_number(phone) for phone in phone_numbers_db.values()) + b"]"
+        _encoded_phone_numbers_list = (change_seq, body)
+    return _encoded_phone_numbers_list[1]
+
+# ------------------------------------------------------
+# Change sequence for delta sync
+# ------------------------------------------------------
+# Every insert, update and delete takes the next store-wide sequence number. Records
+# carry theirs in `change_seq`; deletions leave a tombstone {id: change_seq}.
+# `_changes_by_seq` orders ids by their latest change so `changes since N` only walks
+# the tail; it is built on the first delta request, then kept up to date.
+_changes_by_seq: "Optional[OrderedDict[UUID, int]]" = None
+
+def _load_change_seqs() -> Iterator[Tuple[UUID, int]]:
+    if hasattr(phone_numbers_db, "change_seqs"):
+        yield from phone_numbers_db.change_seqs()
+    else:
+        for phone_id, phone in phone_numbers_db.items():
+            yield phone_id, phone.change_seq
+    yield from phone_numbers_tombstones.items()
+
+def current_change_seq() -> int:
+    return phone_numbers_change_seq
+
+def _record_change(phone_id: UUID, change_seq: int):
+    global phone_numbers_change_seq
+    phone_numbers_change_seq = max(phone_numbers_change_seq, change_seq)
+    if _changes_by_seq is not None:
+        _changes_by_seq[phone_id] = change_seq
+        _changes_by_seq.move_to_end(phone_id)
+
+def _next_change_seq(phone_id: UUID) -> int:
+    change_seq = phone_numbers_change_seq + 1
+    _record_change(phone_id, change_seq)
+    return change_seq
+
+def stamp_phone_number_change(phone: PhoneNumber):
+    """Give a record the next change sequence and version (call before storing it)."""
+    phone.change_seq = _next_change_seq(phone.id)
+    phone.version += 1
+    phone_numbers_tombstones.pop(phone.id, None)
+
+def phone_number_changes_since(since: int) -> List[Tuple[UUID, int]]:
+    """(id, change_seq) of records and tombstones changed after `since`, oldest first."""
+    global _changes_by_seq
+    if _changes_by_seq is None:
+        _changes_by_seq = OrderedDict(sorted(_load_change_seqs(), key=lambda item: item[1]))
+    changes = []
+    for phone_id, change_seq in reversed(_changes_by_seq.items()):
+        if change_seq <= since:
+            break
+        changes.append((phone_id, change_seq))
+    changes.reverse()
+    return changes
+
+# ------------------------------------------------------
+# Suggestions: eligible numbers under the usage rules (see suggestions.py)
+# ------------------------------------------------------
+# Built on the first suggestion request, then updated on every put/remove.
+_suggestion_queue: Optional[SuggestionQueue] = None
+
+def _get_suggestion_queue() -> SuggestionQueue:
+    global _suggestion_queue
+    if _suggestion_queue is None:
+        queue = SuggestionQueue([
+            (PHONE_NUMBER_MAX_USES_PER_DAY, 1),
+            (PHONE_NUMBER_MAX_USES_PER_WEEK, 7),
+        ])
+        now = time.time()
+        for phone in phone_numbers_db.values():
+            queue.update(phone, now)
+        if SHARED_STORAGE:
+            _load_reservations(queue)
+        _suggestion_queue = queue
+    return _suggestion_queue
+
+def _load_reservations(queue: SuggestionQueue):
+    now = time.time()
+    for phone_id, reserved_until in storage.load_reservations(now).items():
+        queue.hold(phone_id, reserved_until, now)
+
+def suggest_phone_numbers(limit: int) -> List[PhoneNumber]:
+    """Best eligible phone numbers right now, without reserving them."""
+    return [phone_numbers_db[phone_id] for phone_id in _get_suggestion_queue().peek(limit, time.time())]
+
+def reserve_phone_numbers(limit: int, seconds: float) -> Tuple[List[PhoneNumber], float]:
+    """Take the best eligible numbers and hide them from other clients for `seconds`.
+    Runs without awaiting, so concurrent requests never receive the same number."""
+    with storage_transaction():
+        now = time.time()
+        until = now + seconds
+        phone_ids = _get_suggestion_queue().reserve(limit, now, until)
+        if SHARED_STORAGE and phone_ids:
+            storage.save_reservations({phone_id: until for phone_id in phone_ids}, now)
+    return [phone_numbers_db[phone_id] for phone_id in phone_ids], until
+
+# ------------------------------------------------------
+# Mutations: keep the dict, the indexes and the storage in step
+# ------------------------------------------------------
+def _store_phone_number(phone: PhoneNumber):
+    stamp_phone_number_change(phone)
+    _place_phone_number(phone)
+
+def _place_phone_number(phone: PhoneNumber):
+    # Update the dict and every index; stamping and persistence are up to the caller
+    previous = phone_numbers_db.get(phone.id)
+    if previous is None:
+        _track_sorted_id(phone.id, present=True)
+    elif previous.number != phone.number:
+        _unindex_phone_number(previous.number)
+    phone_numbers_db[phone.id] = phone
+    _index_phone_number(phone.number, phone.id)
+    _encoded_phone_numbers.pop(phone.id, None)
+    if _suggestion_queue is not None:
+        _suggestion_queue.update(phone, time.time())
+
+def put_phone_number(phone: PhoneNumber):
+    """Insert or replace a phone number, stamp its change sequence and persist it."""
+    _store_phone_number(phone)
+    persist_phone_number(phone)
+
+def put_phone_numbers(phones: List[PhoneNumber]):
+    """Insert or replace many phone numbers in one step and persist them in one write."""
+    for phone in phones:
+        _store_phone_number(phone)
+    persist_phone_numbers(phones)
+
+def _drop_phone_number(phone_id: UUID) -> Optional[PhoneNumber]:
+    # Remove from the dict and every index; tombstone and persistence are up to the caller
+    phone = phone_numbers_db.pop(phone_id, None)
+    if phone is None:
+        return None
+    _unindex_phone_number(phone.number)
+    _track_sorted_id(phone_id, present=False)
+    _encoded_phone_numbers.pop(phone_id, None)
+    if _suggestion_queue is not None:
+        _suggestion_queue.remove(phone_id)
+    return phone
+
+def remove_phone_number(phone_id: UUID) -> Optional[PhoneNumber]:
+    """Remove a phone number and persist the deletion. Returns the removed record."""
+    phone = _drop_phone_number(phone_id)
+    if phone is None:
+        return None
+    change_seq = _next_change_seq(phone_id)
+    phone_numbers_tombstones[phone_id] = change_seq
+    persist_phone_number_deletion(phone_id, change_seq)
+    return phone
+
+# ------------------------------------------------------
+# Multi-process mode (config.SHARED_STORAGE, SQLite engine only)
+# ------------------------------------------------------
+# Each worker keeps its own in-memory copy. Writes run inside storage_transaction(),
+# which holds SQLite's cross-process write lock, first applies what other workers
+# committed, and commits the storage writes made inside it. Change sequences are
+# assigned under that lock, so committed changes always form a prefix 1..N and a
+# worker catches up by reading rows with change_seq above its own. Reads catch up
+# per request (middleware in index.py), querying only when PRAGMA data_version
+# shows another process committed. Outside multi-process mode these are no-ops.
+_synced_data_version: Optional[int] = None
+_synced_meta: Dict[str, int] = {}
+_transaction_depth = 0
+
+def sync_from_storage():
+    """Apply changes committed by other workers since the last sync."""
+    global _synced_data_version, _synced_meta
+    if not SHARED_STORAGE:
+        return
+    data_version = storage.data_version()
+    if data_version == _synced_data_version:
+        return
+    for change_seq, phone_id, data in storage.load_changes_since(phone_numbers_change_seq):
+        if data is None:
+            _drop_phone_number(phone_id)
+            phone_numbers_tombstones[phone_id] = change_seq
+        else:
+            phone_numbers_tombstones.pop(phone_id, None)
+            _place_phone_number(PhoneNumber(**json.loads(data)))
+        _record_change(phone_id, change_seq)
+    meta = storage.load_meta()
+    if meta.get("gemini_temp") != _synced_meta.get("gemini_temp"):
+        gemini_flash8b_temp_db.reload(storage.load_gemini_temp())
+    if meta.get("reservations") != _synced_meta.get("reservations") and _suggestion_queue is not None:
+        _load_reservations(_suggestion_queue)
+    _synced_meta = meta
+    _synced_data_version = data_version
+
+@contextmanager
+def storage_transaction():
+    """Run a read-modify-write atomically across workers (no awaits inside)."""
+    global _transaction_depth
+    if not SHARED_STORAGE or _transaction_depth:
+        yield
+        return
+    with storage.exclusive():
+        _transaction_depth += 1
+        try:
+            sync_from_storage()
+            yield
+        finally:
+            _transaction_depth -= 1
+
+# ------------------------------------------------------
+# In-memory storage, backed by the storage engine
 # ------------------------------------------------------
 phone_numbers_db = load_phone_numbers_from_file()
-gemini_flash8b_temp_db = load_gemini_temp_from_file()
+phone_numbers_index: Dict[int, UUID] = {}
+phone_numbers_by_area: Dict[str, Set[UUID]] = {}
+rebuild_phone_numbers_index()
+phone_numbers_tombstones: Dict[UUID, int] = {
+    phone_id: change_seq
+    for phone_id, change_seq in load_tombstones_from_file().items()
+    if phone_id not in phone_numbers_db
+}
+phone_numbers_change_seq = max((change_seq for _, change_seq in _load_change_seqs()), default=0)
+# last_used / last_tried history, read on demand (GET /phone_numbers/{id}/history)
+phone_numbers_history = HistorySegment(PHONE_NUMBERS_HISTORY_FILE)
+# Review sessions restored from storage start a fresh TTL
+gemini_flash8b_temp_db = ReviewStore(REVIEW_SESSION_TTL_SECONDS, REVIEW_MAX_SESSIONS, REVIEW_MAX_BYTES)
+gemini_flash8b_temp_db.update(load_gemini_temp_from_file())
+# Extraction results per image hash, so re-uploaded images skip Gemini
+gemini_flash8b_extraction_cache = ExtractionCache(EXTRACTION_CACHE_MAX_ENTRIES, EXTRACTION_CACHE_FILE or None)
+gemini_flash8b_extraction_cache.load()
+
+# ------------------------------------------------------
+# One-time migration of legacy embedded history
+# ------------------------------------------------------
+# Records saved before the history segment existed carry last_used_history /
+# last_tried_history. They are moved to the segment once, here, and the records
+# rewritten without them (the fields are never serialized), so nothing else reads them.
+def migrate_legacy_history() -> int:
+    """Move embedded history to the history segment. Returns the records migrated."""
+    migrated, entries = [], []
+    for phone_id, _, _, payload in raw_phone_number_records(phone_numbers_db):
+        if b"_history" not in payload:
+            continue  # Checked on the raw bytes, so clean records are not hydrated
+        phone = phone_numbers_db[phone_id]
+        if not (phone.last_used_history or phone.last_tried_history):
+            continue
+        entries += [{"id": str(phone_id), **entry} for entry in phone.last_used_history + phone.last_tried_history]
+        migrated.append(phone.copy(update={"last_used_history": [], "last_tried_history": []}))
+    if migrated:
+        # Append first: a crash before the rewrite repeats entries instead of losing them
+        phone_numbers_history.append(entries)
+        put_phone_numbers(migrated)  # New change sequences, so other workers sync the rewrite
+    return len(migrated)
+
+with storage_transaction():
+    migrate_legacy_history()
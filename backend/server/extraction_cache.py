@@ -0,0 +1,107 @@
+# extraction_cache.py
+
+# Content-addressed cache of Gemini extraction results. Re-uploading the same image
+# (same bytes, same model and prompt) returns the validated numbers from the cache
+# instead of another upload and chat round trip.
+
+from collections import OrderedDict
+from typing import Dict, IO, List, Optional
+import os
+import json
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+_HASH_CHUNK_BYTES = 1024 * 1024
+
+def extraction_cache_key(image: IO[bytes], fingerprint: str) -> str:
+    """sha256 of the extraction fingerprint (model, config, prompt) and the image bytes.
+
+    Reads the image in chunks from the start and rewinds it afterwards.
+    """
+    digest = hashlib.sha256(fingerprint.encode())
+    digest.update(b"\0")
+    image.seek(0)
+    for chunk in iter(lambda: image.read(_HASH_CHUNK_BYTES), b""):
+        digest.update(chunk)
+    image.seek(0)
+    return digest.hexdigest()
+
+class ExtractionCache:
+    """LRU map of cache key -> validated phone numbers, bounded by entry count.
+
+    With a `path`, entries are loaded from and saved to a JSON file (least
+    recently used first) so hits survive restarts. Counters are per process.
+    """
+
+    def __init__(self, max_entries: int, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.path = path
+        self._entries: "OrderedDict[str, List[str]]" = OrderedDict()  # Least recently used first
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[List[str]]:
+        numbers = self._entries.get(key)
+        if numbers is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return list(numbers)
+
+    def put(self, key: str, numbers: List[str]):
+        self._entries[key] = list(numbers)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+    # ------------------------------------------------------
+    # Optional persistence (JSON file)
+    # ------------------------------------------------------
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as file:
+                entries = json.load(file)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable extraction cache {self.path}: {e}")
+            return
+        for key, numbers in entries.items():
+            self.put(key, numbers)
+
+    def save(self):
+        """Write the entries to `path` (atomically; a no-op without a path)."""
+        self.write(self.snapshot())
+
+    def snapshot(self) -> Dict[str, List[str]]:
+        """Copy of the entries, least recently used first, for write()."""
+        return dict(self._entries)
+
+    def write(self, entries: Dict[str, List[str]]):
+        """Write a snapshot to `path`. Touches nothing else, so it can run in a
+        worker thread while the cache keeps changing (see persistence.py)."""
+        if not self.path:
+            return
+        temp_path = f"{self.path}.{os.getpid()}.tmp"  # Workers may save concurrently
+        with open(temp_path, "w") as file:
+            json.dump(entries, file)
+        os.replace(temp_path, self.path)
@@ -0,0 +1,306 @@
+# extraction_jobs.py
+
+# Image extraction as background jobs. Uploads enqueue a job and return (or wait
+# for it); a bounded pool of worker tasks runs the blocking extractor on a thread
+# pool of its own (one thread per worker), so a slow Gemini call never stalls the
+# event loop nor the default executor other I/O (persistence) runs on. Each attempt
+# has a timeout; failed attempts are retried with exponential backoff. A job holds one image, or a
+# pack of images the extractor answers in one model request (batch uploads).
+# Images are preprocessed (downscaled, see preprocessing.py) once, before the first attempt.
+# Single-image jobs stream: numbers are published on the job as the extractor finds them.
+# A job owns its image files (e.g. the spooled upload) and closes them when it finishes.
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import IO, AsyncIterator, Callable, List, Optional, Tuple
+from uuid import uuid4
+import time
+import asyncio
+import logging
+from extractors import Extractor, ExtractorImage
+from preprocessing import ImagePreprocessor
+
+logger = logging.getLogger(__name__)
+
+class ExtractionQueueFull(Exception):
+    """Raised by submit() when EXTRACTION_MAX_PENDING jobs are already waiting or running."""
+
+# (image file, mime_type, file_name)
+JobImage = Tuple[IO[bytes], str, Optional[str]]
+
+class ExtractionJob:
+    """Extraction of one or more images: queued -> running (-> retrying -> running ...)
+    -> succeeded | failed. `results` has the numbers per image, `numbers` all of them
+    without repeats; `found` grows while the job runs (see follow())."""
+
+    def __init__(self, client_ip: str, images: List[JobImage], cache_keys: List[str], on_success: Callable[["ExtractionJob"], None]):
+        self.id = uuid4().hex
+        self.client_ip = client_ip
+        self.images = images  # Closed once the job finishes
+        self.cache_keys = cache_keys
+        self.on_success = on_success
+        self.status = "queued"
+        self.attempts = 0
+        self.preprocessed = False
+        self.results: List[List[str]] = []
+        self.numbers: List[str] = []
+        self.found: List[str] = []  # Numbers found so far, by any attempt
+        self.error: Optional[str] = None
+        self.cached = False
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._done = asyncio.Event()
+        self._changed = asyncio.Event()  # Set (and replaced) on every found number and on finishing
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    async def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait until the job finishes (at most `timeout` seconds). Returns whether it has."""
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.finished
+
+    async def follow(self) -> AsyncIterator[str]:
+        """Yields the numbers found, each as soon as it is (and those found before the
+        call first), until the job finishes."""
+        sent = 0
+        while True:
+            changed = self._changed  # Taken before looking, so no change is missed
+            while sent < len(self.found):
+                sent += 1
+                yield self.found[sent - 1]
+            if self.finished:
+                return
+            await changed.wait()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _found(self, numbers: List[str]):
+        new_numbers = [number for number in numbers if number not in self.found]
+        if new_numbers and not self.finished:
+            self.found.extend(new_numbers)
+            self._notify()
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "attempts": self.attempts,
+            "images": len(self.cache_keys),
+            "cached": self.cached,
+            "numbers": self.numbers,
+            "error": self.error,
+            "created_at": datetime.fromtimestamp(self.created_at, timezone.utc),
+            "finished_at": datetime.fromtimestamp(self.finished_at, timezone.utc) if self.finished_at else None,
+        }
+
+class ExtractionQueue:
+    """Bounded pool of workers running extraction jobs.
+
+    A job's `on_success(job)` (the queue's by default) runs on the event loop once the
+    extractor returned, e.g. to store the numbers for review; if it raises, the job
+    fails with that error.
+    Jobs live in this process only: in multi-process mode, poll with `wait` on the
+    upload itself rather than GET /jobs/{id}, which may reach another worker.
+    """
+
+    def __init__(
+        self,
+        extractor: Extractor,
+        workers: int,
+        max_pending: int,
+        timeout: float,
+        max_attempts: int,
+        retry_backoff: float,
+        job_ttl: float,
+        on_success: Callable[[ExtractionJob], None],
+        preprocessor: Optional[ImagePreprocessor] = None,
+    ):
+        self.extractor = extractor
+        self.preprocessor = preprocessor
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.job_ttl = job_ttl
+        self.on_success = on_success
+        self._jobs: "OrderedDict[str, ExtractionJob]" = OrderedDict()  # Oldest first
+        self._pending = 0  # Jobs queued, running or waiting to retry
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    # ------------------------------------------------------
+    # Lifecycle (called from the FastAPI lifespan)
+    # ------------------------------------------------------
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="extraction")
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        logger.info(f"Extraction queue started with {self.workers} worker(s).")
+
+    async def warm_up(self):
+        """Run the extractor's warm-up (see Extractor.warm_up) without blocking the loop."""
+        started = time.perf_counter()
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self.extractor.warm_up)
+        except Exception as e:
+            logger.warning(f"Extractor warm-up failed (the first extraction will retry): {e}")
+            return
+        logger.info(f"Extractor warmed up in {time.perf_counter() - started:.2f}s.")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for job in list(self._jobs.values()):
+            if not job.finished:
+                self._finish(job, "failed", "Server shutting down.")
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)  # Running calls finish in the background
+            self._executor = None
+        if self.preprocessor is not None:
+            self.preprocessor.close()
+        logger.info("Extraction queue stopped.")
+
+    # ------------------------------------------------------
+    # Jobs
+    # ------------------------------------------------------
+    @property
+    def available(self) -> int:
+        """How many more jobs submit() accepts right now."""
+        return max(0, self.max_pending - self._pending)
+
+    def submit(
+        self,
+        client_ip: str,
+        images: List[JobImage],
+        cache_keys: List[str],
+        on_success: Optional[Callable[[ExtractionJob], None]] = None,
+    ) -> ExtractionJob:
+        if not self.running:
+            raise RuntimeError("Extraction queue is not running.")
+        if not self.available:
+            raise ExtractionQueueFull(f"{self._pending} extraction jobs are already pending.")
+        job = self._register(ExtractionJob(client_ip, images, cache_keys, on_success or self.on_success))
+        self._pending += 1
+        self._queue.put_nowait(job)
+        return job
+
+    def completed(self, client_ip: str, numbers: List[str], cache_key: str) -> ExtractionJob:
+        """Record a job answered without running the extractor (extraction cache hit)."""
+        job = self._register(ExtractionJob(client_ip, [], [cache_key], self.on_success))
+        job.results, job.numbers, job.found, job.cached = [list(numbers)], list(numbers), list(numbers), True
+        job.status, job.finished_at = "succeeded", time.time()
+        job._done.set()
+        return job
+
+    def get(self, job_id: str) -> Optional[ExtractionJob]:
+        return self._jobs.get(job_id)
+
+    def _register(self, job: ExtractionJob) -> ExtractionJob:
+        # Forget finished jobs past their TTL (oldest first)
+        cutoff = time.time() - self.job_ttl
+        while self._jobs:
+            oldest = next(iter(self._jobs.values()))
+            if not oldest.finished or oldest.finished_at > cutoff:
+                break
+            self._jobs.popitem(last=False)
+        self._jobs[job.id] = job
+        return job
+
+    # ------------------------------------------------------
+    # Workers
+    # ------------------------------------------------------
+    async def _work(self):
+        while True:
+            job = await self._queue.get()
+            stuck = await self._attempt(job)
+            if stuck is not None:
+                # A timed-out call cannot be interrupted: keep this worker until its
+                # thread is free, so no more calls run than there are threads
+                await asyncio.gather(stuck, return_exceptions=True)
+
+    async def _attempt(self, job: ExtractionJob) -> Optional[asyncio.Future]:
+        # Returns the extractor call if it timed out (still running in its thread)
+        job.status = "running"
+        job.attempts += 1
+        loop = asyncio.get_running_loop()
+        call = None
+        try:
+            if self.preprocessor is not None and not job.preprocessed:
+                job.images = await asyncio.gather(*(self._preprocess(image) for image in job.images))
+                job.preprocessed = True
+            images = list(job.images)
+            for image, _, _ in images:
+                image.seek(0)  # Every attempt reads from the start
+            if len(images) == 1:
+                call = loop.run_in_executor(self._executor, self._extract_stream, job, images[0], loop)
+            else:
+                call = loop.run_in_executor(self._executor, self.extractor.extract_many, images)
+            results = await asyncio.wait_for(asyncio.shield(call), self.timeout)
+        except Exception as e:
+            timed_out = isinstance(e, asyncio.TimeoutError) and call is not None and not call.done()
+            error = f"Timed out after {self.timeout:g}s." if isinstance(e, asyncio.TimeoutError) else str(e)
+            if job.attempts < self.max_attempts:
+                delay = self.retry_backoff * 2 ** (job.attempts - 1)
+                logger.warning(f"Extraction job {job.id} attempt {job.attempts} failed ({error}); retrying in {delay:g}s.")
+                job.status, job.error = "retrying", error
+                if timed_out:
+                    # The backoff starts once the timed-out call has returned
+                    call.add_done_callback(lambda _: loop.call_later(delay, self._queue.put_nowait, job))
+                else:
+                    loop.call_later(delay, self._queue.put_nowait, job)
+            else:
+                logger.error(f"Extraction job {job.id} failed after {job.attempts} attempt(s): {error}")
+                self._finish(job, "failed", error)
+            return call if timed_out else None
+
+        job.results = results
+        job.numbers = list(dict.fromkeys(number for numbers in results for number in numbers))
+        job._found(job.numbers)
+        try:
+            job.on_success(job)
+        except Exception as e:
+            logger.error(f"Failed to store the results of extraction job {job.id}: {e}")
+            self._finish(job, "failed", str(e))
+            return
+        self._finish(job, "succeeded")
+
+    def _extract_stream(self, job: ExtractionJob, image: ExtractorImage, loop: asyncio.AbstractEventLoop) -> List[List[str]]:
+        # Runs in a worker thread: publish each number on the job (on the event loop)
+        numbers = []
+        for number in self.extractor.extract_stream(*image):
+            numbers.append(number)
+            loop.call_soon_threadsafe(job._found, [number])
+        return [numbers]
+
+    async def _preprocess(self, image: JobImage) -> JobImage:
+        original, mime_type, file_name = image
+        processed, mime_type = await self.preprocessor.process(original, mime_type)
+        if processed is not original:
+            original.close()
+        return processed, mime_type, file_name
+
+    def _finish(self, job: ExtractionJob, status: str, error: Optional[str] = None):
+        job.status, job.error = status, error
+        job.finished_at = time.time()
+        for image, _, _ in job.images:
+            image.close()
+        job.images = []
+        self._pending -= 1
+        job._done.set()
+        job._notify()
@@ -0,0 +1,120 @@
+# extractors.py
+
+# Pluggable image -> phone numbers extractors behind the extraction job queue
+# (see extraction_jobs.py). config.EXTRACTOR selects one: "gemini" (Gemini Flash-8B)
+# or "fake", a local stand-in for tests and benchmarks (no network, no API quota).
+
+from typing import IO, Iterator, List, Optional, Tuple
+import time
+import logging
+from gemini_utils import (
+    gemini_flash8b_model,
+    GEMINI_FLASH8B_EXTRACTION_FINGERPRINT,
+    gemini_flash8b_upload_file,
+    gemini_flash8b_extract_phone_numbers,
+    gemini_flash8b_stream_phone_numbers,
+    gemini_flash8b_extract_phone_numbers_packed,
+    gemini_flash8b_validate_phone_number,
+    gemini_flash8b_validate_phone_numbers,
+    gemini_flash8b_find_phone_numbers,
+)
+
+logger = logging.getLogger(__name__)
+
+# (image, mime_type, file_name)
+ExtractorImage = Tuple[IO[bytes], str, Optional[str]]
+
+class Extractor:
+    """Interface every extractor implements. `extract` runs in a worker thread."""
+
+    # Identifies what produces the results (part of the extraction cache key)
+    fingerprint = ""
+
+    def extract(self, image: IO[bytes], mime_type: str, file_name: Optional[str]) -> List[str]:
+        """Validated phone numbers (XXX-XXX-XXXX) found in the image."""
+        raise NotImplementedError
+
+    def extract_stream(self, image: IO[bytes], mime_type: str, file_name: Optional[str]) -> Iterator[str]:
+        """The numbers of `extract`, each yielded as soon as it is found. Extractors
+        whose model streams its answer override this; by default they come at the end."""
+        yield from self.extract(image, mime_type, file_name)
+
+    def extract_many(self, images: List[ExtractorImage]) -> List[List[str]]:
+        """Validated phone numbers per image. Extractors that can answer several images
+        in one model request override this; by default each image is extracted alone."""
+        return [self.extract(*image) for image in images]
+
+    def warm_up(self):
+        """Prepare whatever the first extraction would otherwise create (e.g. a model
+        client), so it does not pay for it. Runs in a worker thread."""
+
+class GeminiExtractor(Extractor):
+    """Uploads the image to Gemini Flash-8B and asks for its phone numbers."""
+
+    fingerprint = GEMINI_FLASH8B_EXTRACTION_FINGERPRINT
+
+    def warm_up(self):
+        gemini_flash8b_model()
+
+    def extract(self, image: IO[bytes], mime_type: str, file_name: Optional[str]) -> List[str]:
+        return list(self.extract_stream(image, mime_type, file_name))
+
+    def extract_stream(self, image: IO[bytes], mime_type: str, file_name: Optional[str]) -> Iterator[str]:
+        # The answer is streamed: each number is validated once the model has written it
+        logger.info(f"Uploading {mime_type} image to Gemini Flash-8B...")
+        uploaded_file = gemini_flash8b_upload_file(image, mime_type, file_name)
+        logger.info(f"Image successfully uploaded to Gemini Flash-8B. File ID: {uploaded_file}")
+        logger.info("Starting chat session with Gemini Flash-8B for phone number extraction...")
+        seen = set()
+        for number in gemini_flash8b_stream_phone_numbers(uploaded_file):
+            try:
+                formatted_number = gemini_flash8b_validate_phone_number(number)
+            except ValueError as e:
+                logger.warning(f"Failed to validate number {number}: {e}")
+                continue
+            if formatted_number not in seen:
+                seen.add(formatted_number)
+                logger.info(f"Validated phone number: {formatted_number}")
+                yield formatted_number
+
+    def extract_many(self, images: List[ExtractorImage]) -> List[List[str]]:
+        # Upload every image, then ask about all of them in one chat; if the answer
+        # cannot be matched to the images, ask about each uploaded image separately
+        if len(images) == 1:
+            return [self.extract(*images[0])]
+        logger.info(f"Uploading {len(images)} images to Gemini Flash-8B...")
+        uploaded_files = [gemini_flash8b_upload_file(*image) for image in images]
+        try:
+            per_image = gemini_flash8b_extract_phone_numbers_packed(uploaded_files)
+        except ValueError as e:
+            logger.warning(f"Packed extraction failed, extracting images one by one: {e}")
+            per_image = [gemini_flash8b_extract_phone_numbers(uploaded_file) for uploaded_file in uploaded_files]
+        return [gemini_flash8b_validate_phone_numbers(phone_numbers) for phone_numbers in per_image]
+
+class FakeExtractor(Extractor):
+    """Reads numbers written as plain text inside the image bytes (e.g. a PNG
+    signature followed by "415-555-0100"), after `delay` seconds of simulated
+    model latency."""
+
+    fingerprint = "fake"
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+
+    def extract(self, image: IO[bytes], mime_type: str, file_name: Optional[str]) -> List[str]:
+        if self.delay:
+            time.sleep(self.delay)
+        return gemini_flash8b_find_phone_numbers(image.read().decode("latin-1"))
+
+    def extract_many(self, images: List[ExtractorImage]) -> List[List[str]]:
+        # One simulated model request for the whole pack
+        if self.delay:
+            time.sleep(self.delay)
+        return [gemini_flash8b_find_phone_numbers(image.read().decode("latin-1")) for image, _, _ in images]
+
+def create_extractor(name: str, fake_delay: float = 0.0) -> Extractor:
+    if name == "gemini":
+        return GeminiExtractor()
+    if name == "fake":
+        return FakeExtractor(fake_delay)
+    raise ValueError(f"Unknown EXTRACTOR {name!r} (expected 'gemini' or 'fake')")
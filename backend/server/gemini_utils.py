@@ -4,43 +4,217 @@ import re
 import os
 import json
 import logging
-from typing import Optional
+import threading
+from typing import IO, Iterator, List, Optional, Tuple, Union
 from uuid import uuid4
-import google.generativeai as genai
 from config import GOOGLE_API_KEY, GEMINI_FLASH8B_GENERATION_CONFIG 
+from models.phone_normalizer import normalize_phone_number, normalize_many
 
 # Configure logging settings
 logger = logging.getLogger(__name__)
 
 # ------------------------------------------------------
-# Initialize Google Gemini configuration
+# Google Gemini client, created on first use
 # ------------------------------------------------------
-genai.configure(api_key=GOOGLE_API_KEY)
+# Importing the SDK takes about a second, so it is only imported (and configured)
+# when an extraction first needs it, or by the optional warm-up at startup
+# (config.EXTRACTOR_WARMUP); processes that never extract never pay for it.
 
-gemini_flash8b_model = genai.GenerativeModel(
-    model_name="gemini-1.5-flash-8b",
-    generation_config=GEMINI_FLASH8B_GENERATION_CONFIG,  # Correct variable name
-)
+GEMINI_FLASH8B_MODEL_NAME = "gemini-1.5-flash-8b"
+
+_gemini_flash8b_model = None
+_gemini_flash8b_model_lock = threading.Lock()  # Extractions run in worker threads
+
+def gemini_flash8b_model():
+    """The Gemini Flash-8B model client, created on the first call and then reused.
+    Raises RuntimeError if GOOGLE_API_KEY is not set."""
+    global _gemini_flash8b_model
+    if _gemini_flash8b_model is None:
+        with _gemini_flash8b_model_lock:
+            if _gemini_flash8b_model is None:
+                if not GOOGLE_API_KEY:
+                    raise RuntimeError("GOOGLE_API_KEY is not set; Gemini extraction is unavailable.")
+                import google.generativeai as genai
+                genai.configure(api_key=GOOGLE_API_KEY)
+                _gemini_flash8b_model = genai.GenerativeModel(
+                    model_name=GEMINI_FLASH8B_MODEL_NAME,
+                    generation_config=GEMINI_FLASH8B_GENERATION_CONFIG,  # Correct variable name
+                )
+                logger.info(f"Gemini client created for {_gemini_flash8b_model.model_name}")
+    return _gemini_flash8b_model
 
 # ------------------------------------------------------
 # Utility Functions
 # ------------------------------------------------------
 
-def gemini_flash8b_upload_file(path: str, mime_type: Optional[str] = None):
-    """Uploads the given file to Gemini Flash-8B.
+# Prompt sent along with every uploaded image
+GEMINI_FLASH8B_EXTRACTION_PROMPT = "You are a software component, to extract phone number(s) from images to add to an internal db. From the image provided, identify and extract all valid US phone numbers. A valid US phone number must:\n\n1. Contain exactly 10 digits.\n2. Follow the format XXX-XXX-XXXX, where each 'X' is a digit from 0 to 9.\n\n**Instructions:**\n1. **Extract:** Scan the image and identify all sequences of digits that could represent US phone numbers.\n2. **Validate:**\n   - Ensure each identified sequence has exactly 10 digits.\n   - Format each valid number as XXX-XXX-XXXX.\n3. **Output:**\n   - Return only a single JSON array containing the valid, formatted phone numbers.\n   - **Do not include** any additional text, comments, explanations, or code block delimiters.\n\n**Example Output:**\n[\"555-123-4567\", \"800-555-0199\"]\n\n**Note:** Ensure that only legitimate and properly formatted US phone numbers are included in the output array.\n- Ensure the chain of thought for the prompt generation prevents stray characters (like Invalid USA phone number.) from being intermingled with the phone numbers.\n - **Do not include** any additional text, comments, explanations, or code block delimiters. If nothing say nothing"
 
-    See https://ai.google.dev/gemini-api/docs/prompting_with_media
+# Several images in one request: the extraction prompt plus how to lay out the answer
+GEMINI_FLASH8B_PACKED_EXTRACTION_PROMPT = (
+    "\n\n**Several images:** You are given {count} images. Apply the instructions above to each image "
+    "and return a single JSON array with exactly {count} entries, one per image in the order given, "
+    "where each entry is the JSON array of that image's phone numbers (an empty array if it has none).\n"
+    "**Example Output for 2 images:**\n[[\"555-123-4567\"], []]"
+)
+
+# What produced an extraction (model, generation config, prompt); part of the
+# extraction cache key, so changing any of them invalidates cached results. The model
+# is named as the SDK names it ("models/..."), without creating the client.
+GEMINI_FLASH8B_EXTRACTION_FINGERPRINT = json.dumps(
+    [f"models/{GEMINI_FLASH8B_MODEL_NAME}", GEMINI_FLASH8B_GENERATION_CONFIG, GEMINI_FLASH8B_EXTRACTION_PROMPT, GEMINI_FLASH8B_PACKED_EXTRACTION_PROMPT],
+    sort_keys=True,
+)
+
+def gemini_flash8b_upload_file(path: Union[str, IO[bytes]], mime_type: Optional[str] = None, display_name: Optional[str] = None):
+    """Uploads the given file (a path or a binary file object) to Gemini Flash-8B.
+
+    File objects are sent as they are, without a temporary copy on disk, and need
+    an explicit mime_type. See https://ai.google.dev/gemini-api/docs/prompting_with_media
     """
-    file = genai.upload_file(path, mime_type=mime_type)
+    gemini_flash8b_model()  # Configures the SDK on first use
+    import google.generativeai as genai
+    file = genai.upload_file(path, mime_type=mime_type, display_name=display_name)
     logger.info(f"Uploaded file '{file.display_name}' as: {file.uri}")
     return file
 
+class PhoneNumberArrayParser:
+    """Incremental, lenient parser for the JSON array(s) of phone numbers in a model
+    response, fed chunk by chunk as the response streams in.
+
+    `feed` returns each string of the array as soon as its closing quote arrives,
+    with the index of the inner array it belongs to in a packed answer
+    ([["..."], ["..."]]), or None for a flat array. Anything outside the arrays
+    (code block delimiters, explanations) is skipped, and a response cut short still
+    yields the strings completed before the cut. Values are not validated.
+    """
+
+    def __init__(self):
+        self.depth = 0        # Array nesting outside strings
+        self.arrays = 0       # Inner arrays opened so far (one per image when packed)
+        self.strings = 0      # Strings returned so far
+        self._string: Optional[List[str]] = None  # Characters of the string being read
+        self._escape = False
+        self._text: List[str] = []
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far."""
+        return "".join(self._text)
+
+    def feed(self, chunk: str) -> List[Tuple[Optional[int], str]]:
+        self._text.append(chunk)
+        completed = []
+        for char in chunk:
+            if self._string is not None:
+                if self._escape:
+                    self._string.append(char)
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    completed.append((self.arrays - 1 if self.depth >= 2 else None, "".join(self._string)))
+                    self._string = None
+                else:
+                    self._string.append(char)
+            elif char == '"':
+                if self.depth:  # Quoted text outside any array is not a value
+                    self._string = []
+            elif char == "[":
+                self.depth += 1
+                if self.depth == 2:
+                    self.arrays += 1
+            elif char == "]" and self.depth:
+                self.depth -= 1
+        self.strings += len(completed)
+        return completed
+
+def _gemini_flash8b_stream_chat(parts: list):
+    """Text chunks of the model's answer to `parts`, as they are generated."""
+    chat_session = gemini_flash8b_model().start_chat(
+        history=[
+            {
+                "role": "user",
+                "parts": parts,
+            }
+        ]
+    )
+    for chunk in chat_session.send_message("Extract phone numbers", stream=True):
+        try:
+            text = chunk.text
+        except ValueError:  # A chunk without text (e.g. only the finish reason)
+            continue
+        yield text
+
+def gemini_flash8b_stream_phone_numbers(uploaded_file) -> Iterator[str]:
+    """Asks Gemini Flash-8B for the phone numbers in an uploaded image and yields
+    each one (unvalidated) as soon as the model has written it."""
+    parser = PhoneNumberArrayParser()
+    for text in _gemini_flash8b_stream_chat([uploaded_file, GEMINI_FLASH8B_EXTRACTION_PROMPT]):
+        for _, number in parser.feed(text):
+            yield number
+    logger.info(f"Raw response from Gemini Flash-8B: {parser.text}")
+    if not parser.strings:
+        yield from gemini_flash8b_find_phone_numbers(parser.text)
+
+def gemini_flash8b_extract_phone_numbers(uploaded_file) -> List[str]:
+    """Asks Gemini Flash-8B for the phone numbers in an uploaded image (unvalidated)."""
+    return list(gemini_flash8b_stream_phone_numbers(uploaded_file))
+
+def gemini_flash8b_extract_phone_numbers_packed(uploaded_files: list) -> List[List[str]]:
+    """Asks Gemini Flash-8B for the phone numbers of several uploaded images in one
+    request (unvalidated, one list per image). Raises ValueError if the answer does
+    not have one list per image."""
+    prompt = GEMINI_FLASH8B_EXTRACTION_PROMPT + GEMINI_FLASH8B_PACKED_EXTRACTION_PROMPT.format(count=len(uploaded_files))
+    parser = PhoneNumberArrayParser()
+    per_image: List[List[str]] = [[] for _ in uploaded_files]
+    misplaced = 0  # Strings outside the per-image arrays
+    for text in _gemini_flash8b_stream_chat([*uploaded_files, prompt]):
+        for index, number in parser.feed(text):
+            if index is None or index >= len(per_image):
+                misplaced += 1
+            else:
+                per_image[index].append(number)
+    logger.info(f"Raw response from Gemini Flash-8B for {len(uploaded_files)} images: {parser.text}")
+    if parser.arrays != len(uploaded_files) or misplaced:
+        raise ValueError(f"Expected {len(uploaded_files)} arrays of phone numbers, got: {parser.text[:200]}")
+    return per_image
+
+# US phone numbers in free text, under the same rules as
+# gemini_flash8b_validate_phone_number: 10 digits, optionally after a +1 / 1 country
+# code, with the area code optionally in parentheses and up to three separators
+# (spaces, dots, dashes) between groups. The separators are bounded and no digit may
+# directly precede or follow a match, so a scan is linear in the text length.
+_PHONE_NUMBER_TEXT_PATTERN = re.compile(r"""
+    (?<!\d)
+    (?:\+?1[\s.\-]{0,3})?
+    (?:\(\s{0,3}(\d{3})\s{0,3}\)|(\d{3}))
+    [\s.\-]{0,3}
+    (\d{3})
+    [\s.\-]{0,3}
+    (\d{4})
+    (?!\d)
+""", re.VERBOSE)
+
+def gemini_flash8b_find_phone_numbers(text: str) -> List[str]:
+    """Finds the US phone numbers in text, formatted XXX-XXX-XXXX, in order and without repeats."""
+    numbers = {}
+    for match in _PHONE_NUMBER_TEXT_PATTERN.finditer(text):
+        area_code = match.group(1) or match.group(2)
+        numbers[f"{area_code}-{match.group(3)}-{match.group(4)}"] = None
+    return list(numbers)
+
+def gemini_flash8b_validate_phone_numbers(phone_numbers: List[str]) -> List[str]:
+    """Formats the valid numbers of a model response; invalid ones are logged and skipped."""
+    validated_numbers = []
+    for number, formatted_number in zip(phone_numbers, normalize_many(phone_numbers)):
+        if formatted_number is None:
+            logger.warning(f"Failed to validate number {number}: Invalid USA phone number.")
+        else:
+            validated_numbers.append(formatted_number)
+            logger.info(f"Validated phone number: {formatted_number}")
+    return validated_numbers
+
 def gemini_flash8b_validate_phone_number(phone_number: str) -> str:
-    """Validates and formats a phone number."""
-    clean_number = re.sub(r'\D', '', phone_number)
-    if len(clean_number) == 11 and clean_number.startswith("1"):
-        clean_number = clean_number[1:]
-    if len(clean_number) != 10:
-        raise ValueError("Invalid USA phone number. Please enter a valid 10-digit number.")
-    formatted_number = f"{clean_number[:3]}-{clean_number[3:6]}-{clean_number[6:]}"
-    return formatted_number
+    """Validates and formats a phone number (see models/phone_normalizer.py)."""
+    return normalize_phone_number(phone_number)
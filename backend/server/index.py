@@ -7,30 +7,82 @@
 
 # TODO: 
 # - rules for using the numbers: 
-# 1. only use one number twice per day max to avoid flag
+# 1. only use one number twice per day max to avoid flag (enforced by GET /phone_numbers/suggest, see suggestions.py)
 # 2. rename generic `review_gemini_extracted_image_phone_numbers.json` to `review_{ip_address}_gemini_extracted_image_phone_numbers.json`
 # 3. to share numbers with the community
 
-from fastapi import FastAPI
+from startup import startup_timer  # First, so the startup timings cover every import
+from contextlib import asynccontextmanager
+import asyncio
+with startup_timer.phase("web stack"):
+    from fastapi import FastAPI
+    import uvicorn
 from logging_setup import setup_logging
-from route.features.collect_phone_numbers import router as phone_numbers_router
-from route.features.extract_phone_numbers import router as gemini_flash8b_router
+with startup_timer.phase("config"):
+    from config import REVIEW_SWEEP_INTERVAL, SHARED_STORAGE, EXTRACTOR_WARMUP
+with startup_timer.phase("database"):  # Loads the stores
+    from database import persistence_writer, storage, gemini_flash8b_temp_db, save_gemini_temp_to_file
+    from database import storage_transaction, sync_from_storage
+from review_store import sweep_review_store
+with startup_timer.phase("phone_numbers routes"):
+    from route.features.collect_phone_numbers import router as phone_numbers_router
+with startup_timer.phase("gemini_flash8b routes"):  # The Gemini SDK itself is imported on first use
+    from route.features.extract_phone_numbers import router as gemini_flash8b_router, extraction_queue
 from route.templates.index import router as template_routes
-import uvicorn
 
 # Initialize logging
 setup_logging()
+
+# Start the background persistence writer, extraction workers and review sweeper with the app,
+# flush pending writes on shutdown. In multi-process mode writes commit inside
+# storage_transaction() instead, so the background writer stays off. With
+# EXTRACTOR_WARMUP the model client is created in the background meanwhile.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    with startup_timer.phase("lifespan"):
+        if not SHARED_STORAGE:
+            await persistence_writer.start()
+        await extraction_queue.start()
+        sweeper = asyncio.create_task(sweep_review_store(
+            gemini_flash8b_temp_db,
+            REVIEW_SWEEP_INTERVAL,
+            lambda: save_gemini_temp_to_file(gemini_flash8b_temp_db),
+            storage_transaction,
+        ))
+        warm_up = asyncio.create_task(extraction_queue.warm_up()) if EXTRACTOR_WARMUP else None
+    startup_timer.ready()
+    yield
+    if warm_up is not None:
+        warm_up.cancel()
+    sweeper.cancel()
+    await extraction_queue.stop()
+    await persistence_writer.stop()
+    storage.close()
+
 # Initialize FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 # Include routers
 app.include_router(phone_numbers_router, prefix="/phone_numbers", tags=["Phone Numbers"])
 app.include_router(gemini_flash8b_router, prefix="/gemini_flash8b", tags=["Gemini Flash-8B"])
 app.include_router(template_routes)
 
+# Seconds this worker spent on each startup phase (imports, lifespan) and in total
+@app.get("/startup/stats", response_model=dict, tags=["Server"])
+async def startup_stats():
+    return startup_timer.stats()
+
+# Multi-process mode: pick up other workers' writes before serving each request
+if SHARED_STORAGE:
+    @app.middleware("http")
+    async def sync_shared_storage(request, call_next):
+        sync_from_storage()
+        return await call_next(request)
+
 # ------------------------------------------------------
 # Run the FastAPI app using Uvicorn
 # ------------------------------------------------------
 
 if __name__ == "__main__":
+    # Development server (auto reload); use serve.py in production
     # Increase the request size limit if necessary (e.g., 10 MB)
     uvicorn.run("index:app", host="0.0.0.0", port=8000, reload=True)  # 10 MB
@@ -1,24 +1,67 @@
 # models.py
 
-from pydantic import BaseModel, Field, validator
-from typing import Optional, List
+from pydantic import BaseModel, Field, root_validator, validator
+from typing import Dict, Optional, List
 from uuid import UUID, uuid4
-from datetime import datetime
+from datetime import datetime, timezone
 import re
+from .phone_normalizer import normalize_phone_number
 
 # ------------------------------------------------------
 # Pydantic Models for Request and Response validation
 # ------------------------------------------------------
 
+USAGE_WINDOW_DAYS = 7  # Days of per-day use counts kept on each phone number
+
+def _utc_day(timestamp: datetime) -> int:
+    # Days since the epoch (UTC); naive timestamps are UTC
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return int(timestamp.timestamp() // 86400)
+
+# Ring of per-day use counts for the last USAGE_WINDOW_DAYS days, kept on write so
+# limit checks never walk the history. counts[d % 7] holds the uses on UTC day d,
+# for d in (day - 6 .. day); slots older than that are stale.
+class UsageCounters(BaseModel):
+    day: Optional[int] = None                # UTC epoch day of the most recent use
+    counts: List[int] = [0] * USAGE_WINDOW_DAYS
+
+    def record_use(self, timestamp: datetime) -> "UsageCounters":
+        """Return new counters with one more use at `timestamp`."""
+        day = _utc_day(timestamp)
+        counts = list(self.counts)
+        newest = self.day
+        if newest is None or day - newest >= USAGE_WINDOW_DAYS:
+            counts = [0] * USAGE_WINDOW_DAYS
+            newest = day
+        elif day > newest:
+            # Clear the slots of the days between the previous newest day and this one
+            for skipped in range(newest + 1, day + 1):
+                counts[skipped % USAGE_WINDOW_DAYS] = 0
+            newest = day
+        elif day <= newest - USAGE_WINDOW_DAYS:
+            return self  # Older than the window
+        counts[day % USAGE_WINDOW_DAYS] += 1
+        return UsageCounters(day=newest, counts=counts)
+
+    def uses_between(self, first_day: int, last_day: int) -> int:
+        """Uses on UTC days first_day..last_day (inclusive) within the window."""
+        if self.day is None:
+            return 0
+        first_day = max(first_day, self.day - USAGE_WINDOW_DAYS + 1)
+        last_day = min(last_day, self.day)
+        return sum(self.counts[day % USAGE_WINDOW_DAYS] for day in range(first_day, last_day + 1))
+
 # Model for Phone Number with all details
 class PhoneNumber(BaseModel):
     id: UUID = Field(default_factory=uuid4)  # Unique identifier for the phone number
     number: str                              # Phone number string
     has_redeem_value: bool                   # Indicates if the number has a redeemable value
     last_used: Optional[datetime] = None     # Last time the number was used
-    last_used_history: List[dict] = []       # History of all 'last_used' updates
+    last_used_history: List[dict] = Field(default=[], exclude=True)   # Legacy embedded history: moved to the history segment at startup, never written
     last_tried: Optional[datetime] = None    # Last time redeem was tried
-    last_tried_history: List[dict] = []      # History of all 'last_tried' updates
+    last_tried_history: List[dict] = Field(default=[], exclude=True)  # Legacy embedded history (as above)
+    usage: UsageCounters = UsageCounters()   # Uses per day for the last 7 days
     name: Optional[str] = None               # Name associated with the phone number
     amount_spent: float = 0.0                # Total amount spent
     number_of_points: int = 0                # Points accrued by the phone number
@@ -26,9 +69,26 @@ class PhoneNumber(BaseModel):
     is_deleted: bool = False                 # Indicates if the phone number is deleted
     created_ip: Optional[str] = None         # IP address where the number was created
     updated_ip: Optional[str] = None         # IP address of last update
+    change_seq: int = 0                      # Store-wide change sequence of the last mutation (delta sync)
+    version: int = 0                         # Incremented on every change; compared against If-Match
 
     # TODO: Add weekly limit
 
+    @validator('usage', always=True)
+    def count_legacy_usage(cls, value, values):
+        # Records saved before usage counters existed: count their embedded history
+        if value.day is None:
+            for entry in values.get('last_used_history') or []:
+                timestamp = entry.get('timestamp')
+                if isinstance(timestamp, str):
+                    try:
+                        timestamp = datetime.fromisoformat(timestamp)
+                    except ValueError:
+                        continue
+                if isinstance(timestamp, datetime):
+                    value = value.record_use(timestamp)
+        return value
+
 # Model for creating a new PhoneNumber (limited fields
 class PhoneNumberCreate(BaseModel):
     number: str                              # Phone number string
@@ -38,18 +98,19 @@ class PhoneNumberCreate(BaseModel):
 
     @validator('number')
     def validate_phone_number(cls, value):
-        # Strip spaces, dashes, or parentheses
-        clean_number = re.sub(r'\D', '', value)
-
-        # Validate that the number is a valid USA number (10 digits, can start with optional +1)
-        if len(clean_number) == 11 and clean_number.startswith("1"):
-            clean_number = clean_number[1:]  # Strip the country code if present
-        if len(clean_number) != 10:
-            raise ValueError("Invalid USA phone number. Please enter a valid 10-digit number.")
-        
-        # Format the phone number to XXX-XXX-XXXX
-        formatted_number = f"{clean_number[:3]}-{clean_number[3:6]}-{clean_number[6:]}"
-        return formatted_number
+        # A valid USA number (10 digits, optional +1) formatted XXX-XXX-XXXX (see models/phone_normalizer.py)
+        return normalize_phone_number(value)
+
+# PhoneNumber fields that are never None. Update models take them as optional (unset
+# means unchanged), but an explicit null would store a record that no longer loads.
+NON_NULLABLE_UPDATE_FIELDS = ('has_redeem_value', 'amount_spent', 'number_of_points', 'is_deleted')
+
+def reject_null_fields(values):
+    if isinstance(values, dict):
+        null_fields = [field for field in NON_NULLABLE_UPDATE_FIELDS if field in values and values[field] is None]
+        if null_fields:
+            raise ValueError(f"{', '.join(null_fields)} cannot be null.")
+    return values
 
 # Model for updating an existing PhoneNumber
 class PhoneNumberUpdate(BaseModel):
@@ -64,7 +125,76 @@ class PhoneNumberUpdate(BaseModel):
 
     # TODO: add weekly limit; use 2x/week only
 
+    @root_validator(pre=True)
+    def reject_null(cls, values):
+        return reject_null_fields(values)
+
+# Model for one item of a batch create/upsert: a number plus any updatable fields
+class PhoneNumberBatchItem(PhoneNumberCreate):
+    expected_version: Optional[int] = None   # Only update if the stored version still matches
+    has_redeem_value: Optional[bool] = None  # Required when the number is created
+    last_used: Optional[datetime] = None     # Applied like PhoneNumberUpdate when upserting
+    last_tried: Optional[datetime] = None
+    amount_spent: Optional[float] = None
+    number_of_points: Optional[int] = None
+    is_deleted: Optional[bool] = None
+
+    @root_validator(pre=True)
+    def reject_null(cls, values):
+        return reject_null_fields(values)
+
+# Predicate for bulk updates; unset fields match everything
+class PhoneNumberFilter(BaseModel):
+    area_code: Optional[str] = None                 # First 3 digits of the 10-digit number
+    is_deleted: Optional[bool] = None
+    has_redeem_value: Optional[bool] = None
+    last_used_before: Optional[datetime] = None     # Never-used numbers match neither bound
+    last_used_after: Optional[datetime] = None
+
+    @validator('area_code')
+    def validate_area_code(cls, value):
+        if value is not None and not re.fullmatch(r'\d{3}', value):
+            raise ValueError("Area code must be 3 digits.")
+        return value
+
+# Model for a bulk update: which numbers to touch, fields to assign and fields to add to
+class PhoneNumberBulkUpdate(BaseModel):
+    filter: PhoneNumberFilter = PhoneNumberFilter()
+    set: PhoneNumberUpdate = PhoneNumberUpdate()    # last_used / last_tried are per-use, not bulk
+    increment: Dict[str, float] = {}                # amount_spent and/or number_of_points
+
+    @validator('set')
+    def validate_set(cls, value):
+        timestamps = {'last_used', 'last_tried'} & set(value.dict(exclude_unset=True))
+        if timestamps:
+            raise ValueError(f"Cannot bulk set {', '.join(sorted(timestamps))}.")
+        return value
+
+    @validator('increment')
+    def validate_increment(cls, value):
+        unknown = set(value) - {'amount_spent', 'number_of_points'}
+        if unknown:
+            raise ValueError(f"Cannot increment {', '.join(sorted(unknown))}.")
+        if 'number_of_points' in value and value['number_of_points'] != int(value['number_of_points']):
+            raise ValueError("number_of_points increments must be whole numbers.")
+        return value
+
 # Pydantic Model for Base64 Image Input
 class Base64ImageInput(BaseModel):
     image_base64: str  # The base64-encoded image string
     file_name: Optional[str] = None  # Optional original filename
+
+# Several images in one request (POST /gemini_flash8b/upload_images/)
+class Base64ImageBatchInput(BaseModel):
+    images: List[Base64ImageInput]
+
+# Text to scan for phone numbers locally (OCR output, pasted receipts, SMS dumps)
+class TextExtractionInput(BaseModel):
+    text: Optional[str] = None                # A single document
+    documents: List[str] = []                 # Or a batch of documents
+
+    @validator('documents', always=True)
+    def require_text(cls, documents, values):
+        if values.get('text') is None and not documents:
+            raise ValueError("Provide text or documents.")
+        return documents
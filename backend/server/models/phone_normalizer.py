@@ -0,0 +1,68 @@
+# models/phone_normalizer.py
+
+# The one normalizer for US phone numbers, shared by the request models, the number
+# index, the extraction paths and review confirmation. A number is reduced to its key:
+# the 10 digits as an integer (below 10**10, so it fits in 64 bits), which is what the
+# index stores and compares; the canonical text form XXX-XXX-XXXX is formatted from it.
+# Results are memoized, so numbers seen before (repeats in a batch, numbers that
+# come back from review) are not parsed again.
+
+from functools import lru_cache
+import re
+from typing import Iterable, List, Optional
+
+INVALID_PHONE_NUMBER = "Invalid USA phone number. Please enter a valid 10-digit number."
+
+NORMALIZER_CACHE_SIZE = 65536  # Distinct inputs whose results are remembered
+
+_NON_DIGITS = re.compile(r"\D")
+
+@lru_cache(maxsize=NORMALIZER_CACHE_SIZE)
+def phone_number_key(number: str) -> Optional[int]:
+    """The 10 digits of a US phone number as an integer, or None if it is not one.
+
+    Every character other than a digit is ignored; 11 digits starting with the
+    country code 1 count as the 10 after it.
+    """
+    if len(number) == 12 and number[3] == "-" and number[7] == "-":
+        digits = number[:3] + number[4:7] + number[8:]  # Already XXX-XXX-XXXX (the common case)
+        if not (digits.isascii() and digits.isdigit()):
+            digits = _NON_DIGITS.sub("", number)
+    else:
+        digits = _NON_DIGITS.sub("", number)
+    if len(digits) == 11 and digits[0] == "1":
+        digits = digits[1:]
+    if len(digits) != 10:
+        return None
+    return int(digits)
+
+def format_phone_number_key(key: int) -> str:
+    """XXX-XXX-XXXX for a key from phone_number_key."""
+    digits = f"{key:010d}"
+    return f"{digits[:3]}-{digits[3:6]}-{digits[6:]}"
+
+def phone_number_key_area_code(key: int) -> str:
+    return f"{key // 10_000_000:03d}"
+
+def normalize_phone_number(number: str) -> str:
+    """XXX-XXX-XXXX for a US phone number. Raises ValueError if it is not one."""
+    key = phone_number_key(number)
+    if key is None:
+        raise ValueError(INVALID_PHONE_NUMBER)
+    return _format_cached(key)
+
+def normalize_many(numbers: Iterable[str]) -> List[Optional[str]]:
+    """normalize_phone_number for each number in one pass, with None for the invalid ones
+    instead of raising. Repeated inputs are parsed once."""
+    normalized = {}
+    results = []
+    for number in numbers:
+        if number not in normalized:
+            key = phone_number_key(number)
+            normalized[number] = None if key is None else _format_cached(key)
+        results.append(normalized[number])
+    return results
+
+@lru_cache(maxsize=NORMALIZER_CACHE_SIZE)
+def _format_cached(key: int) -> str:
+    return format_phone_number_key(key)
@@ -0,0 +1,201 @@
+# persistence.py
+
+# Background writer that moves storage I/O off the event loop. Requests mutate the
+# in-memory dicts and enqueue the change here; the writer coalesces everything that
+# arrives within a flush interval into a single storage write run in a worker thread.
+
+from typing import Callable, Dict, List, Optional, Union
+from uuid import UUID
+import asyncio
+import logging
+from models.index import PhoneNumber
+from storage import PhoneNumberStorage
+from review_store import ReviewStore
+from extraction_cache import ExtractionCache
+
+logger = logging.getLogger(__name__)
+
+class PersistenceWriter:
+    """Group-commit writer for phone numbers, the Gemini review buffer and the
+    extraction cache.
+
+    Pending phone number changes are kept per id (the latest write wins), so a
+    record updated many times between flushes is written once. A full save
+    supersedes pending per-record changes. Callers that need durability await
+    `wait_for_flush()`, which resolves once the batch holding their change is on disk.
+    The extraction cache is best effort: failing to save it fails no batch.
+    """
+
+    def __init__(
+        self,
+        storage: PhoneNumberStorage,
+        phone_db_provider: Callable[[], Dict[UUID, PhoneNumber]],
+        tombstones_provider: Callable[[], Dict[UUID, int]],
+        gemini_temp_provider: Callable[[], ReviewStore],
+        flush_interval: float,
+        max_pending: int,
+        extraction_cache_provider: Optional[Callable[[], ExtractionCache]] = None,
+    ):
+        self.storage = storage
+        self.phone_db_provider = phone_db_provider
+        self.tombstones_provider = tombstones_provider
+        self.gemini_temp_provider = gemini_temp_provider
+        self.extraction_cache_provider = extraction_cache_provider
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        # An int marks a deletion (the change sequence of its tombstone)
+        self._phone_changes: Dict[UUID, Union[PhoneNumber, int]] = {}
+        self._full_save = False
+        self._gemini_temp_dirty = False
+        self._extraction_cache_dirty = False
+        self._batch_future: Optional[asyncio.Future] = None     # Resolves when the pending batch is written
+        self._inflight_future: Optional[asyncio.Future] = None  # Resolves when the batch being written is done
+        self._dirty: Optional[asyncio.Event] = None
+        self._full: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    # ------------------------------------------------------
+    # Lifecycle (called from the FastAPI lifespan)
+    # ------------------------------------------------------
+    async def start(self):
+        self._dirty = asyncio.Event()
+        self._full = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+        logger.info("Persistence writer started.")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stopping = True
+        self._dirty.set()
+        self._full.set()
+        await self._task
+        self._task = None
+        await self.flush()  # Write anything enqueued while stopping
+        logger.info("Persistence writer stopped.")
+
+    # ------------------------------------------------------
+    # Enqueue changes (called on the event loop)
+    # ------------------------------------------------------
+    def enqueue_put(self, phone: PhoneNumber):
+        self._phone_changes[phone.id] = phone
+        self._mark_dirty()
+
+    def enqueue_delete(self, phone_id: UUID, change_seq: int):
+        self._phone_changes[phone_id] = change_seq
+        self._mark_dirty()
+
+    def enqueue_full_save(self):
+        self._full_save = True
+        self._phone_changes.clear()  # The snapshot taken at flush time includes them
+        self._mark_dirty()
+
+    def enqueue_gemini_temp_save(self):
+        self._gemini_temp_dirty = True
+        self._mark_dirty()
+
+    def enqueue_extraction_cache_save(self):
+        self._extraction_cache_dirty = True
+        self._mark_dirty()
+
+    def _mark_dirty(self):
+        self._dirty.set()
+        if len(self._phone_changes) >= self.max_pending or self._full_save:
+            self._full.set()  # Flush now instead of waiting out the interval
+
+    def _has_pending(self) -> bool:
+        return bool(self._phone_changes) or self._full_save or self._gemini_temp_dirty or self._extraction_cache_dirty
+
+    async def wait_for_flush(self):
+        """Wait until everything enqueued so far has been written to storage."""
+        if self._has_pending():
+            if self._batch_future is None:
+                self._batch_future = asyncio.get_running_loop().create_future()
+            future = self._batch_future
+        elif self._inflight_future is not None:
+            future = self._inflight_future  # Our change was already taken by the running flush
+        else:
+            return
+        error = await asyncio.shield(future)
+        if error is not None:
+            raise error
+
+    # ------------------------------------------------------
+    # Flushing
+    # ------------------------------------------------------
+    async def _run(self):
+        while not self._stopping:
+            await self._dirty.wait()
+            # Let more requests join the batch unless it is already full
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._has_pending():
+                return
+            # Take the batch on the event loop so no request can interleave with the swap
+            phone_changes, self._phone_changes = self._phone_changes, {}
+            full_save, self._full_save = self._full_save, False
+            gemini_temp_dirty, self._gemini_temp_dirty = self._gemini_temp_dirty, False
+            extraction_cache_dirty, self._extraction_cache_dirty = self._extraction_cache_dirty, False
+            batch_future, self._batch_future = self._batch_future, None
+            if batch_future is None:
+                batch_future = asyncio.get_running_loop().create_future()
+            self._inflight_future = batch_future
+            self._dirty.clear()
+            self._full.clear()
+
+            phone_snapshot = (self.phone_db_provider().copy(), dict(self.tombstones_provider())) if full_save else None
+            gemini_temp_snapshot = self.gemini_temp_provider().copy() if gemini_temp_dirty else None
+            extraction_cache_snapshot = self.extraction_cache_provider().snapshot() if extraction_cache_dirty else None
+            error = None
+            try:
+                await asyncio.to_thread(self._write, phone_changes, phone_snapshot, gemini_temp_snapshot, extraction_cache_snapshot)
+            except Exception as e:
+                logger.error(f"Failed to persist {len(phone_changes)} change(s): {e}")
+                error = e
+                # Requeue the batch behind anything newer so it is retried on the next flush
+                for phone_id, phone in phone_changes.items():
+                    self._phone_changes.setdefault(phone_id, phone)
+                self._full_save = self._full_save or full_save
+                self._gemini_temp_dirty = self._gemini_temp_dirty or gemini_temp_dirty
+                self._dirty.set()
+            self._inflight_future = None
+            batch_future.set_result(error)
+
+    def _write(
+        self,
+        phone_changes: Dict[UUID, Union[PhoneNumber, int]],
+        phone_snapshot: Optional[tuple],
+        gemini_temp_snapshot: Optional[Dict[str, List[str]]],
+        extraction_cache_snapshot: Optional[Dict[str, List[str]]],
+    ):
+        # Runs in a worker thread
+        if phone_snapshot is not None:
+            self.storage.save_phone_numbers(*phone_snapshot)
+        elif phone_changes:
+            puts = [change for change in phone_changes.values() if isinstance(change, PhoneNumber)]
+            deletes = [
+                (phone_id, change) for phone_id, change in phone_changes.items()
+                if not isinstance(change, PhoneNumber)
+            ]
+            self.storage.apply_phone_number_changes(puts, deletes)
+        if gemini_temp_snapshot is not None:
+            self.storage.save_gemini_temp(gemini_temp_snapshot)
+        if extraction_cache_snapshot is not None:
+            try:
+                self.extraction_cache_provider().write(extraction_cache_snapshot)
+            except Exception as e:
+                logger.warning(f"Failed to save the extraction cache: {e}")
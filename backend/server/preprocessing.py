@@ -0,0 +1,100 @@
+# preprocessing.py
+
+# Shrinks images before they are uploaded to the model: phone digits stay readable
+# at a fraction of a full-resolution photo, so uploads are faster and cost fewer
+# tokens. Runs in a process pool (CPU bound). Needs Pillow; without it, or for
+# formats Pillow cannot open (e.g. HEIC), images are uploaded as received.
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import IO, Dict, Optional, Tuple
+import io
+import time
+import asyncio
+import logging
+import importlib.util
+import multiprocessing
+
+# Optional dependency, imported by the worker processes only
+PILLOW_AVAILABLE = importlib.util.find_spec("PIL") is not None
+
+logger = logging.getLogger(__name__)
+
+def preprocess_image(data: bytes, max_edge: int, grayscale: bool, quality: int) -> Optional[bytes]:
+    """JPEG bytes of the image upright (EXIF orientation applied), scaled down to
+    `max_edge` pixels on its longer side and optionally in autocontrasted grayscale.
+    Returns None if the image cannot be decoded. Runs in a worker process."""
+    from PIL import Image, ImageOps
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+            if grayscale:
+                image = ImageOps.autocontrast(image.convert("L"), cutoff=1)
+            elif image.mode != "RGB":
+                image = image.convert("RGB")
+            output = io.BytesIO()
+            image.save(output, format="JPEG", quality=quality, optimize=True)
+            return output.getvalue()
+    except Exception:
+        return None
+
+class ImagePreprocessor:
+    """Runs preprocess_image in a lazily started process pool and keeps metrics.
+
+    The result replaces the original only when it is smaller.
+    """
+
+    def __init__(self, enabled: bool, max_edge: int, grayscale: bool, quality: int, processes: int):
+        self.enabled = enabled and PILLOW_AVAILABLE
+        self.max_edge = max_edge
+        self.grayscale = grayscale
+        self.quality = quality
+        self.processes = processes
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.images = 0        # Images replaced by their preprocessed version
+        self.skipped = 0       # Undecodable, or not made smaller
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+        if enabled and not PILLOW_AVAILABLE:
+            logger.warning("Pillow is not installed; images are uploaded without preprocessing.")
+
+    async def process(self, image: IO[bytes], mime_type: str) -> Tuple[IO[bytes], str]:
+        """(image file, mime type) to upload instead of the original: `image` itself
+        or an in-memory JPEG. Without preprocessing the image is not read at all."""
+        if not self.enabled:
+            return image, mime_type
+        image.seek(0)
+        data = image.read()  # The worker process needs the bytes
+        if self._pool is None:
+            # Spawned (not forked) workers: the server process runs threads
+            self._pool = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context("spawn"))
+        started = time.perf_counter()
+        processed = await asyncio.get_running_loop().run_in_executor(
+            self._pool, preprocess_image, data, self.max_edge, self.grayscale, self.quality,
+        )
+        self.seconds += time.perf_counter() - started
+        self.bytes_in += len(data)
+        if processed is None or len(processed) >= len(data):
+            self.skipped += 1
+            self.bytes_out += len(data)
+            return image, mime_type
+        self.images += 1
+        self.bytes_out += len(processed)
+        return io.BytesIO(processed), "image/jpeg"
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "enabled": self.enabled,
+            "images": self.images,
+            "skipped": self.skipped,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "bytes_saved": self.bytes_in - self.bytes_out,
+            "seconds": round(self.seconds, 3),
+        }
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
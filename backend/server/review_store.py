@@ -0,0 +1,178 @@
+# review_store.py
+
+# Bounded, expiring store for phone numbers awaiting review, keyed by client IP.
+# Replaces the plain dict behind gemini_flash8b_temp_db.
+
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Callable, ContextManager, Dict, Iterable, Iterator, List, Optional
+from contextlib import nullcontext
+import time
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class _ReviewSession:
+    __slots__ = ("numbers", "expires_at", "size_bytes")
+
+    def __init__(self, expires_at: float):
+        self.numbers: Dict[str, None] = {}  # Ordered set of formatted numbers
+        self.expires_at = expires_at
+        self.size_bytes = 0
+
+class ReviewStore(MutableMapping):
+    """Review sessions with a per-session TTL, LRU eviction and set semantics.
+
+    Each IP maps to an ordered set of numbers, so repeated uploads of the same
+    image do not duplicate entries. Touching a session renews its TTL and marks
+    it most recently used. When the store exceeds `max_sessions` or `max_bytes`
+    (approximate, counting IP and number characters), the least recently used
+    sessions are evicted. Reads behave like a dict of IP -> list of numbers.
+    """
+
+    def __init__(self, ttl_seconds: float, max_sessions: int, max_bytes: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._sessions: "OrderedDict[str, _ReviewSession]" = OrderedDict()  # Least recently used first
+        self._size_bytes = 0
+
+    # ------------------------------------------------------
+    # Session bookkeeping
+    # ------------------------------------------------------
+    def _live_session(self, client_ip: str) -> Optional[_ReviewSession]:
+        session = self._sessions.get(client_ip)
+        if session is not None and session.expires_at <= time.monotonic():
+            self._drop(client_ip)
+            return None
+        return session
+
+    def _touch(self, client_ip: str, session: _ReviewSession):
+        session.expires_at = time.monotonic() + self.ttl_seconds
+        self._sessions.move_to_end(client_ip)
+
+    def _drop(self, client_ip: str):
+        session = self._sessions.pop(client_ip)
+        self._size_bytes -= len(client_ip) + session.size_bytes
+
+    def _add_to_session(self, session: _ReviewSession, numbers: Iterable[str]) -> List[str]:
+        added = []
+        for number in numbers:
+            if number not in session.numbers:
+                session.numbers[number] = None
+                session.size_bytes += len(number)
+                self._size_bytes += len(number)
+                added.append(number)
+        return added
+
+    def _evict(self, keep: str):
+        while len(self._sessions) > self.max_sessions or self._size_bytes > self.max_bytes:
+            oldest = next(iter(self._sessions))
+            if oldest == keep:
+                break  # Never evict the session being written
+            logger.info(f"Evicting review session for IP {oldest}")
+            self._drop(oldest)
+
+    # ------------------------------------------------------
+    # Review operations
+    # ------------------------------------------------------
+    def add_numbers(self, client_ip: str, numbers: Iterable[str]) -> List[str]:
+        """Add numbers to a session (creating it if needed). Returns the newly added ones."""
+        session = self._live_session(client_ip)
+        if session is None:
+            session = _ReviewSession(0)
+            self._sessions[client_ip] = session
+            self._size_bytes += len(client_ip)
+        added = self._add_to_session(session, numbers)
+        self._touch(client_ip, session)
+        self._evict(keep=client_ip)
+        return added
+
+    def discard_number(self, client_ip: str, number: str):
+        session = self._live_session(client_ip)
+        if session is not None and number in session.numbers:
+            del session.numbers[number]
+            session.size_bytes -= len(number)
+            self._size_bytes -= len(number)
+            self._touch(client_ip, session)
+
+    def sweep(self) -> int:
+        """Remove expired sessions. Returns how many were removed."""
+        now = time.monotonic()
+        expired = [ip for ip, session in self._sessions.items() if session.expires_at <= now]
+        for client_ip in expired:
+            self._drop(client_ip)
+        return len(expired)
+
+    def reload(self, sessions: Dict[str, List[str]]):
+        """Replace every session's numbers with `sessions` (e.g. as saved by another
+        worker). Sessions that already existed keep their TTL."""
+        for client_ip in [ip for ip in self._sessions if ip not in sessions]:
+            self._drop(client_ip)
+        for client_ip, numbers in sessions.items():
+            session = self._sessions.get(client_ip)
+            if session is None:
+                self.add_numbers(client_ip, numbers)
+                continue
+            self._size_bytes -= session.size_bytes
+            session.numbers, session.size_bytes = {}, 0
+            self._add_to_session(session, numbers)
+
+    def copy(self) -> Dict[str, List[str]]:
+        """Plain {ip: [numbers]} dict of live sessions (for persistence)."""
+        now = time.monotonic()
+        return {
+            ip: list(session.numbers)
+            for ip, session in list(self._sessions.items())
+            if session.expires_at > now
+        }
+
+    # ------------------------------------------------------
+    # Mapping interface: IP -> list of numbers
+    # ------------------------------------------------------
+    def __getitem__(self, client_ip: str) -> List[str]:
+        session = self._live_session(client_ip)
+        if session is None:
+            raise KeyError(client_ip)
+        self._touch(client_ip, session)
+        return list(session.numbers)
+
+    def __setitem__(self, client_ip: str, numbers: List[str]):
+        # Replace the session's numbers (duplicates collapse)
+        if client_ip in self._sessions:
+            self._drop(client_ip)
+        self.add_numbers(client_ip, numbers)
+
+    def __delitem__(self, client_ip: str):
+        if self._live_session(client_ip) is None:
+            raise KeyError(client_ip)
+        self._drop(client_ip)
+
+    def __contains__(self, client_ip) -> bool:
+        return self._live_session(client_ip) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self.copy()))
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+# ------------------------------------------------------
+# Background sweeper (started by the FastAPI lifespan)
+# ------------------------------------------------------
+async def sweep_review_store(
+    store: ReviewStore,
+    interval: float,
+    on_sweep: Callable[[], None],
+    transaction: Callable[[], ContextManager] = nullcontext,
+):
+    """Periodically drop expired sessions and call `on_sweep` when any were removed.
+    Both run inside `transaction()` (see database.storage_transaction)."""
+    while True:
+        await asyncio.sleep(interval)
+        with transaction():
+            removed = store.sweep()
+            if removed:
+                logger.info(f"Swept {removed} expired review session(s).")
+                on_sweep()
@@ -3,108 +3,418 @@
 # **WARNING: DO NOT OMIT ANYTHING FROM THE FOLLOWING**,
 # if changing add notes be concise to what was done and why
 
-from fastapi import APIRouter, HTTPException, Request
-from models.index import PhoneNumber, PhoneNumberCreate, PhoneNumberUpdate
-from database import phone_numbers_db, save_phone_numbers_to_file
-from typing import List
+from fastapi import APIRouter, Body, Header, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import ValidationError
+from models.index import PhoneNumber, PhoneNumberCreate, PhoneNumberUpdate, PhoneNumberBatchItem, PhoneNumberBulkUpdate
+from database import phone_numbers_db, find_phone_number_id, put_phone_number, remove_phone_number, wait_for_persistence, iter_phone_numbers_after
+from database import put_phone_numbers, iter_phone_number_ids_in_area
+from database import phone_numbers_tombstones, current_change_seq, phone_number_changes_since
+from database import suggest_phone_numbers, reserve_phone_numbers, phone_numbers_history, storage_transaction
+from database import encoded_phone_number, encoded_phone_numbers_list
+from audit import append_audit_entry
+from config import PERSISTENCE_DURABLE_DEFAULT, PHONE_NUMBERS_MAX_PAGE_SIZE, PHONE_NUMBERS_MAX_BATCH_SIZE
+from config import PHONE_NUMBER_RESERVATION_SECONDS
+from snapshot import json_default
+from models.phone_normalizer import phone_number_key
+from typing import List, Optional, Tuple
 from uuid import UUID
+from datetime import date, datetime, timezone
+import time
+import json
+import zlib
 
 router = APIRouter()
 
+# Weak ETag for the store's current change sequence; `variant` distinguishes query shapes
+def store_etag(variant: str = "") -> str:
+    seq = current_change_seq()
+    return f'W/"{seq}-{zlib.crc32(variant.encode()):08x}"' if variant else f'W/"{seq}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == "*" or etag in (tag.strip() for tag in if_none_match.split(","))
+
+# Strong ETag of a single record: its version
+def phone_etag(phone: PhoneNumber) -> str:
+    return f'"{phone.version}"'
+
+# Optimistic concurrency: reject a write with 409 when the client's If-Match header
+# (an ETag from GET /{id}, a bare version or "*") or `expected_version` no longer
+# matches the stored version, i.e. someone else changed the record since it was read
+def check_phone_version(phone: PhoneNumber, if_match: Optional[str], expected_version: Optional[int]):
+    if expected_version is not None and expected_version != phone.version:
+        raise HTTPException(status_code=409, detail=f"Version conflict: expected {expected_version}, current is {phone.version}.")
+    if if_match is None or if_match.strip() == "*":
+        return
+    versions = {tag.strip().removeprefix("W/").strip('"') for tag in if_match.split(",")}
+    if str(phone.version) not in versions:
+        raise HTTPException(status_code=409, detail=f"Version conflict: If-Match {if_match} does not match current version {phone.version}.")
+
+# Apply update fields to a phone number. A last_used update counts towards the usage
+# counters; last_used / last_tried updates produce history entries for the history
+# segment (appended by the caller once the update is stored).
+# Returns a new object and the entries; the stored record is left untouched.
+def apply_phone_number_update(phone: PhoneNumber, updated_data: dict, client_ip: str) -> Tuple[PhoneNumber, List[dict]]:
+    changes = {**updated_data, "updated_ip": client_ip}
+    history = []
+    # Add to the immutable history if last_used is being updated
+    if 'last_used' in updated_data:
+        history.append({"id": str(phone.id), "timestamp": updated_data['last_used'], "ip": client_ip, "action": "used"})
+        if updated_data['last_used'] is not None:
+            changes["usage"] = phone.usage.record_use(updated_data['last_used'])
+    # Add to the immutable history if last_tried is being updated
+    if 'last_tried' in updated_data:
+        history.append({"id": str(phone.id), "timestamp": updated_data['last_tried'], "ip": client_ip, "action": "tried"})
+    return phone.copy(update=changes), history
+
 # ------------------------------------------------------
 # CRUD Routes (Create, Read, Update, Delete operations)
 # ------------------------------------------------------
 
 # Create a new phone number entry
 @router.post("/", response_model=PhoneNumber)
-async def create_phone_number(phone: PhoneNumberCreate, request: Request):
+async def create_phone_number(phone: PhoneNumberCreate, request: Request, durable: bool = PERSISTENCE_DURABLE_DEFAULT):
     client_ip = request.client.host  # Get client's IP address
     
-    # Check for duplicate number in the database
-    for pn in phone_numbers_db.values():
-        if pn.number == phone.number:
+    with storage_transaction():  # Atomic across workers in multi-process mode
+        # Check for duplicate number in the database (O(1) via the number index)
+        if find_phone_number_id(phone.number) is not None:
             raise HTTPException(status_code=400, detail="Phone number already exists.")
-    
-    # Create new PhoneNumber object and store it in the in-memory database
-    new_phone = PhoneNumber(**phone.dict(), created_ip=client_ip)  # Use dict() to unpack the data
-    phone_numbers_db[new_phone.id] = new_phone  # Add the new phone to the database
-    
-    # Save updated data to JSON file
-    save_phone_numbers_to_file(phone_numbers_db)
+        
+        # Create new PhoneNumber object and store it in the in-memory database
+        new_phone = PhoneNumber(**phone.dict(), created_ip=client_ip)  # Use dict() to unpack the data
+        
+        # Add the new phone to the database, index it and persist it (journal append)
+        put_phone_number(new_phone)
+    await wait_for_persistence(durable)  # Optionally wait for the write to reach storage
 
     return new_phone
 
+# Create (or, with `upsert`, update) many phone numbers in one request.
+# Items are validated and deduplicated (within the batch and against the store) in
+# one pass, applied together and persisted in a single write. The response lists a
+# result per item: created, updated, exists, duplicate or invalid. With `atomic`,
+# any failed item rejects the whole batch and nothing is applied. An item with
+# `expected_version` only updates if the stored version matches (else: conflict).
+@router.post("/batch")
+async def batch_upsert_phone_numbers(
+    request: Request,
+    items: List[dict] = Body(...),
+    upsert: bool = False,
+    atomic: bool = False,
+    durable: bool = PERSISTENCE_DURABLE_DEFAULT,
+):
+    client_ip = request.client.host  # Get client's IP address
+    if len(items) > PHONE_NUMBERS_MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batches are limited to {PHONE_NUMBERS_MAX_BATCH_SIZE} items.")
+
+    # Validation through the write runs as one step (and under the cross-worker
+    # write lock in multi-process mode)
+    with storage_transaction():
+        results = []
+        staged: List[PhoneNumber] = []
+        history: List[dict] = []
+        seen_keys = set()
+        for position, raw_item in enumerate(items):
+            try:
+                item = PhoneNumberBatchItem.parse_obj(raw_item)
+            except ValidationError as e:
+                detail = "; ".join(error["msg"] for error in e.errors())
+                results.append({"index": position, "status": "invalid", "detail": detail})
+                continue
+
+            key = phone_number_key(item.number)
+            if key in seen_keys:
+                results.append({"index": position, "number": item.number, "status": "duplicate", "detail": "Repeated earlier in the batch."})
+                continue
+            seen_keys.add(key)
+
+            item_data = item.dict(exclude_unset=True)
+            expected_version = item_data.pop("expected_version", None)
+            existing_id = find_phone_number_id(item.number)
+            if expected_version is not None:
+                current_version = phone_numbers_db[existing_id].version if existing_id is not None else None
+                if current_version != expected_version:
+                    results.append({"index": position, "number": item.number, "status": "conflict", "version": current_version, "detail": "Version conflict."})
+                    continue
+            if existing_id is None:
+                if item.has_redeem_value is None:
+                    results.append({"index": position, "number": item.number, "status": "invalid", "detail": "has_redeem_value is required to create a phone number."})
+                    continue
+                timestamps = {field: item_data.pop(field) for field in ("last_used", "last_tried") if field in item_data}
+                try:
+                    phone = PhoneNumber(**item_data, created_ip=client_ip)
+                except ValidationError as e:
+                    detail = "; ".join(error["msg"] for error in e.errors())
+                    results.append({"index": position, "number": item.number, "status": "invalid", "detail": detail})
+                    continue
+                if timestamps:
+                    phone, entries = apply_phone_number_update(phone, timestamps, client_ip)
+                    history += entries
+                status = "created"
+            elif upsert or expected_version is not None:
+                item_data.pop("number")
+                phone, entries = apply_phone_number_update(phone_numbers_db[existing_id], item_data, client_ip)
+                history += entries
+                status = "updated"
+            else:
+                results.append({"index": position, "number": item.number, "status": "exists", "id": str(existing_id), "detail": "Phone number already exists."})
+                continue
+            staged.append(phone)
+            results.append({"index": position, "number": phone.number, "status": status, "id": str(phone.id)})
+
+        failed = len(items) - len(staged)
+        if atomic and failed:
+            return JSONResponse(status_code=400, content={"detail": "Batch rejected; nothing was applied.", "results": results})
+
+        if staged:
+            put_phone_numbers(staged)
+            phone_numbers_history.append(history)
+    if staged:
+        await wait_for_persistence(durable)  # Optionally wait for the write to reach storage
+
+    print(f"Batch of {len(items)} phone numbers ({len(staged)} applied) from IP: {client_ip}")
+    return {
+        "created": sum(result["status"] == "created" for result in results),
+        "updated": sum(result["status"] == "updated" for result in results),
+        "failed": failed,
+        "results": results,
+    }
+
 # Retrieve all phone numbers in the database
+# Without query parameters this returns the full list (what the iOS app expects).
+# With any of them it pages in UUID order: `limit` + `cursor` (from the X-Next-Cursor
+# response header), `fields` projection (comma separated), `is_deleted` /
+# `has_redeem_value` filters, and `format=ndjson` to stream one record per line.
+# Responses carry an ETag tied to the store's change sequence; a matching
+# If-None-Match gets 304 Not Modified without rebuilding the body. Bodies are built
+# from pre-encoded record JSON (see database.py), not re-validated per request.
 @router.get("/", response_model=List[PhoneNumber])
-async def get_phone_numbers(request: Request):
+async def get_phone_numbers(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=PHONE_NUMBERS_MAX_PAGE_SIZE),
+    cursor: Optional[UUID] = None,
+    fields: Optional[str] = None,
+    is_deleted: Optional[bool] = None,
+    has_redeem_value: Optional[bool] = None,
+    format: str = "json",
+    if_none_match: Optional[str] = Header(None),
+):
     client_ip = request.client.host  # Get client's IP address
     print(f"Phone numbers requested from IP: {client_ip}")
-    return list(phone_numbers_db.values())
+    if format not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be 'json' or 'ndjson'.")
+    etag = store_etag(str(request.query_params))
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    if limit is None and cursor is None and fields is None and is_deleted is None \
+            and has_redeem_value is None and format == "json":
+        return Response(content=encoded_phone_numbers_list(), media_type="application/json", headers={"ETag": etag})
+
+    include = None
+    if fields is not None:
+        include = {field.strip() for field in fields.split(",") if field.strip()}
+        unknown = include - set(PhoneNumber.__fields__)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    # Select the page first so the next cursor is known before the body is sent
+    page = []
+    next_cursor = None
+    for phone in iter_phone_numbers_after(cursor):
+        if is_deleted is not None and phone.is_deleted != is_deleted:
+            continue
+        if has_redeem_value is not None and phone.has_redeem_value != has_redeem_value:
+            continue
+        if limit is not None and len(page) == limit:
+            next_cursor = str(page[-1].id)  # At least one more match exists
+            break
+        page.append(phone)
+
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    headers["ETag"] = etag
+
+    def encode(phone: PhoneNumber) -> bytes:
+        if include is None:
+            return encoded_phone_number(phone)
+        return json.dumps(phone.dict(include=include), default=json_default, separators=(",", ":")).encode()
+
+    if format == "ndjson":
+        return StreamingResponse(
+            (encode(phone) + b"\n" for phone in page),
+            media_type="application/x-ndjson",
+            headers=headers,
+        )
+    return Response(content=b"[" + b",".join(encode(phone) for phone in page) + b"]", media_type="application/json", headers=headers)
+
+# Delta sync: records changed and ids deleted after change sequence `since`, oldest
+# first. Clients store the returned `seq` and pass it as `since` next time; while
+# `has_more` is true, call again straight away. Declared before /{phone_id}.
+@router.get("/changes")
+async def get_phone_number_changes(
+    request: Request,
+    since: int = Query(0, ge=0),
+    limit: int = Query(PHONE_NUMBERS_MAX_PAGE_SIZE, ge=1, le=PHONE_NUMBERS_MAX_PAGE_SIZE),
+    if_none_match: Optional[str] = Header(None),
+):
+    client_ip = request.client.host  # Get client's IP address
+    etag = store_etag(f"changes:{since}:{limit}")
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    changes = phone_number_changes_since(since)
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    updated = []
+    deleted = []
+    for phone_id, change_seq in changes:
+        phone = phone_numbers_db.get(phone_id)
+        if phone is not None:
+            updated.append(phone.dict())
+        elif phone_id in phone_numbers_tombstones:
+            deleted.append({"id": str(phone_id), "change_seq": change_seq})
+    seq = changes[-1][1] if has_more else current_change_seq()
+    print(f"Phone number changes since {since} requested from IP: {client_ip}")
+    body = {"seq": seq, "has_more": has_more, "updated": updated, "deleted": deleted}
+    return Response(
+        content=json.dumps(body, default=json_default, separators=(",", ":")),
+        media_type="application/json",
+        headers={"ETag": etag},
+    )
+
+# Suggest the best numbers to use now: eligible under the usage rules (max uses per
+# day/week, not reserved, not deleted), redeemable first, then least recently used
+@router.get("/suggest", response_model=List[PhoneNumber])
+async def suggest_phone_numbers_route(request: Request, limit: int = Query(1, ge=1, le=100)):
+    client_ip = request.client.host  # Get client's IP address
+    print(f"Phone number suggestions requested from IP: {client_ip}")
+    return suggest_phone_numbers(limit)
+
+# Reserve suggested numbers so concurrent clients (watch/phone) never get the same
+# one; reserved numbers are skipped by /suggest until the reservation ends
+@router.post("/suggest/reserve")
+async def reserve_phone_numbers_route(
+    request: Request,
+    limit: int = Query(1, ge=1, le=100),
+    seconds: float = Query(PHONE_NUMBER_RESERVATION_SECONDS, gt=0, le=24 * 60 * 60),
+):
+    client_ip = request.client.host  # Get client's IP address
+    phones, reserved_until = reserve_phone_numbers(limit, seconds)
+    print(f"{len(phones)} phone number(s) reserved from IP: {client_ip}")
+    return {
+        "reserved_until": datetime.fromtimestamp(reserved_until, timezone.utc),
+        "phone_numbers": phones,
+    }
 
 # Retrieve a single phone number by its ID
 @router.get("/{phone_id}", response_model=PhoneNumber)
-async def get_phone_number(phone_id: UUID, request: Request):
+async def get_phone_number(phone_id: UUID, request: Request, if_none_match: Optional[str] = Header(None)):
     client_ip = request.client.host  # Get client's IP address
     phone = phone_numbers_db.get(phone_id)  # Fetch phone by ID
     if not phone:
         raise HTTPException(status_code=404, detail="Phone number not found.")
+    etag = phone_etag(phone)  # Changes whenever this record does; send it back as If-Match
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
     print(f"Phone number {phone_id} accessed from IP: {client_ip}")
-    return phone
+    return Response(content=encoded_phone_number(phone), media_type="application/json", headers={"ETag": etag})
+
+# Full last_used / last_tried history of a phone number, oldest first, read from the
+# append-only history segment
+@router.get("/{phone_id}/history")
+async def get_phone_number_history(phone_id: UUID, request: Request):
+    client_ip = request.client.host  # Get client's IP address
+    phone = phone_numbers_db.get(phone_id)  # Fetch phone by ID
+    if not phone:
+        raise HTTPException(status_code=404, detail="Phone number not found.")
+    print(f"Phone number {phone_id} history accessed from IP: {client_ip}")
+    return {"id": str(phone_id), "history": phone_numbers_history.read(phone_id)}
+
+# Uses per day over the last 7 days (UTC), from the record's usage counters
+@router.get("/{phone_id}/usage")
+async def get_phone_number_usage(phone_id: UUID, request: Request):
+    client_ip = request.client.host  # Get client's IP address
+    phone = phone_numbers_db.get(phone_id)  # Fetch phone by ID
+    if not phone:
+        raise HTTPException(status_code=404, detail="Phone number not found.")
+    today = int(time.time() // 86400)
+    daily = [
+        {"date": date.fromordinal(date(1970, 1, 1).toordinal() + day), "uses": phone.usage.uses_between(day, day)}
+        for day in range(today - 6, today + 1)
+    ]
+    print(f"Phone number {phone_id} usage accessed from IP: {client_ip}")
+    return {
+        "id": str(phone_id),
+        "today": daily[-1]["uses"],
+        "last_7_days": phone.usage.uses_between(today - 6, today),
+        "daily": daily,
+    }
 
 # Route: Search for phone number and retrieve its UUID
 @router.get("/search_phone_number/{phone_number}")
 async def search_phone_number(phone_number: str, request: Request):
     client_ip = request.client.host  # Get client's IP address
-    # Search the database for the phone number
-    for phone in phone_numbers_db.values():
-        if phone.number == phone_number:
-            print(f"Phone number {phone_number} found, accessed from IP: {client_ip}")
-            return {"id": str(phone.id), "client_ip": client_ip}
+    # Look up the phone number in the number index
+    phone_id = find_phone_number_id(phone_number)
+    if phone_id is not None:
+        print(f"Phone number {phone_number} found, accessed from IP: {client_ip}")
+        return {"id": str(phone_id), "client_ip": client_ip}
     raise HTTPException(status_code=404, detail="Phone number not found.")
 
-# Update a phone number's details
+# Update a phone number's details (conditionally with If-Match / expected_version)
 @router.put("/{phone_id}", response_model=PhoneNumber)
-async def update_phone_number(phone_id: UUID, phone_update: PhoneNumberUpdate, request: Request):
+async def update_phone_number(
+    phone_id: UUID,
+    phone_update: PhoneNumberUpdate,
+    request: Request,
+    response: Response,
+    expected_version: Optional[int] = None,
+    if_match: Optional[str] = Header(None),
+    durable: bool = PERSISTENCE_DURABLE_DEFAULT,
+):
     client_ip = request.client.host  # Get client's IP address
-    phone = phone_numbers_db.get(phone_id)  # Fetch phone by ID
-    if not phone:
-        raise HTTPException(status_code=404, detail="Phone number not found.")
-    
-    # Update fields of the phone number with the provided values
-    updated_data = phone_update.dict(exclude_unset=True)  # Only update provided fields
-    
-    # Add to the immutable history if last_used is being updated
-    if 'last_used' in updated_data:
-        phone.last_used_history.append({
-            "timestamp": updated_data['last_used'],
-            "ip": client_ip,
-            "action": "used"
-        })
-    
-    # Add to the immutable history if last_tried is being updated
-    if 'last_tried' in updated_data:
-        phone.last_tried_history.append({
-            "timestamp": updated_data['last_tried'],
-            "ip": client_ip,
-            "action": "tried"
-        })
-    
-    updated_phone = phone.copy(update={**updated_data, "updated_ip": client_ip})  # Create updated phone object
-    phone_numbers_db[phone_id] = updated_phone  # Save updated phone to the database
-    
-    # Save updated data to JSON file
-    save_phone_numbers_to_file(phone_numbers_db)
+    # The version check and the write run as one step: no await in between, and under
+    # the cross-worker write lock in multi-process mode
+    with storage_transaction():
+        phone = phone_numbers_db.get(phone_id)  # Fetch phone by ID
+        if not phone:
+            raise HTTPException(status_code=404, detail="Phone number not found.")
+        check_phone_version(phone, if_match, expected_version)
+        
+        # Update fields of the phone number with the provided values
+        updated_data = phone_update.dict(exclude_unset=True)  # Only update provided fields
+        
+        # Create updated phone object (usage counters) and its history entries
+        updated_phone, history = apply_phone_number_update(phone, updated_data, client_ip)
+        
+        # Save updated phone to the database, reindex it and persist it (journal append)
+        put_phone_number(updated_phone)
+        phone_numbers_history.append(history)  # Append-only history segment
+    await wait_for_persistence(durable)  # Optionally wait for the write to reach storage
 
+    response.headers["ETag"] = phone_etag(updated_phone)
     print(f"Phone number {phone_id} updated from IP: {client_ip}")
     return updated_phone
 
-# Delete a phone number entry
+# Delete a phone number entry (conditionally with If-Match / expected_version)
 @router.delete("/{phone_id}", response_model=dict)
-async def delete_phone_number(phone_id: UUID, request: Request):
+async def delete_phone_number(
+    phone_id: UUID,
+    request: Request,
+    expected_version: Optional[int] = None,
+    if_match: Optional[str] = Header(None),
+    durable: bool = PERSISTENCE_DURABLE_DEFAULT,
+):
     client_ip = request.client.host  # Get client's IP address
-    if phone_id in phone_numbers_db:
-        del phone_numbers_db[phone_id]  # Remove the phone number from the database
-        save_phone_numbers_to_file(phone_numbers_db)  # Save updated data to JSON file
+    with storage_transaction():  # Atomic across workers in multi-process mode
+        phone = phone_numbers_db.get(phone_id)
+        if phone is not None:
+            check_phone_version(phone, if_match, expected_version)
+        removed = remove_phone_number(phone_id)  # Remove from the database and index, persist the removal
+    if removed is not None:
+        await wait_for_persistence(durable)  # Optionally wait for the write to reach storage
         print(f"Phone number {phone_id} deleted from IP: {client_ip}")
         return {"detail": "Phone number deleted."}
     else:
@@ -114,13 +424,78 @@ async def delete_phone_number(phone_id: UUID, request: Request):
 # Optional: Endpoint for Bulk User Upload (e.g., updating multiple phone numbers)
 # ------------------------------------------------------
 
+# Compare datetimes regardless of whether they carry a timezone (naive means UTC)
+def as_utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+# Apply a bulk update and record it as one audit entry. Candidates come from the
+# area code index when an area code is given; matching records are replaced by
+# updated copies (with updated_ip) and persisted together in one batch.
+def run_bulk_update(bulk_update: PhoneNumberBulkUpdate, client_ip: str) -> dict:
+    criteria = bulk_update.filter
+    if criteria.area_code is not None:
+        candidates = [phone_numbers_db.get(phone_id) for phone_id in iter_phone_number_ids_in_area(criteria.area_code)]
+    else:
+        candidates = list(phone_numbers_db.values())
+    before = as_utc(criteria.last_used_before) if criteria.last_used_before else None
+    after = as_utc(criteria.last_used_after) if criteria.last_used_after else None
+    assignments = bulk_update.set.dict(exclude_unset=True)
+    increments = bulk_update.increment
+
+    updated = []
+    for phone in candidates:
+        if phone is None:
+            continue
+        if criteria.is_deleted is not None and phone.is_deleted != criteria.is_deleted:
+            continue
+        if criteria.has_redeem_value is not None and phone.has_redeem_value != criteria.has_redeem_value:
+            continue
+        if before or after:
+            if phone.last_used is None:
+                continue
+            last_used = as_utc(phone.last_used)
+            if (before and last_used >= before) or (after and last_used <= after):
+                continue
+        changes = {**assignments, "updated_ip": client_ip}
+        for field, amount in increments.items():
+            changes[field] = changes.get(field, getattr(phone, field)) + amount  # Assignments apply first
+        if "number_of_points" in increments:
+            changes["number_of_points"] = int(changes["number_of_points"])
+        updated.append(phone.copy(update=changes))
+
+    first_change_seq = current_change_seq() + 1
+    if updated:
+        put_phone_numbers(updated)
+    audit_entry = append_audit_entry({
+        "action": "bulk_update",
+        "ip": client_ip,
+        "filter": criteria.dict(exclude_unset=True),
+        "set": assignments,
+        "increment": increments,
+        "matched": len(updated),
+        "change_seqs": [first_change_seq, current_change_seq()] if updated else [],
+    })
+    return {"matched": len(updated), "audit": audit_entry}
+
+# Bulk update: assign (`set`) and/or add to (`increment`) fields on every phone number
+# matching `filter` (area code, is_deleted, has_redeem_value, last_used before/after)
+@router.post("/bulk_update")
+async def bulk_update_phone_numbers(bulk_update: PhoneNumberBulkUpdate, request: Request, durable: bool = PERSISTENCE_DURABLE_DEFAULT):
+    client_ip = request.client.host  # Get client's IP address
+    with storage_transaction():  # Atomic across workers in multi-process mode
+        result = run_bulk_update(bulk_update, client_ip)
+    await wait_for_persistence(durable)  # Optionally wait for the write to reach storage
+    print(f"Bulk update of {result['matched']} phone numbers from IP: {client_ip}")
+    return result
+
+# Kept for existing clients: a bulk update of every phone number
 @router.post("/upload_calculations/")
-async def upload_calculations(has_redeem_value: bool, number_of_points: int, request: Request):
+async def upload_calculations(has_redeem_value: bool, number_of_points: int, request: Request, durable: bool = PERSISTENCE_DURABLE_DEFAULT):
     client_ip = request.client.host  # Get client's IP address
     # Bulk update all phone numbers with the provided redeem value and points
-    for phone in phone_numbers_db.values():
-        phone.has_redeem_value = has_redeem_value
-        phone.number_of_points = number_of_points
-    save_phone_numbers_to_file(phone_numbers_db)  # Save updated data to JSON file
+    bulk_update = PhoneNumberBulkUpdate(set=PhoneNumberUpdate(has_redeem_value=has_redeem_value, number_of_points=number_of_points))
+    with storage_transaction():  # Atomic across workers in multi-process mode
+        run_bulk_update(bulk_update, client_ip)
+    await wait_for_persistence(durable)
     print(f"Bulk calculations uploaded from IP: {client_ip}")
     return {"detail": "Calculations updated for all phone numbers."}
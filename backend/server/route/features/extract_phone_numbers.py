@@ -3,15 +3,31 @@
 # **WARNING: DO NOT OMIT ANYTHING FROM THE FOLLOWING**,
 # if changing add notes be concise to what was done and why
 
-from fastapi import APIRouter, HTTPException, Request
-from models.index import Base64ImageInput, PhoneNumberCreate, PhoneNumber  # Import PhoneNumberCreate and PhoneNumber
-from database import gemini_flash8b_temp_db, save_gemini_temp_to_file, phone_numbers_db, save_phone_numbers_to_file
-from gemini_utils import gemini_flash8b_upload_file, gemini_flash8b_validate_phone_number, gemini_flash8b_model, logger
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from models.index import Base64ImageInput, PhoneNumber  # Import PhoneNumber
+from models.index import TextExtractionInput, Base64ImageBatchInput
+from database import gemini_flash8b_temp_db, save_gemini_temp_to_file, find_phone_number_id, put_phone_number, wait_for_persistence, storage_transaction
+from database import gemini_flash8b_extraction_cache, save_extraction_cache
+from config import PERSISTENCE_DURABLE_DEFAULT, UPLOAD_IMAGE_MAX_BYTES, UPLOAD_IMAGE_SPOOL_BYTES, EXTRACT_TEXT_MAX_CHARS
+from config import EXTRACTOR, FAKE_EXTRACTOR_DELAY, EXTRACTION_WORKERS, EXTRACTION_MAX_PENDING, EXTRACTION_TIMEOUT
+from config import EXTRACTION_MAX_ATTEMPTS, EXTRACTION_RETRY_BACKOFF, EXTRACTION_JOB_TTL_SECONDS
+from config import EXTRACTION_BATCH_MAX_IMAGES, UPLOAD_IMAGES_MAX_BYTES, EXTRACTION_PACK_SIZE
+from config import IMAGE_PREPROCESS, IMAGE_MAX_EDGE, IMAGE_GRAYSCALE, IMAGE_JPEG_QUALITY, IMAGE_PREPROCESS_PROCESSES
+from gemini_utils import gemini_flash8b_find_phone_numbers, logger
+from models.phone_normalizer import normalize_many
+from extraction_cache import extraction_cache_key
+from extraction_jobs import ExtractionJob, ExtractionQueue, ExtractionQueueFull
+from extractors import create_extractor
+from preprocessing import ImagePreprocessor
+from uploads import detect_image_mime_type, read_image_upload, read_image_uploads, read_capped_body
+from typing import IO, List, Optional, Tuple
+import asyncio
 import base64
-import os
 import json
-from uuid import uuid4
-from typing import List
+import io
 
 router = APIRouter()
 
@@ -19,8 +35,96 @@ router = APIRouter()
 # Gemini Flash-8B Integration for Image Upload and Phone Extraction
 # ------------------------------------------------------
 
+# Keep validated numbers for review under the client's IP and save the review buffer
+def add_numbers_for_review(client_ip: str, validated_numbers: List[str]):
+    # Store and save under the cross-worker write lock in multi-process mode
+    with storage_transaction():
+        # Store extracted numbers temporarily under the user's IP (numbers already under review are skipped)
+        added_numbers = gemini_flash8b_temp_db.add_numbers(client_ip, validated_numbers)
+        logger.info(f"Stored validated numbers for IP {client_ip}: {added_numbers}")
+        
+        # Save the temporary data
+        try:
+            save_gemini_temp_to_file(gemini_flash8b_temp_db)
+            logger.info("Temporary phone number data saved.")
+        except Exception as e:
+            logger.error(f"Failed to save temporary data: {e}")
+            raise HTTPException(status_code=500, detail="Failed to save temporary data.")
+
+# A finished extraction: remember the result for each image
+def remember_extraction_results(job: ExtractionJob):
+    for cache_key, numbers in zip(job.cache_keys, job.results):
+        gemini_flash8b_extraction_cache.put(cache_key, numbers)
+    try:
+        save_extraction_cache(gemini_flash8b_extraction_cache)
+    except Exception as e:
+        logger.warning(f"Failed to save the extraction cache: {e}")
+
+# A finished single-image extraction: remember the result and add it for review
+def store_extraction_result(job: ExtractionJob):
+    remember_extraction_results(job)
+    add_numbers_for_review(job.client_ip, job.numbers)
+
+# Extraction jobs (started and stopped by the FastAPI lifespan); the extractor is
+# Gemini Flash-8B unless config.EXTRACTOR selects the local fake. Images are shrunk
+# before upload; cache keys stay on the original bytes, so repeats skip that too.
+extraction_queue = ExtractionQueue(
+    create_extractor(EXTRACTOR, FAKE_EXTRACTOR_DELAY),
+    workers=EXTRACTION_WORKERS,
+    max_pending=EXTRACTION_MAX_PENDING,
+    timeout=EXTRACTION_TIMEOUT,
+    max_attempts=EXTRACTION_MAX_ATTEMPTS,
+    retry_backoff=EXTRACTION_RETRY_BACKOFF,
+    job_ttl=EXTRACTION_JOB_TTL_SECONDS,
+    on_success=store_extraction_result,
+    preprocessor=ImagePreprocessor(IMAGE_PREPROCESS, IMAGE_MAX_EDGE, IMAGE_GRAYSCALE, IMAGE_JPEG_QUALITY, IMAGE_PREPROCESS_PROCESSES),
+)
+
+# Queue an extraction of the image for the client's IP. An image seen before (same
+# bytes and extractor: model and prompt) is answered from the extraction cache and
+# never queued (the job returned is already done). Takes over the image file: the
+# job closes it once done (it outlives the request), otherwise it is closed here.
+async def queue_extraction(image: IO[bytes], mime_type: str, file_name: Optional[str], client_ip: str) -> ExtractionJob:
+    try:
+        cache_key = await asyncio.to_thread(extraction_cache_key, image, extraction_queue.extractor.fingerprint)
+        cached_numbers = gemini_flash8b_extraction_cache.get(cache_key)
+        if cached_numbers is not None:
+            image.close()
+            logger.info(f"Extraction cache hit for image {cache_key[:12]}: {cached_numbers}")
+            add_numbers_for_review(client_ip, cached_numbers)
+            return extraction_queue.completed(client_ip, cached_numbers, cache_key)
+        try:
+            job = extraction_queue.submit(client_ip, [(image, mime_type, file_name)], [cache_key])
+        except ExtractionQueueFull as e:
+            logger.warning(f"Rejected extraction from IP {client_ip}: {e}")
+            raise HTTPException(status_code=503, detail="Too many extractions in progress, try again shortly.", headers={"Retry-After": "5"})
+    except BaseException:
+        image.close()
+        raise
+    logger.info(f"Extraction job {job.id} queued for IP {client_ip}")
+    return job
+
+# Queue an extraction (see queue_extraction). With `wait`, respond once the job is
+# done (as uploads always did); otherwise respond 202 with the job id to poll at
+# GET /jobs/{id}.
+async def submit_extraction(image: IO[bytes], mime_type: str, file_name: Optional[str], client_ip: str, wait: bool, response: Response) -> dict:
+    job = await queue_extraction(image, mime_type, file_name, client_ip)
+    if not wait:
+        response.status_code = 202
+        return {"detail": "Phone number extraction queued.", "job": job.to_dict()}
+    await job.wait()
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=f"Failed to extract phone numbers: {job.error}")
+    return {
+        "detail": "Phone numbers extracted for review.",
+        "numbers": job.numbers,
+        "job_id": job.id,
+    }
+
+# Kept for existing clients, which expect the numbers in the response: waits for the
+# extraction by default (`wait=false` to get a job id instead)
 @router.post("/upload_base64_image/", response_model=dict)
-async def gemini_flash8b_upload_base64_image(data: Base64ImageInput, request: Request):
+async def gemini_flash8b_upload_base64_image(data: Base64ImageInput, request: Request, response: Response, wait: bool = True):
     client_ip = request.client.host  # Get client's IP address
     logger.info(f"Request received from IP: {client_ip}")
 
@@ -33,112 +137,176 @@ async def gemini_flash8b_upload_base64_image(data: Base64ImageInput, request: Re
         logger.error(f"Failed to decode base64 image data: {e}")
         raise HTTPException(status_code=400, detail=f"Invalid Base64 image data: {e}")
 
-    # Generate a temporary file path
-    temp_image_path = f"/tmp/{uuid4()}_{data.file_name or 'uploaded_image.jpeg'}"
-    logger.info(f"Temporary image path generated: {temp_image_path}")
-    
-    # Save the decoded image to the temporary location
-    try:
-        with open(temp_image_path, "wb") as image_file:
-            image_file.write(image_data)
-        logger.info(f"Image saved to temporary location: {temp_image_path}")
-    except Exception as e:
-        logger.error(f"Failed to save image to temp file: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to save image: {e}")
+    # Upload straight from memory; the type comes from the image bytes (JPEG if unrecognized, as before)
+    mime_type = detect_image_mime_type(image_data[:16]) or "image/jpeg"
+    return await submit_extraction(io.BytesIO(image_data), mime_type, data.file_name, client_ip, wait, response)
 
-    # Upload the image to Gemini Flash-8B
-    try:
-        logger.info("Uploading image to Gemini Flash-8B...")
-        uploaded_file = gemini_flash8b_upload_file(temp_image_path, mime_type="image/jpeg")
-        logger.info(f"Image successfully uploaded to Gemini Flash-8B. File ID: {uploaded_file}")
-    except Exception as e:
-        logger.error(f"Failed to upload image to Gemini Flash-8B: {e}")
-        os.remove(temp_image_path)
-        raise HTTPException(status_code=500, detail=f"Failed to upload image to Gemini Flash-8B: {e}")
-    
-    # Start a chat session to extract the phone numbers using the correct prompt
-    try:
-        logger.info("Starting chat session with Gemini Flash-8B for phone number extraction...")
-        chat_session = gemini_flash8b_model.start_chat(
-            history=[
-                {
-                    "role": "user",
-                    "parts": [
-                        uploaded_file,
-                        "You are a software component, to extract phone number(s) from images to add to an internal db. From the image provided, identify and extract all valid US phone numbers. A valid US phone number must:\n\n1. Contain exactly 10 digits.\n2. Follow the format XXX-XXX-XXXX, where each 'X' is a digit from 0 to 9.\n\n**Instructions:**\n1. **Extract:** Scan the image and identify all sequences of digits that could represent US phone numbers.\n2. **Validate:**\n   - Ensure each identified sequence has exactly 10 digits.\n   - Format each valid number as XXX-XXX-XXXX.\n3. **Output:**\n   - Return only a single JSON array containing the valid, formatted phone numbers.\n   - **Do not include** any additional text, comments, explanations, or code block delimiters.\n\n**Example Output:**\n[\"555-123-4567\", \"800-555-0199\"]\n\n**Note:** Ensure that only legitimate and properly formatted US phone numbers are included in the output array.\n- Ensure the chain of thought for the prompt generation prevents stray characters (like Invalid USA phone number.) from being intermingled with the phone numbers.\n - **Do not include** any additional text, comments, explanations, or code block delimiters. If nothing say nothing",
-                    ],
-                }
-            ]
+# Upload an image as multipart/form-data (first file part) or as the raw request body
+# (e.g. Content-Type: image/jpeg, optional `file_name`). Preferred over
+# /upload_base64_image/: no base64 overhead, the body is streamed into a spooled
+# buffer (capped at UPLOAD_IMAGE_MAX_BYTES) and the type is detected from its bytes.
+# Responds 202 with an extraction job right away, unless `wait` is set.
+@router.post("/upload_image/", response_model=dict)
+async def gemini_flash8b_upload_image(request: Request, response: Response, file_name: Optional[str] = None, wait: bool = False):
+    client_ip = request.client.host  # Get client's IP address
+    logger.info(f"Image upload received from IP: {client_ip}")
+    image, mime_type, part_file_name = await read_image_upload(request, UPLOAD_IMAGE_MAX_BYTES, UPLOAD_IMAGE_SPOOL_BYTES)
+    # The spooled buffer itself goes to the job (hashed, preprocessed and uploaded from it)
+    return await submit_extraction(image, mime_type, file_name or part_file_name, client_ip, wait, response)
+
+def server_sent_event(event: str, data: dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n".encode()
+
+# Server-sent events variant of /upload_image/ (same body): the response streams
+# `number` events as the model writes each phone number, so the first arrive before
+# the whole answer. Events: `job` (queued), `number` ({"number": ...}) per number,
+# then `done` ({"detail", "numbers", "job_id"}, numbers stored for review) or
+# `error` ({"detail"}). A client that disconnects does not cancel the extraction.
+@router.post("/upload_image/stream/")
+async def gemini_flash8b_upload_image_stream(request: Request, file_name: Optional[str] = None):
+    client_ip = request.client.host  # Get client's IP address
+    logger.info(f"Streaming image upload received from IP: {client_ip}")
+    image, mime_type, part_file_name = await read_image_upload(request, UPLOAD_IMAGE_MAX_BYTES, UPLOAD_IMAGE_SPOOL_BYTES)
+    job = await queue_extraction(image, mime_type, file_name or part_file_name, client_ip)
+
+    async def events():
+        yield server_sent_event("job", job.to_dict())
+        async for number in job.follow():
+            yield server_sent_event("number", {"number": number})
+        if job.status == "failed":
+            yield server_sent_event("error", {"detail": f"Failed to extract phone numbers: {job.error}"})
+        else:
+            yield server_sent_event("done", {"detail": "Phone numbers extracted for review.", "numbers": job.numbers, "job_id": job.id})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+# Extract several images for review in one request: cached images are answered
+# right away, the rest are packed EXTRACTION_PACK_SIZE per model request and the
+# packs run concurrently on the extraction workers. The numbers of all images are
+# merged (without repeats) into the review buffer in one write. `images` is a list of
+# (bytes or None, file name, error) per image, in request order.
+async def extract_batch_for_review(images: List[Tuple[Optional[bytes], Optional[str], Optional[str]]], client_ip: str) -> dict:
+    results: List[Optional[dict]] = [None] * len(images)
+    misses = []  # (index, image bytes, mime type, file name, cache key)
+    fingerprint = extraction_queue.extractor.fingerprint
+    cache_keys = await asyncio.to_thread(
+        lambda: [extraction_cache_key(io.BytesIO(data), fingerprint) if data else None for data, _, _ in images]
+    )
+    for index, ((data, file_name, error), cache_key) in enumerate(zip(images, cache_keys)):
+        mime_type = detect_image_mime_type(data[:16]) if data else None
+        if error is None and mime_type is None:
+            error = "Unsupported image type (expected JPEG, PNG, WebP, HEIC or HEIF)."
+        if error is not None:
+            results[index] = {"index": index, "file_name": file_name, "status": "invalid", "detail": error}
+            continue
+        cached_numbers = gemini_flash8b_extraction_cache.get(cache_key)
+        if cached_numbers is not None:
+            results[index] = {"index": index, "file_name": file_name, "status": "succeeded", "cached": True, "numbers": cached_numbers}
+        else:
+            misses.append((index, data, mime_type, file_name, cache_key))
+
+    packs = [misses[start:start + EXTRACTION_PACK_SIZE] for start in range(0, len(misses), EXTRACTION_PACK_SIZE)]
+    if len(packs) > extraction_queue.available:
+        raise HTTPException(status_code=503, detail="Too many extractions in progress, try again shortly.", headers={"Retry-After": "5"})
+    jobs = [
+        extraction_queue.submit(
+            client_ip,
+            [(io.BytesIO(data), mime_type, file_name) for _, data, mime_type, file_name, _ in pack],
+            [cache_key for *_, cache_key in pack],
+            on_success=remember_extraction_results,  # Added for review below, all at once
         )
-        
-        response = chat_session.send_message("Extract phone numbers")
-        logger.info(f"Raw response from Gemini Flash-8B: {response.text}")
-        
-        # Parse the response to extract the JSON array
-        # Remove code block delimiters if present
-        response_text = response.text.strip()
-        if response_text.startswith("```"):
-            # Assuming the format is ```json\n[...]\n```
+        for pack in packs
+    ]
+    logger.info(f"Batch of {len(images)} images from IP {client_ip}: {len(misses)} to extract in {len(jobs)} job(s)")
+    await asyncio.gather(*(job.wait() for job in jobs))
+    for pack, job in zip(packs, jobs):
+        for position, (index, _, _, file_name, _) in enumerate(pack):
+            if job.status == "succeeded":
+                results[index] = {"index": index, "file_name": file_name, "status": "succeeded", "cached": False, "numbers": job.results[position], "job_id": job.id}
+            else:
+                results[index] = {"index": index, "file_name": file_name, "status": "failed", "detail": job.error, "job_id": job.id}
+
+    succeeded = [result for result in results if result["status"] == "succeeded"]
+    numbers = list(dict.fromkeys(number for result in succeeded for number in result["numbers"]))
+    if succeeded:
+        add_numbers_for_review(client_ip, numbers)
+    return {
+        "detail": "Phone numbers extracted for review.",
+        "numbers": numbers,
+        "extracted": len(succeeded),
+        "failed": len(images) - len(succeeded),
+        "results": results,
+    }
+
+# Upload several images at once: multipart/form-data with one file part per image,
+# or JSON {"images": [{"image_base64": ..., "file_name": ...}, ...]}. Waits for every
+# image and reports a result per image (succeeded, failed or invalid).
+@router.post("/upload_images/", response_model=dict)
+async def gemini_flash8b_upload_images(request: Request):
+    client_ip = request.client.host  # Get client's IP address
+    too_many = HTTPException(status_code=413, detail=f"Batches are limited to {EXTRACTION_BATCH_MAX_IMAGES} images.")
+    if request.headers.get("content-type", "").lower().startswith("application/json"):
+        try:
+            batch = Base64ImageBatchInput.parse_raw(await read_capped_body(request, UPLOAD_IMAGES_MAX_BYTES))
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail="; ".join(error["msg"] for error in e.errors()))
+        if len(batch.images) > EXTRACTION_BATCH_MAX_IMAGES:
+            raise too_many
+        images = []
+        for image in batch.images:
             try:
-                first_newline = response_text.find('\n')
-                last_backticks = response_text.rfind('```')
-                json_content = response_text[first_newline+1:last_backticks].strip()
-                phone_numbers = json.loads(json_content)
+                images.append((base64.b64decode(image.image_base64), image.file_name, None))
             except Exception as e:
-                logger.error(f"Failed to parse JSON from response with code block delimiters: {e}")
-                raise HTTPException(status_code=500, detail="Failed to parse phone numbers from response.")
-        else:
-            # Attempt to parse directly
-            try:
-                phone_numbers = json.loads(response_text)
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse JSON from response: {e}")
-                raise HTTPException(status_code=500, detail="Failed to parse phone numbers from response.")
-        
-        logger.info(f"Phone numbers extracted: {phone_numbers}")
-    except Exception as e:
-        logger.error(f"Failed to extract phone numbers from image: {e}")
-        os.remove(temp_image_path)
-        raise HTTPException(status_code=500, detail=f"Failed to extract phone numbers: {e}")
-    
-    # Validate and temporarily store the phone numbers under the user's IP
-    validated_numbers = []
-    for number in phone_numbers:
-        try:
-            formatted_number = gemini_flash8b_validate_phone_number(number)
-            validated_numbers.append(formatted_number)
-            logger.info(f"Validated phone number: {formatted_number}")
-        except ValueError as e:
-            logger.warning(f"Failed to validate number {number}: {e}")
-    
-    # Store extracted numbers temporarily under the user's IP
-    if client_ip in gemini_flash8b_temp_db:
-        gemini_flash8b_temp_db[client_ip].extend(validated_numbers)
-        logger.info(f"Appended validated numbers for IP {client_ip}: {validated_numbers}")
+                images.append((None, image.file_name, f"Invalid Base64 image data: {e}"))
     else:
-        gemini_flash8b_temp_db[client_ip] = validated_numbers
-        logger.info(f"Stored validated numbers for IP {client_ip}: {validated_numbers}")
-    
-    # Save the temporary data
-    try:
-        save_gemini_temp_to_file(gemini_flash8b_temp_db)
-        logger.info("Temporary phone number data saved.")
-    except Exception as e:
-        logger.error(f"Failed to save temporary data: {e}")
-        raise HTTPException(status_code=500, detail="Failed to save temporary data.")
-    
-    # Clean up the temporary image file
-    try:
-        os.remove(temp_image_path)
-        logger.info(f"Temporary image file deleted: {temp_image_path}")
-    except Exception as e:
-        logger.warning(f"Failed to delete temporary image file {temp_image_path}: {e}")
-    
+        files = await read_image_uploads(request, UPLOAD_IMAGES_MAX_BYTES, EXTRACTION_BATCH_MAX_IMAGES + 1)
+        if len(files) > EXTRACTION_BATCH_MAX_IMAGES:
+            raise too_many
+        images = [(data, file_name, None) for data, file_name in files]
+    return await extract_batch_for_review(images, client_ip)
+
+# Status of an extraction job (queued, running, retrying, succeeded or failed) with
+# its numbers once done. `wait` long-polls up to that many seconds for it to finish.
+@router.get("/jobs/{job_id}", response_model=dict)
+async def gemini_flash8b_extraction_job(job_id: str, wait: float = Query(0, ge=0, le=60)):
+    job = extraction_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Extraction job not found.")
+    if wait and not job.finished:
+        await job.wait(wait)
+    return job.to_dict()
+
+# Find phone numbers in text that is already text (iOS Vision OCR output, pasted
+# receipts, SMS dumps) with the local scanner instead of Gemini, and add them to the
+# same review buffer as image uploads. Accepts `text` and/or a batch of `documents`;
+# `documents` in the response lists the numbers found in each, in order.
+@router.post("/extract_text/", response_model=dict)
+async def gemini_flash8b_extract_text(data: TextExtractionInput, request: Request):
+    client_ip = request.client.host  # Get client's IP address
+    documents = ([data.text] if data.text is not None else []) + data.documents
+    if sum(len(document) for document in documents) > EXTRACT_TEXT_MAX_CHARS:
+        raise HTTPException(status_code=413, detail=f"Text extraction is limited to {EXTRACT_TEXT_MAX_CHARS} characters per request.")
+
+    found = [gemini_flash8b_find_phone_numbers(document) for document in documents]
+    validated_numbers = list(dict.fromkeys(number for numbers in found for number in numbers))
+    logger.info(f"Found {len(validated_numbers)} phone number(s) in {len(documents)} document(s) from IP: {client_ip}")
+    add_numbers_for_review(client_ip, validated_numbers)
     return {
         "detail": "Phone numbers extracted for review.",
-        "numbers": validated_numbers
+        "numbers": validated_numbers,
+        "documents": found,
     }
 
+# Bytes saved by image preprocessing before upload (this worker's)
+@router.get("/preprocessing/stats", response_model=dict)
+async def gemini_flash8b_preprocessing_stats():
+    return extraction_queue.preprocessor.stats()
+
+# Hit/miss counters and size of the extraction cache (this worker's)
+@router.get("/extraction_cache/stats", response_model=dict)
+async def gemini_flash8b_extraction_cache_stats():
+    return gemini_flash8b_extraction_cache.stats()
+
 @router.get("/review_numbers/", response_model=dict)
 async def gemini_flash8b_review_numbers(request: Request):
     client_ip = request.client.host  # Get client's IP address
@@ -154,32 +322,34 @@ async def gemini_flash8b_review_numbers(request: Request):
 
 # Endpoint to confirm and save the reviewed phone numbers
 @router.post("/confirm_numbers/", response_model=dict)
-async def gemini_flash8b_confirm_numbers(request: Request):
+async def gemini_flash8b_confirm_numbers(request: Request, durable: bool = PERSISTENCE_DURABLE_DEFAULT):
     client_ip = request.client.host
-    numbers_to_confirm = gemini_flash8b_temp_db.get(client_ip, [])
-    
-    if not numbers_to_confirm:
-        raise HTTPException(status_code=404, detail="No phone numbers found for confirmation.")
-    
-    # Now store confirmed numbers in the main phone numbers DB
-    for number in numbers_to_confirm:
-        # Check for duplicates before adding
-        if any(pn.number == number for pn in phone_numbers_db.values()):
-            print(f"Duplicate phone number {number} skipped.")
-            continue
-        try:
-            new_phone_create = PhoneNumberCreate(number=number, has_redeem_value=False)  # Adjust redeem value as needed
-            new_phone = PhoneNumber(**new_phone_create.dict(), created_ip=client_ip)
-            phone_numbers_db[new_phone.id] = new_phone
-        except Exception as e:
-            print(f"Failed to process number {number}: {e}")
-    
-    # Save the updated main database
-    save_phone_numbers_to_file(phone_numbers_db)
-    
-    # Clear the temporary storage after confirmation
-    del gemini_flash8b_temp_db[client_ip]
-    save_gemini_temp_to_file(gemini_flash8b_temp_db)
+    with storage_transaction():  # Atomic across workers in multi-process mode
+        numbers_to_confirm = gemini_flash8b_temp_db.get(client_ip, [])
+        
+        if not numbers_to_confirm:
+            raise HTTPException(status_code=404, detail="No phone numbers found for confirmation.")
+        
+        # Now store confirmed numbers in the main phone numbers DB (normalized in one
+        # pass; review numbers already are, so this is a cache lookup per number)
+        for raw_number, number in zip(numbers_to_confirm, normalize_many(numbers_to_confirm)):
+            if number is None:
+                print(f"Failed to process number {raw_number}: Invalid USA phone number.")
+                continue
+            # Check for duplicates before adding (O(1) via the number index)
+            if find_phone_number_id(number) is not None:
+                print(f"Duplicate phone number {number} skipped.")
+                continue
+            try:
+                new_phone = PhoneNumber(number=number, has_redeem_value=False, created_ip=client_ip)  # Adjust redeem value as needed
+                put_phone_number(new_phone)  # Store, index and journal each confirmed number
+            except Exception as e:
+                print(f"Failed to process number {number}: {e}")
+        
+        # Clear the temporary storage after confirmation
+        del gemini_flash8b_temp_db[client_ip]
+        save_gemini_temp_to_file(gemini_flash8b_temp_db)
+    await wait_for_persistence(durable)  # Optionally wait for the confirmed numbers to reach storage
     
     return {"detail": "Phone numbers confirmed and saved."}
 
@@ -190,22 +360,20 @@ async def gemini_flash8b_edit_numbers(new_numbers: List[str], request: Request):
     if client_ip not in gemini_flash8b_temp_db:
         raise HTTPException(status_code=404, detail="No phone numbers found to edit.")
     
-    validated_numbers = []
-    for number in new_numbers:
-        try:
-            formatted_number = gemini_flash8b_validate_phone_number(number)
-            validated_numbers.append(formatted_number)
-        except ValueError as e:
-            print(f"Failed to validate number {number}: {e}")
+    validated_numbers = normalize_many(new_numbers)
+    for number, formatted_number in zip(new_numbers, validated_numbers):
+        if formatted_number is None:
+            print(f"Failed to validate number {number}: Invalid USA phone number.")
             raise HTTPException(status_code=400, detail=f"Invalid number {number}")
     
-    # Update the temporary storage with the new validated numbers
-    gemini_flash8b_temp_db[client_ip] = validated_numbers
-    save_gemini_temp_to_file(gemini_flash8b_temp_db)
+    # Update the temporary storage with the new validated numbers (duplicates collapse)
+    with storage_transaction():  # Atomic across workers in multi-process mode
+        gemini_flash8b_temp_db[client_ip] = validated_numbers
+        save_gemini_temp_to_file(gemini_flash8b_temp_db)
     
     return {
         "detail": "Phone numbers updated for review.",
-        "numbers": validated_numbers
+        "numbers": gemini_flash8b_temp_db[client_ip]
     }
 
 # Endpoint to delete specific numbers before saving
@@ -215,13 +383,9 @@ async def gemini_flash8b_delete_number(number_to_delete: str, request: Request):
     if client_ip not in gemini_flash8b_temp_db:
         raise HTTPException(status_code=404, detail="No phone numbers found to delete.")
     
-    updated_numbers = [
-        number for number in gemini_flash8b_temp_db[client_ip]
-        if number != number_to_delete
-    ]
-    
-    gemini_flash8b_temp_db[client_ip] = updated_numbers
-    save_gemini_temp_to_file(gemini_flash8b_temp_db)
+    with storage_transaction():  # Atomic across workers in multi-process mode
+        gemini_flash8b_temp_db.discard_number(client_ip, number_to_delete)
+        save_gemini_temp_to_file(gemini_flash8b_temp_db)
     
     return {
         "detail": f"Phone number {number_to_delete} deleted from review.",
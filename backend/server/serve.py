@@ -0,0 +1,30 @@
+# serve.py
+
+# Production launcher: no auto reload, one worker process per core by default.
+#   python serve.py --workers 4 --port 8000
+# With more than one worker the app runs in multi-process mode (config.SHARED_STORAGE),
+# which needs the SQLite engine so every worker reads and writes the same database.
+
+import os
+import sys
+import argparse
+import uvicorn
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the API without auto reload.")
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("SERVER_WORKERS", os.cpu_count() or 1)))
+    args = parser.parse_args()
+
+    # Workers inherit the environment, so they all agree on the mode and the engine
+    os.environ["SERVER_WORKERS"] = str(args.workers)
+    if args.workers > 1:
+        engine = os.environ.setdefault("STORAGE_ENGINE", "sqlite")
+        if engine != "sqlite":
+            sys.exit(f"--workers {args.workers} needs STORAGE_ENGINE=sqlite (got {engine!r}).")
+
+    uvicorn.run("index:app", host=args.host, port=args.port, workers=args.workers, reload=False)
+
+if __name__ == "__main__":
+    main()
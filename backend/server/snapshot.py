@@ -0,0 +1,172 @@
+# snapshot.py
+
+# Binary snapshot format and lazily hydrated record mapping for phone numbers.
+#
+# Layout (little-endian):
+#   header        "<8sII"       magic, format version, record count
+#   offset table  "<16s16sQQI"  per record: UUID bytes, number (NUL padded),
+#                               change sequence, payload offset, payload length
+#   payloads                    compact JSON of PhoneNumber.dict(), back to back
+#
+# Loading maps the file and reads only the offset table; each record's payload
+# is parsed into a PhoneNumber the first time it is accessed.
+
+from collections.abc import MutableMapping
+from typing import Dict, Iterator, Optional, Tuple, Union
+from uuid import UUID
+from datetime import datetime
+import os
+import mmap
+import json
+import struct
+from models.index import PhoneNumber
+
+SNAPSHOT_MAGIC = b"BLZSNAP1"
+SNAPSHOT_VERSION = 2
+_HEADER = struct.Struct("<8sII")
+_TABLE_ENTRY = struct.Struct("<16s16sQQI")
+_NUMBER_WIDTH = 16
+
+# ------------------------------------------------------
+# Serialization helpers
+# ------------------------------------------------------
+def json_default(value):
+    # Make UUIDs and datetimes JSON serializable
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def encode_phone_number(phone: PhoneNumber) -> bytes:
+    """Compact JSON bytes for a phone number record."""
+    return json.dumps(phone.dict(), default=json_default, separators=(",", ":")).encode()
+
+# ------------------------------------------------------
+# Lazily hydrated mapping
+# ------------------------------------------------------
+# An unhydrated entry is (number, change_seq, payload) where payload is a parsed
+# dict, a JSON string/bytes, or an (offset, length) slice of the mapped snapshot file.
+_RawEntry = Tuple[str, int, Union[dict, str, bytes, Tuple[int, int]]]
+
+class LazyPhoneNumberDict(MutableMapping):
+    """Dict of UUID -> PhoneNumber that builds each model on first access."""
+
+    def __init__(self, buffer: Optional[mmap.mmap] = None):
+        self._buffer = buffer
+        self._entries: Dict[UUID, Union[PhoneNumber, _RawEntry]] = {}
+
+    def add_raw(self, phone_id: UUID, number: str, change_seq: int, payload):
+        """Register a record without building its model."""
+        self._entries[phone_id] = (number, change_seq, payload)
+
+    def _payload_bytes(self, payload) -> bytes:
+        if isinstance(payload, tuple):
+            offset, length = payload
+            return self._buffer[offset:offset + length]
+        if isinstance(payload, dict):
+            return json.dumps(payload, default=json_default, separators=(",", ":")).encode()
+        return payload.encode() if isinstance(payload, str) else payload
+
+    def _hydrate(self, payload) -> PhoneNumber:
+        data = payload if isinstance(payload, dict) else json.loads(self._payload_bytes(payload))
+        return PhoneNumber(**data)
+
+    def __getitem__(self, phone_id: UUID) -> PhoneNumber:
+        entry = self._entries[phone_id]
+        if isinstance(entry, tuple):
+            entry = self._hydrate(entry[2])
+            self._entries[phone_id] = entry
+        return entry
+
+    def __setitem__(self, phone_id: UUID, phone: PhoneNumber):
+        self._entries[phone_id] = phone
+
+    def __delitem__(self, phone_id: UUID):
+        del self._entries[phone_id]
+
+    def __contains__(self, phone_id) -> bool:
+        return phone_id in self._entries
+
+    def __iter__(self) -> Iterator[UUID]:
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def copy(self) -> "LazyPhoneNumberDict":
+        """Shallow copy sharing the mapped file (safe to hand to another thread)."""
+        clone = LazyPhoneNumberDict(self._buffer)
+        clone._entries = dict(self._entries)
+        return clone
+
+    def numbers(self) -> Iterator[Tuple[UUID, str]]:
+        """Yield (id, number) pairs without hydrating records."""
+        for phone_id, entry in list(self._entries.items()):
+            if isinstance(entry, tuple) and entry[0]:
+                yield phone_id, entry[0]
+            else:
+                yield phone_id, self[phone_id].number
+
+    def change_seqs(self) -> Iterator[Tuple[UUID, int]]:
+        """Yield (id, change_seq) pairs without hydrating records."""
+        for phone_id, entry in list(self._entries.items()):
+            yield phone_id, entry[1] if isinstance(entry, tuple) else entry.change_seq
+
+    def raw_records(self) -> Iterator[Tuple[UUID, str, int, bytes]]:
+        """Yield (id, number, change_seq, JSON bytes); unhydrated records are copied verbatim."""
+        for phone_id, entry in list(self._entries.items()):
+            if isinstance(entry, tuple) and entry[0]:
+                yield phone_id, entry[0], entry[1], self._payload_bytes(entry[2])
+            else:
+                phone = self[phone_id] if isinstance(entry, tuple) else entry
+                yield phone_id, phone.number, phone.change_seq, encode_phone_number(phone)
+
+def raw_phone_number_records(phone_db) -> Iterator[Tuple[UUID, str, int, bytes]]:
+    """(id, number, change_seq, JSON bytes) for a lazy mapping or a plain dict of models."""
+    if isinstance(phone_db, LazyPhoneNumberDict):
+        return phone_db.raw_records()
+    return (
+        (phone_id, phone.number, phone.change_seq, encode_phone_number(phone))
+        for phone_id, phone in list(phone_db.items())
+    )
+
+# ------------------------------------------------------
+# Binary snapshot read/write
+# ------------------------------------------------------
+def write_binary_snapshot(path: str, phone_db):
+    """Write a binary snapshot through a temp file and an atomic rename."""
+    records = list(raw_phone_number_records(phone_db))
+    table_size = _HEADER.size + _TABLE_ENTRY.size * len(records)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as file:
+        file.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(records)))
+        offset = table_size
+        for phone_id, number, change_seq, payload in records:
+            number_bytes = number.encode()
+            if len(number_bytes) > _NUMBER_WIDTH:
+                number_bytes = b""  # Too wide for the table; read from the payload instead
+            file.write(_TABLE_ENTRY.pack(phone_id.bytes, number_bytes, change_seq, offset, len(payload)))
+            offset += len(payload)
+        for _, _, _, payload in records:
+            file.write(payload)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+def read_binary_snapshot(path: str) -> LazyPhoneNumberDict:
+    """Map a binary snapshot and index its records without parsing payloads."""
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return LazyPhoneNumberDict()
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, count = _HEADER.unpack_from(buffer, 0)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        raise ValueError(f"{path} is not a version {SNAPSHOT_VERSION} phone number snapshot")
+    phone_db = LazyPhoneNumberDict(buffer)
+    table = buffer[_HEADER.size:_HEADER.size + _TABLE_ENTRY.size * count]
+    phone_db._entries = {
+        UUID(bytes=id_bytes): (number_bytes.rstrip(b"\0").decode(), change_seq, (offset, length))
+        for id_bytes, number_bytes, change_seq, offset, length in _TABLE_ENTRY.iter_unpack(table)
+    }
+    return phone_db
@@ -0,0 +1,43 @@
+# startup.py
+
+# Startup-time instrumentation: how long the server spends importing each of its
+# modules (timed in index.py) and running the lifespan, logged once it is ready to
+# serve. For a breakdown down to every third-party module, run
+#   python -X importtime -c "import index" 2> importtime.txt
+
+from contextlib import contextmanager
+from typing import Dict
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class StartupTimer:
+    """Seconds spent per named phase, from the moment this module is imported."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.ready_after: float = 0.0
+        self.phases: Dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - started
+
+    def ready(self):
+        """Record (and log) that startup has finished."""
+        self.ready_after = time.perf_counter() - self.started
+        phases = ", ".join(f"{name} {seconds:.3f}s" for name, seconds in self.phases.items())
+        logger.info(f"Ready to serve after {self.ready_after:.3f}s ({phases})")
+
+    def stats(self) -> dict:
+        return {
+            "ready_after": round(self.ready_after, 4),
+            "phases": {name: round(seconds, 4) for name, seconds in self.phases.items()},
+        }
+
+startup_timer = StartupTimer()
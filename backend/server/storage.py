@@ -0,0 +1,549 @@
+# storage.py
+
+# Persistence engines behind database.py. database.py keeps the in-memory dicts
+# and indexes used by the routes; an engine only decides how mutations reach disk.
+
+from typing import Callable, Dict, List, Optional, Tuple
+from uuid import UUID
+from contextlib import contextmanager, nullcontext
+import os
+import json
+import logging
+import sqlite3
+import threading
+from models.index import PhoneNumber
+from snapshot import (
+    LazyPhoneNumberDict,
+    json_default,
+    encode_phone_number,
+    raw_phone_number_records,
+    read_binary_snapshot,
+    write_binary_snapshot,
+)
+from config import (
+    PHONE_NUMBERS_JSON_FILE,
+    PHONE_NUMBERS_SNAPSHOT_FILE,
+    PHONE_NUMBERS_SNAPSHOT_FORMAT,
+    PHONE_NUMBERS_TOMBSTONES_FILE,
+    GEMINI_TEMP_JSON_FILE,
+    PHONE_NUMBERS_STORAGE_MODE,
+    PHONE_NUMBERS_LOG_FILE,
+    PHONE_NUMBERS_CHECKPOINT_EVERY,
+    PHONE_NUMBERS_LOG_FSYNC,
+    SQLITE_DB_FILE,
+)
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------
+# Helpers
+# ------------------------------------------------------
+def _write_file_atomically(path: str, write):
+    # Write to a temp file and rename over the target so a crash never leaves a truncated file
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as file:
+        write(file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+# ------------------------------------------------------
+# Storage interface
+# ------------------------------------------------------
+class PhoneNumberStorage:
+    """Interface every storage engine implements."""
+
+    def load_phone_numbers(self) -> Dict[UUID, PhoneNumber]:
+        raise NotImplementedError
+
+    def put_phone_number(self, phone: PhoneNumber):
+        """Persist a single created or updated phone number."""
+        raise NotImplementedError
+
+    def delete_phone_number(self, phone_id: UUID, change_seq: int):
+        """Persist the removal of a single phone number and its tombstone."""
+        raise NotImplementedError
+
+    def apply_phone_number_changes(self, puts: List[PhoneNumber], deletes: List[Tuple[UUID, int]]):
+        """Persist a batch of puts and (id, change_seq) deletes as one write (group commit)."""
+        for phone in puts:
+            self.put_phone_number(phone)
+        for phone_id, change_seq in deletes:
+            self.delete_phone_number(phone_id, change_seq)
+
+    def save_phone_numbers(self, phone_db: Dict[UUID, PhoneNumber], tombstones: Dict[UUID, int]):
+        """Persist the full table and tombstones (bulk updates and checkpoints)."""
+        raise NotImplementedError
+
+    def load_tombstones(self) -> Dict[UUID, int]:
+        """Deleted ids -> change sequence of the deletion (delta sync)."""
+        raise NotImplementedError
+
+    def load_gemini_temp(self) -> Dict[str, List[str]]:
+        raise NotImplementedError
+
+    def save_gemini_temp(self, gemini_temp_db: Dict[str, List[str]]):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+# ------------------------------------------------------
+# JSON engine: snapshot file plus optional append-only journal
+# ------------------------------------------------------
+class JsonStorage(PhoneNumberStorage):
+    """Stores phone numbers in a snapshot file (binary, see snapshot.py, or JSON).
+
+    In "journal" mode each mutation appends a compact record to the log file:
+        {"op": "put", "data": {...PhoneNumber...}}
+        {"op": "delete", "id": "<uuid>", "seq": <change_seq>}
+    Loading reads the snapshot and replays the log on top of it. A torn last line
+    (crash mid-append) is skipped, so a write never corrupts earlier data. Every
+    `checkpoint_every` records the log is folded into the snapshot.
+    In "json" mode every mutation rewrites the snapshot (legacy behavior).
+    Records are hydrated into PhoneNumber models lazily, on first access.
+    Tombstones of deleted records are written to their own file at each checkpoint.
+    """
+
+    def __init__(
+        self,
+        phone_numbers_file: str,
+        snapshot_file: str,
+        snapshot_format: str,
+        tombstones_file: str,
+        gemini_temp_file: str,
+        log_file: str,
+        mode: str,
+        checkpoint_every: int,
+        fsync: bool,
+        phone_db_provider: Callable[[], Dict[UUID, PhoneNumber]],
+        tombstones_provider: Callable[[], Dict[UUID, int]],
+    ):
+        self.phone_numbers_file = phone_numbers_file
+        self.snapshot_file = snapshot_file
+        self.snapshot_format = snapshot_format  # "binary" or "json"
+        self.tombstones_file = tombstones_file
+        self.gemini_temp_file = gemini_temp_file
+        self.log_file = log_file
+        self.mode = mode
+        self.checkpoint_every = checkpoint_every
+        self.fsync = fsync
+        # Full table and tombstones, needed for checkpoints
+        self.phone_db_provider = phone_db_provider
+        self.tombstones_provider = tombstones_provider
+        self._log = None
+        self._log_records_since_checkpoint = 0
+        self._replayed_tombstones: Dict[UUID, int] = {}
+
+    def load_phone_numbers(self) -> Dict[UUID, PhoneNumber]:
+        if self.snapshot_format == "binary" and os.path.exists(self.snapshot_file):
+            phone_db = read_binary_snapshot(self.snapshot_file)
+        else:
+            # JSON snapshot (also the migration path into the binary format)
+            phone_db = LazyPhoneNumberDict()
+            if os.path.exists(self.phone_numbers_file):
+                with open(self.phone_numbers_file, "r") as file:
+                    try:
+                        data = json.load(file)
+                        # UUID and datetime parsing is deferred until a record is accessed
+                        for k, v in data.items():
+                            phone_db.add_raw(UUID(k), v.get("number", ""), v.get("change_seq", 0), v)
+                    except json.JSONDecodeError:
+                        phone_db = LazyPhoneNumberDict()
+        # Replay journaled mutations made after the last checkpoint
+        self.replay_log(phone_db)
+        return phone_db
+
+    def replay_log(self, phone_db: Dict[UUID, PhoneNumber]) -> int:
+        if not os.path.exists(self.log_file):
+            return 0
+        replayed = 0
+        with open(self.log_file, "r") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping torn journal record in {self.log_file}")
+                    continue
+                if record["op"] == "put":
+                    phone = PhoneNumber(**record["data"])
+                    phone_db[phone.id] = phone
+                elif record["op"] == "delete":
+                    phone_id = UUID(record["id"])
+                    phone_db.pop(phone_id, None)
+                    self._replayed_tombstones[phone_id] = record.get("seq", 0)
+                replayed += 1
+        self._log_records_since_checkpoint = replayed
+        return replayed
+
+    def load_tombstones(self) -> Dict[UUID, int]:
+        tombstones = {}
+        if os.path.exists(self.tombstones_file):
+            with open(self.tombstones_file, "r") as file:
+                try:
+                    tombstones = {UUID(k): v for k, v in json.load(file).items()}
+                except json.JSONDecodeError:
+                    tombstones = {}
+        tombstones.update(self._replayed_tombstones)
+        return tombstones
+
+    def _checkpoint(self):
+        self.save_phone_numbers(self.phone_db_provider(), self.tombstones_provider())
+
+    def put_phone_number(self, phone: PhoneNumber):
+        if self.mode == "journal":
+            self._append_to_log({"op": "put", "data": phone.dict()})
+        else:
+            self._checkpoint()
+
+    def delete_phone_number(self, phone_id: UUID, change_seq: int):
+        if self.mode == "journal":
+            self._append_to_log({"op": "delete", "id": str(phone_id), "seq": change_seq})
+        else:
+            self._checkpoint()
+
+    def apply_phone_number_changes(self, puts: List[PhoneNumber], deletes: List[Tuple[UUID, int]]):
+        if self.mode != "journal":
+            self._checkpoint()
+            return
+        records = [{"op": "put", "data": phone.dict()} for phone in puts]
+        records += [{"op": "delete", "id": str(phone_id), "seq": change_seq} for phone_id, change_seq in deletes]
+        self._append_to_log(*records)
+
+    def save_phone_numbers(self, phone_db: Dict[UUID, PhoneNumber], tombstones: Dict[UUID, int]):
+        # Copy first: this can run in the persistence thread while requests mutate the dicts
+        phone_db = phone_db.copy()
+        tombstones = {str(k): v for k, v in dict(tombstones).items()}
+        _write_file_atomically(self.tombstones_file, lambda file: json.dump(tombstones, file))
+        if self.snapshot_format == "binary":
+            write_binary_snapshot(self.snapshot_file, phone_db)
+        else:
+            # Unhydrated records are written back verbatim, keyed by their UUID string
+            records = [f'"{k}":{payload.decode()}' for k, _, _, payload in raw_phone_number_records(phone_db)]
+            _write_file_atomically(
+                self.phone_numbers_file,
+                lambda file: file.write("{" + ",\n".join(records) + "}"),
+            )
+        # The snapshot now contains every journaled change, so the log can start over
+        self.truncate_log()
+
+    def truncate_log(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        if os.path.exists(self.log_file):
+            os.remove(self.log_file)
+        self._log_records_since_checkpoint = 0
+
+    def _append_to_log(self, *records: dict):
+        if self._log is None:
+            self._log = open(self.log_file, "a")
+        self._log.write("".join(
+            json.dumps(record, default=json_default, separators=(",", ":")) + "\n" for record in records
+        ))
+        # One flush (and fsync) covers every record in the batch
+        self._log.flush()
+        if self.fsync:
+            os.fsync(self._log.fileno())
+        self._log_records_since_checkpoint += len(records)
+        # Periodically fold the log into the snapshot so replay stays short
+        if self._log_records_since_checkpoint >= self.checkpoint_every:
+            self._checkpoint()
+
+    def load_gemini_temp(self) -> Dict[str, List[str]]:
+        if os.path.exists(self.gemini_temp_file):
+            with open(self.gemini_temp_file, "r") as file:
+                try:
+                    data = json.load(file)
+                    return data  # {ip_address: [phone_numbers]}
+                except json.JSONDecodeError:
+                    return {}
+        return {}
+
+    def save_gemini_temp(self, gemini_temp_db: Dict[str, List[str]]):
+        _write_file_atomically(
+            self.gemini_temp_file,
+            lambda file: json.dump(gemini_temp_db, file, indent=4),
+        )
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+# ------------------------------------------------------
+# SQLite engine: one row per phone number, WAL mode, indexed columns
+# ------------------------------------------------------
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS phone_numbers (
+    id TEXT PRIMARY KEY,
+    number TEXT NOT NULL,
+    is_deleted INTEGER NOT NULL DEFAULT 0,
+    last_used TEXT,
+    created_ip TEXT,
+    change_seq INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_phone_numbers_number ON phone_numbers (number);
+CREATE INDEX IF NOT EXISTS idx_phone_numbers_is_deleted ON phone_numbers (is_deleted);
+CREATE INDEX IF NOT EXISTS idx_phone_numbers_last_used ON phone_numbers (last_used);
+CREATE INDEX IF NOT EXISTS idx_phone_numbers_created_ip ON phone_numbers (created_ip);
+CREATE INDEX IF NOT EXISTS idx_phone_numbers_change_seq ON phone_numbers (change_seq);
+CREATE TABLE IF NOT EXISTS tombstones (
+    id TEXT PRIMARY KEY,
+    change_seq INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS gemini_temp (
+    ip TEXT PRIMARY KEY,
+    numbers TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS reservations (
+    id TEXT PRIMARY KEY,
+    reserved_until REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+# Statements are constant strings with bound parameters, so sqlite3's statement
+# cache prepares each of them once per connection.
+SQL_SELECT_PHONE_NUMBERS = "SELECT id, number, change_seq, data FROM phone_numbers"
+SQL_UPSERT_PHONE_NUMBER = (
+    "INSERT INTO phone_numbers (id, number, is_deleted, last_used, created_ip, change_seq, data) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (id) DO UPDATE SET number = excluded.number, is_deleted = excluded.is_deleted, "
+    "last_used = excluded.last_used, created_ip = excluded.created_ip, "
+    "change_seq = excluded.change_seq, data = excluded.data"
+)
+SQL_DELETE_PHONE_NUMBER = "DELETE FROM phone_numbers WHERE id = ?"
+SQL_DELETE_ALL_PHONE_NUMBERS = "DELETE FROM phone_numbers"
+SQL_SELECT_TOMBSTONES = "SELECT id, change_seq FROM tombstones"
+SQL_UPSERT_TOMBSTONE = (
+    "INSERT INTO tombstones (id, change_seq) VALUES (?, ?) "
+    "ON CONFLICT (id) DO UPDATE SET change_seq = excluded.change_seq"
+)
+SQL_DELETE_ALL_TOMBSTONES = "DELETE FROM tombstones"
+SQL_SELECT_GEMINI_TEMP = "SELECT ip, numbers FROM gemini_temp"
+SQL_INSERT_GEMINI_TEMP = "INSERT INTO gemini_temp (ip, numbers) VALUES (?, ?)"
+SQL_DELETE_ALL_GEMINI_TEMP = "DELETE FROM gemini_temp"
+SQL_SELECT_CHANGED_PHONE_NUMBERS = "SELECT change_seq, id, data FROM phone_numbers WHERE change_seq > ?"
+SQL_SELECT_CHANGED_TOMBSTONES = "SELECT change_seq, id FROM tombstones WHERE change_seq > ?"
+SQL_SELECT_RESERVATIONS = "SELECT id, reserved_until FROM reservations WHERE reserved_until > ?"
+SQL_DELETE_EXPIRED_RESERVATIONS = "DELETE FROM reservations WHERE reserved_until <= ?"
+SQL_UPSERT_RESERVATION = (
+    "INSERT INTO reservations (id, reserved_until) VALUES (?, ?) "
+    "ON CONFLICT (id) DO UPDATE SET reserved_until = excluded.reserved_until"
+)
+SQL_SELECT_META = "SELECT key, value FROM meta"
+SQL_SELECT_META_VALUE = "SELECT value FROM meta WHERE key = ?"
+SQL_HAS_RECORDS = "SELECT EXISTS (SELECT 1 FROM phone_numbers) OR EXISTS (SELECT 1 FROM tombstones)"
+SQL_BUMP_META = "INSERT INTO meta (key, value) VALUES (?, 1) ON CONFLICT (key) DO UPDATE SET value = value + 1"
+
+class SqliteStorage(PhoneNumberStorage):
+    """Stores phone numbers as rows in a SQLite database.
+
+    The number, is_deleted, last_used, created_ip and change_seq columns are indexed;
+    the full record is kept as JSON in `data`. WAL mode lets readers (including other
+    processes) proceed while a write is in progress.
+
+    This is the engine for multi-process mode: `exclusive()` holds SQLite's write
+    lock across processes, and `data_version()` / `load_changes_since()` let each
+    worker refresh its in-memory copy with what other workers committed.
+    A new database starts from the JSON store's data, if any (see import_once).
+    """
+
+    def __init__(self, db_file: str):
+        self.db_file = db_file
+        self._lock = threading.RLock()  # The connection is shared with worker threads
+        self._in_exclusive = False
+        self._conn = sqlite3.connect(db_file, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._migrate()
+        self._conn.executescript(SQLITE_SCHEMA)
+
+    def _migrate(self):
+        # Databases created before delta sync lack the change_seq column
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(phone_numbers)")]
+        if columns and "change_seq" not in columns:
+            self._conn.execute("ALTER TABLE phone_numbers ADD COLUMN change_seq INTEGER NOT NULL DEFAULT 0")
+
+    def import_once(self, source: PhoneNumberStorage) -> bool:
+        """Copy the phone numbers, tombstones and review buffer of `source` (the JSON
+        store of a deployment switching engines) into this database, the first time it
+        is opened without records. Returns whether anything was imported."""
+        with self.exclusive():  # Workers starting together import once
+            if self._conn.execute(SQL_SELECT_META_VALUE, ("json_import",)).fetchone() is not None:
+                return False
+            self._conn.execute(SQL_BUMP_META, ("json_import",))
+            if self._conn.execute(SQL_HAS_RECORDS).fetchone()[0]:
+                return False
+            phone_db = source.load_phone_numbers()
+            tombstones = source.load_tombstones()
+            gemini_temp = source.load_gemini_temp()
+            if not (phone_db or tombstones or gemini_temp):
+                return False
+            self.save_phone_numbers(phone_db, tombstones)
+            self.save_gemini_temp(gemini_temp)
+        logger.info(f"Imported {len(phone_db)} phone number(s) and {len(tombstones)} tombstone(s) into {self.db_file}.")
+        return True
+
+    def _write(self):
+        # Inside exclusive() statements join its transaction instead of committing alone
+        return nullcontext() if self._in_exclusive else self._conn
+
+    @staticmethod
+    def _row(phone: PhoneNumber) -> tuple:
+        return (
+            str(phone.id),
+            phone.number,
+            int(phone.is_deleted),
+            phone.last_used.isoformat() if phone.last_used else None,
+            phone.created_ip,
+            phone.change_seq,
+            encode_phone_number(phone).decode(),
+        )
+
+    def load_phone_numbers(self) -> Dict[UUID, PhoneNumber]:
+        with self._lock:
+            rows = self._conn.execute(SQL_SELECT_PHONE_NUMBERS).fetchall()
+        # Rows are parsed into PhoneNumber models on first access
+        phone_db = LazyPhoneNumberDict()
+        for phone_id, number, change_seq, data in rows:
+            phone_db.add_raw(UUID(phone_id), number, change_seq, data)
+        return phone_db
+
+    def load_tombstones(self) -> Dict[UUID, int]:
+        with self._lock:
+            rows = self._conn.execute(SQL_SELECT_TOMBSTONES).fetchall()
+        return {UUID(phone_id): change_seq for phone_id, change_seq in rows}
+
+    def put_phone_number(self, phone: PhoneNumber):
+        with self._lock, self._write():
+            self._conn.execute(SQL_UPSERT_PHONE_NUMBER, self._row(phone))
+
+    def delete_phone_number(self, phone_id: UUID, change_seq: int):
+        with self._lock, self._write():
+            self._conn.execute(SQL_DELETE_PHONE_NUMBER, (str(phone_id),))
+            self._conn.execute(SQL_UPSERT_TOMBSTONE, (str(phone_id), change_seq))
+
+    def apply_phone_number_changes(self, puts: List[PhoneNumber], deletes: List[Tuple[UUID, int]]):
+        rows = [self._row(phone) for phone in puts]
+        with self._lock, self._write():
+            self._conn.executemany(SQL_UPSERT_PHONE_NUMBER, rows)
+            self._conn.executemany(SQL_DELETE_PHONE_NUMBER, [(str(phone_id),) for phone_id, _ in deletes])
+            self._conn.executemany(SQL_UPSERT_TOMBSTONE, [(str(phone_id), seq) for phone_id, seq in deletes])
+
+    def save_phone_numbers(self, phone_db: Dict[UUID, PhoneNumber], tombstones: Dict[UUID, int]):
+        rows = [self._row(phone) for phone in phone_db.copy().values()]
+        tombstone_rows = [(str(phone_id), seq) for phone_id, seq in dict(tombstones).items()]
+        with self._lock, self._write():
+            self._conn.execute(SQL_DELETE_ALL_PHONE_NUMBERS)
+            self._conn.executemany(SQL_UPSERT_PHONE_NUMBER, rows)
+            self._conn.execute(SQL_DELETE_ALL_TOMBSTONES)
+            self._conn.executemany(SQL_UPSERT_TOMBSTONE, tombstone_rows)
+
+    def load_gemini_temp(self) -> Dict[str, List[str]]:
+        with self._lock:
+            rows = self._conn.execute(SQL_SELECT_GEMINI_TEMP).fetchall()
+        return {ip: json.loads(numbers) for ip, numbers in rows}
+
+    def save_gemini_temp(self, gemini_temp_db: Dict[str, List[str]]):
+        rows = [(ip, json.dumps(numbers)) for ip, numbers in gemini_temp_db.items()]
+        with self._lock, self._write():
+            self._conn.execute(SQL_DELETE_ALL_GEMINI_TEMP)
+            self._conn.executemany(SQL_INSERT_GEMINI_TEMP, rows)
+            self._conn.execute(SQL_BUMP_META, ("gemini_temp",))
+
+    # ------------------------------------------------------
+    # Multi-process coordination
+    # ------------------------------------------------------
+    @contextmanager
+    def exclusive(self):
+        """One write transaction holding the database write lock (across processes)
+        from its start, so reads made inside it cannot be overtaken by another writer."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._in_exclusive = True
+            try:
+                yield
+            except BaseException:
+                self._conn.rollback()
+                raise
+            else:
+                self._conn.commit()
+            finally:
+                self._in_exclusive = False
+
+    def data_version(self) -> int:
+        """Changes whenever another connection commits (PRAGMA data_version)."""
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def load_changes_since(self, change_seq: int) -> List[Tuple[int, UUID, Optional[str]]]:
+        """(change_seq, id, JSON data) of records and (change_seq, id, None) of tombstones
+        changed after `change_seq`, in sequence order."""
+        with self._lock:
+            puts = self._conn.execute(SQL_SELECT_CHANGED_PHONE_NUMBERS, (change_seq,)).fetchall()
+            deletes = self._conn.execute(SQL_SELECT_CHANGED_TOMBSTONES, (change_seq,)).fetchall()
+        changes = [(seq, UUID(phone_id), data) for seq, phone_id, data in puts]
+        changes += [(seq, UUID(phone_id), None) for seq, phone_id in deletes]
+        changes.sort(key=lambda change: change[0])
+        return changes
+
+    def load_meta(self) -> Dict[str, int]:
+        """Version counters of the shared tables without a change sequence."""
+        with self._lock:
+            return dict(self._conn.execute(SQL_SELECT_META).fetchall())
+
+    def load_reservations(self, now: float) -> Dict[UUID, float]:
+        with self._lock:
+            rows = self._conn.execute(SQL_SELECT_RESERVATIONS, (now,)).fetchall()
+        return {UUID(phone_id): reserved_until for phone_id, reserved_until in rows}
+
+    def save_reservations(self, reservations: Dict[UUID, float], now: float):
+        with self._lock, self._write():
+            self._conn.execute(SQL_DELETE_EXPIRED_RESERVATIONS, (now,))
+            self._conn.executemany(SQL_UPSERT_RESERVATION, [(str(k), v) for k, v in reservations.items()])
+            self._conn.execute(SQL_BUMP_META, ("reservations",))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+# ------------------------------------------------------
+# Engine selection
+# ------------------------------------------------------
+def create_storage(
+    engine: str,
+    phone_db_provider: Callable[[], Dict[UUID, PhoneNumber]],
+    tombstones_provider: Callable[[], Dict[UUID, int]],
+) -> PhoneNumberStorage:
+    """Build the storage engine selected by config.STORAGE_ENGINE."""
+    if engine == "sqlite":
+        storage = SqliteStorage(SQLITE_DB_FILE)
+        storage.import_once(_json_storage(phone_db_provider, tombstones_provider))
+        return storage
+    if engine == "json":
+        return _json_storage(phone_db_provider, tombstones_provider)
+    raise ValueError(f"Unknown storage engine: {engine}")
+
+def _json_storage(
+    phone_db_provider: Callable[[], Dict[UUID, PhoneNumber]],
+    tombstones_provider: Callable[[], Dict[UUID, int]],
+) -> JsonStorage:
+    return JsonStorage(
+        PHONE_NUMBERS_JSON_FILE,
+        PHONE_NUMBERS_SNAPSHOT_FILE,
+        PHONE_NUMBERS_SNAPSHOT_FORMAT,
+        PHONE_NUMBERS_TOMBSTONES_FILE,
+        GEMINI_TEMP_JSON_FILE,
+        PHONE_NUMBERS_LOG_FILE,
+        PHONE_NUMBERS_STORAGE_MODE,
+        PHONE_NUMBERS_CHECKPOINT_EVERY,
+        PHONE_NUMBERS_LOG_FSYNC,
+        phone_db_provider,
+        tombstones_provider,
+    )
@@ -0,0 +1,164 @@
+# suggestions.py
+
+# Priority queue of phone numbers that are eligible for use under the usage rules
+# (e.g. at most 2 uses per UTC day). Backs GET /phone_numbers/suggest. Eligibility
+# is read from each record's per-day usage counters, never from its history.
+#
+# Two heaps with lazy deletion:
+#   waiting  (eligible_at, id)                      numbers cooling down or reserved
+#   ready    (no_redeem_value, last_used_at, id)    eligible numbers, best first
+# A number's current entry lives in `_entries`; heap items that no longer match it
+# are skipped when popped, and both heaps are rebuilt from `_entries` once such stale
+# items outnumber live ones two to one. Updates and reads are O(log N) (amortized)
+# per number touched.
+
+from typing import Dict, List, Optional, Sequence, Tuple
+from datetime import datetime, timezone
+from uuid import UUID
+import heapq
+from models.index import PhoneNumber, UsageCounters
+
+DAY_SECONDS = 24 * 60 * 60
+
+# ------------------------------------------------------
+# Usage helpers
+# ------------------------------------------------------
+def _timestamp(value: Optional[datetime]) -> float:
+    if value is None:
+        return 0.0
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)  # Naive timestamps are UTC
+    return value.timestamp()
+
+def next_eligible_at(usage: UsageCounters, limits: Sequence[Tuple[int, int]], now: float) -> float:
+    """Earliest time every (max_uses, window_days) limit allows another use (0 = now).
+    A window covers whole UTC days ending with the day of the use."""
+    today = int(now // DAY_SECONDS)
+    eligible_day = today
+    for max_uses, window_days in limits:
+        if max_uses <= 0:
+            continue
+        day = today
+        # Slide the window a day at a time until it holds fewer than max_uses
+        while usage.uses_between(day - window_days + 1, day) >= max_uses:
+            day += 1
+        eligible_day = max(eligible_day, day)
+    return 0.0 if eligible_day == today else float(eligible_day * DAY_SECONDS)
+
+# ------------------------------------------------------
+# Queue
+# ------------------------------------------------------
+class _Entry:
+    __slots__ = ("usage_eligible_at", "eligible_at", "rank")
+
+    def __init__(self, usage_eligible_at: float, eligible_at: float, rank: tuple):
+        self.usage_eligible_at = usage_eligible_at
+        self.eligible_at = eligible_at
+        self.rank = rank
+
+class SuggestionQueue:
+    """Eligible phone numbers ordered by redeem value, then least recently used."""
+
+    def __init__(self, limits: Sequence[Tuple[int, int]]):
+        self.limits = list(limits)
+        self._entries: Dict[UUID, _Entry] = {}
+        self._reserved_until: Dict[UUID, float] = {}
+        self._waiting: List[Tuple[float, UUID]] = []
+        self._ready: List[tuple] = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _push(self, phone_id: UUID, entry: _Entry, now: float):
+        if entry.eligible_at > now:
+            heapq.heappush(self._waiting, (entry.eligible_at, phone_id))
+        else:
+            heapq.heappush(self._ready, (*entry.rank, phone_id))
+
+    def _compact(self):
+        # Rebuild both heaps from the live entries once stale items are more than twice
+        # as many; each rebuild is paid for by the pushes that made those items stale
+        if len(self._waiting) + len(self._ready) <= 3 * len(self._entries):
+            return
+        # Entries with a cooldown or reservation wait; _promote moves the ended ones
+        self._waiting = [(entry.eligible_at, phone_id) for phone_id, entry in self._entries.items() if entry.eligible_at]
+        self._ready = [(*entry.rank, phone_id) for phone_id, entry in self._entries.items() if not entry.eligible_at]
+        heapq.heapify(self._waiting)
+        heapq.heapify(self._ready)
+
+    def update(self, phone: PhoneNumber, now: float):
+        """(Re)index a phone number after it was created or changed."""
+        if phone.is_deleted:
+            self.remove(phone.id)
+            return
+        usage_eligible_at = next_eligible_at(phone.usage, self.limits, now)
+        eligible_at = max(usage_eligible_at, self._reserved_until.get(phone.id, 0.0))
+        rank = (not phone.has_redeem_value, _timestamp(phone.last_used))
+        entry = _Entry(usage_eligible_at, eligible_at, rank)
+        self._entries[phone.id] = entry
+        self._push(phone.id, entry, now)
+        self._compact()
+
+    def hold(self, phone_id: UUID, until: float, now: float):
+        """Apply a reservation made elsewhere (another worker)."""
+        entry = self._entries.get(phone_id)
+        if entry is None or until <= max(now, self._reserved_until.get(phone_id, 0.0)):
+            return
+        self._reserved_until[phone_id] = until
+        entry.eligible_at = max(entry.usage_eligible_at, until)
+        heapq.heappush(self._waiting, (entry.eligible_at, phone_id))
+        self._compact()
+
+    def remove(self, phone_id: UUID):
+        self._entries.pop(phone_id, None)
+        self._reserved_until.pop(phone_id, None)
+        self._compact()
+
+    def _promote(self, now: float):
+        # Move numbers whose cooldown or reservation has ended into the ready heap
+        while self._waiting and self._waiting[0][0] <= now:
+            eligible_at, phone_id = heapq.heappop(self._waiting)
+            entry = self._entries.get(phone_id)
+            if entry is None or entry.eligible_at != eligible_at:
+                continue  # Stale
+            if self._reserved_until.get(phone_id, 0.0) <= now:
+                self._reserved_until.pop(phone_id, None)
+            heapq.heappush(self._ready, (*entry.rank, phone_id))
+
+    def _pop_ready(self, now: float) -> Optional[UUID]:
+        while self._ready:
+            item = heapq.heappop(self._ready)
+            phone_id = item[-1]
+            entry = self._entries.get(phone_id)
+            if entry is not None and entry.eligible_at <= now and entry.rank == item[:-1]:
+                return phone_id
+        return None
+
+    def peek(self, limit: int, now: float) -> List[UUID]:
+        """Best `limit` eligible ids, leaving them in the queue."""
+        self._promote(now)
+        best = []
+        while len(best) < limit:
+            phone_id = self._pop_ready(now)
+            if phone_id is None:
+                break
+            if phone_id not in best:  # An id re-indexed with the same rank has duplicate items
+                best.append(phone_id)
+        for phone_id in best:
+            heapq.heappush(self._ready, (*self._entries[phone_id].rank, phone_id))
+        return best
+
+    def reserve(self, limit: int, now: float, until: float) -> List[UUID]:
+        """Take the best `limit` eligible ids and hide them until `until`."""
+        self._promote(now)
+        reserved = []
+        while len(reserved) < limit:
+            phone_id = self._pop_ready(now)
+            if phone_id is None:
+                break
+            entry = self._entries[phone_id]
+            self._reserved_until[phone_id] = until
+            entry.eligible_at = max(entry.usage_eligible_at, until)
+            heapq.heappush(self._waiting, (entry.eligible_at, phone_id))
+            reserved.append(phone_id)
+        return reserved
@@ -0,0 +1,182 @@
+# uploads.py
+
+# Streaming image uploads: the request body is read chunk by chunk into a spooled
+# buffer (memory first, a temporary file past UPLOAD_IMAGE_SPOOL_BYTES) that is
+# handed to genai.upload_file as is. Accepts multipart/form-data (the first file
+# part) or the raw image as the body. The MIME type comes from the magic bytes.
+# Batch uploads read every file part of a multipart body.
+
+from typing import IO, AsyncIterator, Callable, List, Optional, Tuple
+from tempfile import SpooledTemporaryFile
+import io
+from fastapi import HTTPException, Request
+
+# ------------------------------------------------------
+# MIME type detection
+# ------------------------------------------------------
+# Image formats Gemini accepts: JPEG, PNG, WebP, HEIC and HEIF. HEIC/HEIF files are
+# ISO base media files whose brand follows "ftyp" at bytes 8..12.
+_FTYP_BRANDS = {
+    b"heic": "image/heic", b"heix": "image/heic", b"hevc": "image/heic", b"heim": "image/heic",
+    b"mif1": "image/heif", b"msf1": "image/heif",
+}
+
+def detect_image_mime_type(header: bytes) -> Optional[str]:
+    """MIME type of an image from its first bytes, or None if not a supported image."""
+    if header.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    if header[4:8] == b"ftyp":
+        return _FTYP_BRANDS.get(header[8:12])
+    return None
+
+# ------------------------------------------------------
+# Reading the request body
+# ------------------------------------------------------
+async def _capped_stream(request: Request, max_bytes: int) -> AsyncIterator[bytes]:
+    # Reject oversized bodies up front when the length is declared, else once exceeded
+    declared = request.headers.get("content-length")
+    if declared is not None and declared.isdigit() and int(declared) > max_bytes:
+        raise HTTPException(status_code=413, detail=f"Uploads are limited to {max_bytes} bytes.")
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > max_bytes:
+            raise HTTPException(status_code=413, detail=f"Uploads are limited to {max_bytes} bytes.")
+        yield chunk
+
+def _multipart_boundary(content_type: str) -> bytes:
+    for param in content_type.split(";")[1:]:
+        key, _, value = param.strip().partition("=")
+        if key.lower() == "boundary" and value:
+            return value.strip('"').encode("latin-1")
+    raise HTTPException(status_code=400, detail="Missing multipart boundary.")
+
+def _part_file_name(headers: str) -> Optional[str]:
+    # Content-Disposition: form-data; name="file"; filename="photo.jpg"
+    for line in headers.split("\r\n"):
+        name, _, value = line.partition(":")
+        if name.strip().lower() != "content-disposition":
+            continue
+        for param in value.split(";")[1:]:
+            key, _, param_value = param.strip().partition("=")
+            if key.lower() == "filename":
+                return param_value.strip('"')
+    return None
+
+async def _write_multipart_files(
+    chunks: AsyncIterator[bytes],
+    boundary: bytes,
+    open_file: Callable[[str], IO[bytes]],
+    max_files: int,
+) -> int:
+    """Write the body of each file part (up to `max_files`) to `open_file(file_name)`.
+    Returns the number of files written; other form fields are skipped.
+
+    Only a delimiter-sized tail is held back between chunks, so file bytes are
+    copied once, straight into the buffers.
+    """
+    delimiter = b"--" + boundary
+    part_end = b"\r\n" + delimiter
+    pending = bytearray()
+    state = "preamble"  # preamble -> headers -> file | skip -> preamble ...
+    buffer = None
+    files = 0
+    async for chunk in chunks:
+        pending += chunk
+        while True:
+            if state == "preamble":
+                position = pending.find(delimiter + b"\r\n")
+                if position < 0:
+                    del pending[:max(0, len(pending) - len(delimiter) - 2)]
+                    break
+                del pending[:position + len(delimiter) + 2]
+                state = "headers"
+            if state == "headers":
+                position = pending.find(b"\r\n\r\n")
+                if position < 0:
+                    if len(pending) > 16 * 1024:
+                        raise HTTPException(status_code=400, detail="Malformed multipart headers.")
+                    break
+                headers = pending[:position].decode("latin-1")
+                del pending[:position + 4]
+                file_name = _part_file_name(headers)
+                if file_name is not None and files < max_files:
+                    buffer = open_file(file_name)
+                    state = "file"
+                else:
+                    state = "skip"
+            position = pending.find(part_end)
+            if position < 0:
+                keep = len(part_end)
+                if state == "file" and len(pending) > keep:
+                    buffer.write(pending[:-keep])
+                del pending[:-keep]
+                break
+            if state == "file":
+                buffer.write(pending[:position])
+                files += 1
+                if files == max_files:
+                    return files
+            del pending[:position + 2]  # Done with this part; look for the next one
+            state = "preamble"
+    return files
+
+async def read_image_upload(request: Request, max_bytes: int, spool_bytes: int) -> Tuple[SpooledTemporaryFile, str, Optional[str]]:
+    """Stream the uploaded image into a spooled buffer (rewound, ready to read).
+
+    Returns (buffer, mime_type, file_name). Raises HTTPException with 413 past
+    `max_bytes`, 400 for malformed multipart bodies and 415 for non-images.
+    The caller closes the buffer.
+    """
+    buffer = SpooledTemporaryFile(max_size=spool_bytes)
+    try:
+        chunks = _capped_stream(request, max_bytes)
+        content_type = request.headers.get("content-type", "")
+        if content_type.lower().startswith("multipart/form-data"):
+            file_names = []
+            def open_file(name: str) -> IO[bytes]:
+                file_names.append(name)
+                return buffer
+            if not await _write_multipart_files(chunks, _multipart_boundary(content_type), open_file, max_files=1):
+                raise HTTPException(status_code=400, detail="No file part in the multipart body.")
+            file_name = file_names[0]
+        else:
+            file_name = None
+            async for chunk in chunks:
+                buffer.write(chunk)
+        buffer.seek(0)
+        mime_type = detect_image_mime_type(buffer.read(16))
+        if mime_type is None:
+            raise HTTPException(status_code=415, detail="Unsupported image type (expected JPEG, PNG, WebP, HEIC or HEIF).")
+        buffer.seek(0)
+        return buffer, mime_type, file_name
+    except BaseException:
+        buffer.close()
+        raise
+
+async def read_image_uploads(request: Request, max_bytes: int, max_files: int) -> List[Tuple[bytes, Optional[str]]]:
+    """Read every file part of a multipart/form-data body (up to `max_files`).
+
+    Returns (image bytes, file name) per part, in order; the caller detects each
+    image's type. Raises HTTPException with 413 past `max_bytes` (whole body) and
+    400 for malformed bodies or when there is no file part.
+    """
+    content_type = request.headers.get("content-type", "")
+    if not content_type.lower().startswith("multipart/form-data"):
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data body.")
+    parts: List[Tuple[io.BytesIO, str]] = []
+    def open_file(name: str) -> IO[bytes]:
+        parts.append((io.BytesIO(), name))
+        return parts[-1][0]
+    await _write_multipart_files(_capped_stream(request, max_bytes), _multipart_boundary(content_type), open_file, max_files)
+    if not parts:
+        raise HTTPException(status_code=400, detail="No file part in the multipart body.")
+    return [(buffer.getvalue(), name) for buffer, name in parts]
+
+async def read_capped_body(request: Request, max_bytes: int) -> bytes:
+    """The whole request body; HTTPException 413 past `max_bytes`."""
+    return b"".join([chunk async for chunk in _capped_stream(request, max_bytes)])
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Server modules import each other as top-level modules (the server runs from
+# backend/server); make them importable for the unit tests as well
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "server"))
@@ -1,17 +1,24 @@
 import pytest
 import httpx
+import json
 from fastapi import status
 from uuid import uuid4
+from datetime import datetime, timedelta, timezone
 from server.models.index import PhoneNumberCreate, PhoneNumberUpdate
 
 # URL for your FastAPI app (change if using different base URL)
 BASE_URL = "http://127.0.0.1:8000/phone_numbers"
 
+def unique_number(area_code: str = "555") -> str:
+    # A number no earlier run created, so the suite can be rerun against the same server
+    digits = f"{uuid4().int % 10**7:07d}"
+    return f"{area_code}-{digits[:3]}-{digits[3:]}"
+
 @pytest.mark.asyncio
 async def test_create_phone_number_success():
     # Arrange: Create a valid phone number data
     phone_data = {
-        "number": "123-456-7890",
+        "number": unique_number("123"),
         "has_redeem_value": False,
         "number_of_points": 0
     }
@@ -29,7 +36,7 @@ async def test_create_phone_number_success():
 async def test_create_phone_number_duplicate():
     # Arrange: Create a duplicate phone number
     phone_data = {
-        "number": "123-456-7890",
+        "number": unique_number("123"),
         "has_redeem_value": False,
         "number_of_points": 0
     }
@@ -43,6 +50,68 @@ async def test_create_phone_number_duplicate():
     assert response_2.status_code == status.HTTP_400_BAD_REQUEST
     assert response_2.json()["detail"] == "Phone number already exists."
 
+@pytest.mark.asyncio
+async def test_create_phone_number_durable():
+    # Arrange: Create a phone number that must be flushed before the response
+    phone_data = {
+        "number": unique_number("718"),
+        "has_redeem_value": False,
+        "number_of_points": 0
+    }
+
+    # Act: Send POST request asking to wait for the background writer
+    async with httpx.AsyncClient() as client:
+        response = await client.post(f"{BASE_URL}/", params={"durable": True}, json=phone_data)
+
+    # Assert: Check status code and response content
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["number"] == phone_data["number"]
+
+@pytest.mark.asyncio
+async def test_batch_upsert_phone_numbers():
+    # Arrange: A batch with a new number, an in-batch duplicate, an invalid number
+    # and an update of an existing one
+    new, existing = unique_number("415"), unique_number("415")
+    items = [
+        {"number": new, "has_redeem_value": False},
+        {"number": f"({new[:3]}) {new[4:]}", "has_redeem_value": True},
+        {"number": "12345", "has_redeem_value": False},
+        {"number": existing, "has_redeem_value": True, "number_of_points": 7},
+    ]
+    async with httpx.AsyncClient() as client:
+        await client.post(f"{BASE_URL}/", json={"number": existing, "has_redeem_value": False})
+
+        # Act: Send the batch as an upsert
+        response = await client.post(f"{BASE_URL}/batch", params={"upsert": True}, json=items)
+
+    # Assert: One result per item, in order
+    assert response.status_code == status.HTTP_200_OK
+    statuses = [result["status"] for result in response.json()["results"]]
+    assert statuses == ["created", "duplicate", "invalid", "updated"]
+
+@pytest.mark.asyncio
+async def test_batch_reports_null_fields_as_invalid():
+    # Arrange: Items with explicit nulls for non-nullable fields, a new one and an update
+    stored = unique_number("415")
+    items = [
+        {"number": unique_number("415"), "has_redeem_value": True, "amount_spent": None},
+        {"number": stored, "has_redeem_value": None, "is_deleted": None},
+        {"number": unique_number("415"), "has_redeem_value": True},
+    ]
+    async with httpx.AsyncClient() as client:
+        await client.post(f"{BASE_URL}/", json={"number": stored, "has_redeem_value": False})
+
+        # Act: Send the batch as an upsert
+        response = await client.post(f"{BASE_URL}/batch", params={"upsert": True}, json=items)
+        existing = (await client.get(f"{BASE_URL}/search_phone_number/{stored}")).json()
+        phone = (await client.get(f"{BASE_URL}/{existing['id']}")).json()
+
+    # Assert: The null items are invalid, the rest is applied, the stored record is intact
+    assert response.status_code == status.HTTP_200_OK
+    statuses = [result["status"] for result in response.json()["results"]]
+    assert statuses == ["invalid", "invalid", "created"]
+    assert phone["has_redeem_value"] is False
+
 @pytest.mark.asyncio
 async def test_get_all_phone_numbers():
     # Act: Send GET request to retrieve all phone numbers
@@ -54,11 +123,86 @@ async def test_get_all_phone_numbers():
     phone_numbers = response.json()
     assert isinstance(phone_numbers, list)
 
+@pytest.mark.asyncio
+async def test_get_phone_numbers_paginated():
+    # Arrange: Make sure there are at least three phone numbers
+    async with httpx.AsyncClient() as client:
+        for number in [unique_number("303") for _ in range(3)]:
+            await client.post(f"{BASE_URL}/", json={"number": number, "has_redeem_value": False})
+
+    # Act: Walk the list two records at a time following the cursor header
+    seen_ids = []
+    params = {"limit": 2}
+    async with httpx.AsyncClient() as client:
+        while True:
+            response = await client.get(f"{BASE_URL}/", params=params)
+            assert response.status_code == status.HTTP_200_OK
+            page = response.json()
+            assert len(page) <= 2
+            seen_ids.extend(phone["id"] for phone in page)
+            next_cursor = response.headers.get("X-Next-Cursor")
+            if not next_cursor:
+                break
+            params = {"limit": 2, "cursor": next_cursor}
+        full_list = (await client.get(f"{BASE_URL}/")).json()
+
+    # Assert: Pages cover every record exactly once
+    assert len(seen_ids) == len(set(seen_ids))
+    assert set(seen_ids) == {phone["id"] for phone in full_list}
+
+@pytest.mark.asyncio
+async def test_get_phone_numbers_projected_ndjson():
+    # Act: Stream only ids and numbers of redeemable phone numbers
+    async with httpx.AsyncClient() as client:
+        await client.post(f"{BASE_URL}/", json={"number": unique_number("303"), "has_redeem_value": True})
+        response = await client.get(
+            f"{BASE_URL}/",
+            params={"fields": "id,number", "has_redeem_value": True, "format": "ndjson"},
+        )
+
+    # Assert: Each line is a projected record
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert records
+    assert all(set(record) == {"id", "number"} for record in records)
+
+@pytest.mark.asyncio
+async def test_get_phone_numbers_not_modified():
+    # Act: Repeat the full list request with the ETag from the first response
+    async with httpx.AsyncClient() as client:
+        first = await client.get(f"{BASE_URL}/")
+        second = await client.get(f"{BASE_URL}/", headers={"If-None-Match": first.headers["ETag"]})
+
+    # Assert: Nothing changed in between, so the body is not resent
+    assert first.status_code == status.HTTP_200_OK
+    assert second.status_code == status.HTTP_304_NOT_MODIFIED
+
+@pytest.mark.asyncio
+async def test_get_phone_number_changes():
+    # Arrange: Remember the current sequence, then create and delete phone numbers
+    async with httpx.AsyncClient() as client:
+        since = (await client.get(f"{BASE_URL}/changes", params={"since": 2**62})).json()["seq"]  # Current sequence, no records
+        kept = (await client.post(f"{BASE_URL}/", json={"number": unique_number("505"), "has_redeem_value": False})).json()
+        removed = (await client.post(f"{BASE_URL}/", json={"number": unique_number("505"), "has_redeem_value": False})).json()
+        await client.delete(f"{BASE_URL}/{removed['id']}")
+
+        # Act: Ask for everything that changed since then
+        response = await client.get(f"{BASE_URL}/changes", params={"since": since})
+
+    # Assert: The surviving record is updated, the removed one is a tombstone
+    assert response.status_code == status.HTTP_200_OK
+    changes = response.json()
+    assert changes["seq"] > since
+    assert kept["id"] in [phone["id"] for phone in changes["updated"]]
+    assert removed["id"] in [tombstone["id"] for tombstone in changes["deleted"]]
+    assert removed["id"] not in [phone["id"] for phone in changes["updated"]]
+
 @pytest.mark.asyncio
 async def test_get_phone_number_by_id_success():
     # Arrange: Create a phone number and then retrieve it by ID
     phone_data = {
-        "number": "987-654-3210",
+        "number": unique_number("987"),
         "has_redeem_value": False,
         "number_of_points": 0
     }
@@ -92,7 +236,7 @@ async def test_get_phone_number_by_id_not_found():
 async def test_search_phone_number_success():
     # Arrange: Create a phone number and then search for it by number
     phone_data = {
-        "number": "555-555-5555",
+        "number": unique_number(),
         "has_redeem_value": True,
         "number_of_points": 10
     }
@@ -109,6 +253,26 @@ async def test_search_phone_number_success():
     assert search_result["client_ip"]
     assert search_result["id"]
 
+@pytest.mark.asyncio
+async def test_search_phone_number_unformatted():
+    # Arrange: Create a phone number, then search for it without separators
+    phone_data = {
+        "number": unique_number("646"),
+        "has_redeem_value": False,
+        "number_of_points": 0
+    }
+    async with httpx.AsyncClient() as client:
+        create_response = await client.post(f"{BASE_URL}/", json=phone_data)
+        created_phone = create_response.json()
+
+    # Act: Search using the bare digits with a +1 country code
+    async with httpx.AsyncClient() as client:
+        response = await client.get(f"{BASE_URL}/search_phone_number/1{phone_data['number'].replace('-', '')}")
+
+    # Assert: The index should match the normalized number
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["id"] == created_phone["id"]
+
 @pytest.mark.asyncio
 async def test_search_phone_number_not_found():
     # Act: Try to search for a non-existing phone number
@@ -124,7 +288,7 @@ async def test_search_phone_number_not_found():
 async def test_update_phone_number_success():
     # Arrange: Create a phone number, then update its details
     phone_data = {
-        "number": "444-444-4444",
+        "number": unique_number("444"),
         "has_redeem_value": False,
         "number_of_points": 0
     }
@@ -150,7 +314,7 @@ async def test_update_phone_number_success():
 async def test_delete_phone_number_success():
     # Arrange: Create a phone number, then delete it
     phone_data = {
-        "number": "333-333-3333",
+        "number": unique_number("333"),
         "has_redeem_value": True,
         "number_of_points": 100
     }
@@ -165,3 +329,116 @@ async def test_delete_phone_number_success():
     # Assert: Check if phone number was deleted
     assert delete_response.status_code == status.HTTP_200_OK
     assert delete_response.json()["detail"] == "Phone number deleted."
+
+@pytest.mark.asyncio
+async def test_bulk_update_phone_numbers():
+    # Arrange: Two numbers in an area code, one used at a moment no other test or run uses
+    used_at = datetime(2001, 1, 1, tzinfo=timezone.utc) + timedelta(seconds=uuid4().int % 10**8)
+    async with httpx.AsyncClient() as client:
+        used = (await client.post(f"{BASE_URL}/", json={"number": unique_number("808"), "has_redeem_value": False})).json()
+        await client.post(f"{BASE_URL}/", json={"number": unique_number("808"), "has_redeem_value": False})
+        await client.put(f"{BASE_URL}/{used['id']}", json={"last_used": used_at.isoformat()})
+        points_before = (await client.get(f"{BASE_URL}/{used['id']}")).json()["number_of_points"]
+
+        # Act: Add points to numbers in the area code used within a second of that moment
+        response = await client.post(f"{BASE_URL}/bulk_update", json={
+            "filter": {
+                "area_code": "808",
+                "last_used_after": (used_at - timedelta(seconds=1)).isoformat(),
+                "last_used_before": (used_at + timedelta(seconds=1)).isoformat(),
+            },
+            "increment": {"number_of_points": 5},
+        })
+        phone = (await client.get(f"{BASE_URL}/{used['id']}")).json()
+
+    # Assert: Only the used number matched, and one audit entry describes the batch
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["matched"] == 1
+    assert response.json()["audit"]["action"] == "bulk_update"
+    assert phone["number_of_points"] == points_before + 5
+
+@pytest.mark.asyncio
+async def test_bulk_update_rejects_null_for_required_fields():
+    # Arrange: A number the update would match
+    async with httpx.AsyncClient() as client:
+        created = (await client.post(f"{BASE_URL}/", json={"number": unique_number("808"), "has_redeem_value": True})).json()
+
+        # Act: Try to set a non-nullable field to null on every number
+        response = await client.post(f"{BASE_URL}/bulk_update", json={"set": {"has_redeem_value": None}})
+        phone = (await client.get(f"{BASE_URL}/{created['id']}")).json()
+
+    # Assert: Rejected, and no record was changed
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert phone["has_redeem_value"] is True
+
+@pytest.mark.asyncio
+async def test_suggest_skips_numbers_used_twice_today():
+    # Arrange: A number used twice today
+    async with httpx.AsyncClient() as client:
+        created = (await client.post(f"{BASE_URL}/", json={"number": unique_number("919"), "has_redeem_value": True})).json()
+        for _ in range(2):
+            await client.put(f"{BASE_URL}/{created['id']}", json={"last_used": datetime.now(timezone.utc).isoformat()})
+
+        # Act: Ask for suggestions and reserve twice
+        suggested = (await client.get(f"{BASE_URL}/suggest", params={"limit": 100})).json()
+        first = (await client.post(f"{BASE_URL}/suggest/reserve", params={"limit": 2, "seconds": 5})).json()
+        second = (await client.post(f"{BASE_URL}/suggest/reserve", params={"limit": 2, "seconds": 5})).json()
+
+    # Assert: The exhausted number is never offered, and reservations never overlap
+    assert created["id"] not in [phone["id"] for phone in suggested]
+    first_ids = {phone["id"] for phone in first["phone_numbers"]}
+    second_ids = {phone["id"] for phone in second["phone_numbers"]}
+    assert not first_ids & second_ids
+
+@pytest.mark.asyncio
+async def test_phone_number_history_and_usage():
+    # Arrange: A number that is used once and tried once
+    async with httpx.AsyncClient() as client:
+        created = (await client.post(f"{BASE_URL}/", json={"number": unique_number("919"), "has_redeem_value": True})).json()
+        now = datetime.now(timezone.utc).isoformat()
+        await client.put(f"{BASE_URL}/{created['id']}", json={"last_used": now})
+        await client.put(f"{BASE_URL}/{created['id']}", json={"last_tried": now})
+
+        # Act: Read the record, its history and its usage counters
+        phone = (await client.get(f"{BASE_URL}/{created['id']}")).json()
+        history = (await client.get(f"{BASE_URL}/{created['id']}/history")).json()["history"]
+        usage = (await client.get(f"{BASE_URL}/{created['id']}/usage")).json()
+
+    # Assert: History lives in its own segment, counters are kept on the record
+    assert "last_used_history" not in phone
+    assert [entry["action"] for entry in history] == ["used", "tried"]
+    assert usage["today"] == 1
+    assert usage["last_7_days"] == 1
+
+@pytest.mark.asyncio
+async def test_update_phone_number_version_conflict():
+    # Arrange: Read a record and its ETag, then let another client update it
+    async with httpx.AsyncClient() as client:
+        created = (await client.post(f"{BASE_URL}/", json={"number": unique_number("919"), "has_redeem_value": True})).json()
+        etag = (await client.get(f"{BASE_URL}/{created['id']}")).headers["ETag"]
+        await client.put(f"{BASE_URL}/{created['id']}", json={"number_of_points": 5}, headers={"If-Match": etag})
+
+        # Act: Write again with the now stale ETag
+        stale = await client.put(f"{BASE_URL}/{created['id']}", json={"number_of_points": 7}, headers={"If-Match": etag})
+        current = (await client.get(f"{BASE_URL}/{created['id']}")).json()
+
+    # Assert: The stale write is rejected and the first one kept
+    assert stale.status_code == 409
+    assert current["number_of_points"] == 5
+    assert current["version"] == created["version"] + 1
+
+@pytest.mark.asyncio
+async def test_get_phone_numbers_reflects_updates():
+    # Arrange: Read the full list once so its body is cached
+    async with httpx.AsyncClient() as client:
+        created = (await client.post(f"{BASE_URL}/", json={"number": unique_number("919"), "has_redeem_value": True})).json()
+        await client.get(f"{BASE_URL}/")
+
+        # Act: Update the record and read the list and the record again
+        await client.put(f"{BASE_URL}/{created['id']}", json={"number_of_points": 9})
+        listed = {phone["id"]: phone for phone in (await client.get(f"{BASE_URL}/")).json()}
+        single = (await client.get(f"{BASE_URL}/{created['id']}")).json()
+
+    # Assert: Neither read is served from a stale cache
+    assert listed[created["id"]]["number_of_points"] == 9
+    assert single["number_of_points"] == 9
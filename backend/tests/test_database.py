@@ -0,0 +1,44 @@
+import importlib.util
+import json
+import config
+from models.index import PhoneNumber
+from snapshot import encode_phone_number
+
+def load_database(name: str):
+    # A fresh copy of database.py, loading the stores in the current directory
+    spec = importlib.util.spec_from_file_location(name, importlib.util.find_spec("database").origin)
+    database = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(database)
+    return database
+
+def test_legacy_history_moves_to_the_segment_once(tmp_path, monkeypatch):
+    # Arrange: A JSON store with a record saved before the history segment existed,
+    # and one saved after
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(config, "STORAGE_ENGINE", "json")
+    monkeypatch.setattr(config, "SHARED_STORAGE", False)
+    monkeypatch.setattr(config, "PHONE_NUMBERS_HISTORY_FILE", str(tmp_path / "phone_numbers_history.log"))
+    monkeypatch.setattr(config, "EXTRACTION_CACHE_FILE", "")
+    legacy = PhoneNumber(number="415-555-0199", has_redeem_value=True)
+    current = PhoneNumber(number="415-555-0189", has_redeem_value=True, notes="no _history here")
+    used = {"timestamp": "2026-10-12T09:00:00+00:00", "ip": "10.0.0.1", "action": "used"}
+    tried = {"timestamp": "2026-10-13T09:00:00+00:00", "ip": "10.0.0.1", "action": "tried"}
+    records = {
+        str(legacy.id): {**json.loads(encode_phone_number(legacy)), "last_used_history": [used], "last_tried_history": [tried]},
+        str(current.id): json.loads(encode_phone_number(current)),
+    }
+    (tmp_path / "phone_numbers_db.json").write_text(json.dumps(records))
+
+    # Act: Start twice
+    first = load_database("database_first_start")
+    first.storage.close()
+    second = load_database("database_second_start")
+
+    # Assert: The entries moved to the segment once, and the store no longer holds them
+    assert second.phone_numbers_history.read(legacy.id) == [{"id": str(legacy.id), **used}, {"id": str(legacy.id), **tried}]
+    assert second.phone_numbers_history.read(current.id) == []
+    assert second.phone_numbers_db[legacy.id].last_used_history == []
+    assert second.phone_numbers_db[legacy.id].usage.day is not None  # Counted when first loaded
+    assert second.phone_numbers_db[current.id].change_seq == 0  # Only the legacy record was rewritten
+    assert b"_history" not in second.encoded_phone_number(second.phone_numbers_db[legacy.id])
+    second.storage.close()
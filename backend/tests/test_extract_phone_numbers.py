@@ -0,0 +1,265 @@
+import pytest
+import pytest_asyncio
+import httpx
+import json
+import asyncio
+from uuid import uuid4
+from fastapi import status
+from extractors import FakeExtractor
+
+# URL for your FastAPI app (change if using different base URL)
+BASE_URL = "http://127.0.0.1:8000/gemini_flash8b"
+
+# Extraction tests drive the app in process (httpx.ASGITransport, as
+# benchmarks/bench_server.py does) with the local fake extractor, so they make no
+# Gemini calls and need no server
+APP_URL = "http://test/gemini_flash8b"
+
+class FlakyExtractor(FakeExtractor):
+    """The fake extractor, failing its first `failures` calls."""
+
+    def __init__(self, failures: int):
+        super().__init__()
+        self.failures = failures
+
+    def extract(self, image, mime_type, file_name):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("model unavailable")
+        return super().extract(image, mime_type, file_name)
+
+@pytest_asyncio.fixture
+async def app_client(tmp_path, monkeypatch):
+    # The app from index.py with its stores in tmp_path and FakeExtractor in place of
+    # Gemini. Only the extraction queue is started (the lifespan would close the storage
+    # the app is imported with once per run), so saves are synchronous.
+    monkeypatch.chdir(tmp_path)
+    from index import app
+    from route.features.extract_phone_numbers import extraction_queue
+    monkeypatch.setattr(extraction_queue, "extractor", FakeExtractor())
+    await extraction_queue.start()
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), timeout=30) as client:
+            yield client
+    finally:
+        await extraction_queue.stop()
+
+def fake_image(*numbers: str) -> bytes:
+    # A PNG the fake extractor finds the numbers in; the random tag (letters only) makes
+    # every image new to the extraction cache
+    tag = uuid4().hex.translate(str.maketrans("0123456789", "ghijklmnop"))
+    return b"\x89PNG\r\n\x1a\n" + " ".join([*numbers, tag]).encode()
+
+def server_sent_events(body: str) -> list:
+    # (event, data) pairs of a text/event-stream body
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+@pytest.mark.asyncio
+async def test_upload_image_rejects_non_image():
+    # Arrange: A multipart upload whose file is not an image
+    files = {"file": ("notes.txt", b"not an image", "image/jpeg")}
+
+    # Act: Send the upload
+    async with httpx.AsyncClient() as client:
+        response = await client.post(f"{BASE_URL}/upload_image/", files=files)
+
+    # Assert: The type is detected from the bytes, not the declared Content-Type
+    assert response.status_code == status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+
+@pytest.mark.asyncio
+async def test_upload_image_requires_file_part():
+    # Arrange: A multipart body with a form field but no file
+    async with httpx.AsyncClient() as client:
+        # Act: Send the upload
+        response = await client.post(f"{BASE_URL}/upload_image/", files={"note": (None, "hello")})
+
+    # Assert: Rejected as a bad request
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+@pytest.mark.asyncio
+async def test_upload_image_stream_rejects_non_image():
+    # Arrange: A raw upload body that is not an image
+    async with httpx.AsyncClient() as client:
+        # Act: Send it to the server-sent events variant
+        response = await client.post(f"{BASE_URL}/upload_image/stream/", content=b"not an image")
+
+    # Assert: Rejected before any event is streamed
+    assert response.status_code == status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+
+@pytest.mark.asyncio
+async def test_extraction_cache_stats():
+    # Act: Read the extraction cache counters
+    async with httpx.AsyncClient() as client:
+        response = await client.get(f"{BASE_URL}/extraction_cache/stats")
+
+    # Assert: Hit/miss counters and the size bound are exposed
+    assert response.status_code == status.HTTP_200_OK
+    stats = response.json()
+    assert {"hits", "misses", "entries", "max_entries"} <= set(stats)
+
+@pytest.mark.asyncio
+async def test_extract_text_adds_numbers_for_review():
+    # Arrange: OCR-like documents with differently formatted numbers
+    documents = ["Call (415) 555-0142 or +1 800.555.0143", "Order 12345678901234, cell 1-415-555-0142"]
+
+    # Act: Extract the numbers locally, then read the review buffer
+    async with httpx.AsyncClient() as client:
+        response = await client.post(f"{BASE_URL}/extract_text/", json={"documents": documents})
+        review = await client.get(f"{BASE_URL}/review_numbers/")
+
+    # Assert: Numbers are formatted, deduplicated and waiting for review
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["numbers"] == ["415-555-0142", "800-555-0143"]
+    assert response.json()["documents"] == [["415-555-0142", "800-555-0143"], ["415-555-0142"]]
+    assert {"415-555-0142", "800-555-0143"} <= set(next(iter(review.json().values())))
+
+@pytest.mark.asyncio
+async def test_extraction_job_not_found():
+    # Act: Poll a job id that was never issued
+    async with httpx.AsyncClient() as client:
+        response = await client.get(f"{BASE_URL}/jobs/{'0' * 32}")
+
+    # Assert: Unknown jobs are 404
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+@pytest.mark.asyncio
+async def test_upload_images_reports_each_image():
+    # Arrange: A batch whose only file is not an image
+    files = [("file", ("notes.txt", b"not an image", "text/plain"))]
+
+    # Act: Send the batch
+    async with httpx.AsyncClient() as client:
+        response = await client.post(f"{BASE_URL}/upload_images/", files=files)
+
+    # Assert: The batch is answered with a result per image
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["failed"] == 1
+    assert response.json()["results"][0]["status"] == "invalid"
+
+@pytest.mark.asyncio
+async def test_upload_image_stream_sends_numbers_then_done(app_client):
+    # Arrange: An image with two numbers in it
+    image = fake_image("415-555-0161", "(650) 555-0162")
+
+    # Act: Upload it to the server-sent events variant
+    response = await app_client.post(f"{APP_URL}/upload_image/stream/", content=image, headers={"Content-Type": "image/png"})
+
+    # Assert: The job, then a number event per number, then done with all of them
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = server_sent_events(response.text)
+    assert [event for event, _ in events] == ["job", "number", "number", "done"]
+    assert [data["number"] for event, data in events if event == "number"] == ["415-555-0161", "650-555-0162"]
+    assert events[-1][1]["numbers"] == ["415-555-0161", "650-555-0162"]
+    assert events[-1][1]["job_id"] == events[0][1]["id"]
+
+@pytest.mark.asyncio
+async def test_upload_image_queues_a_job_to_poll(app_client):
+    # Arrange: An image with one number in it
+    image = fake_image("415-555-0163")
+
+    # Act: Upload it without waiting, then poll the job until it is done
+    response = await app_client.post(f"{APP_URL}/upload_image/", content=image, headers={"Content-Type": "image/png"})
+    job = response.json()["job"]
+    polled = await app_client.get(f"{APP_URL}/jobs/{job['id']}", params={"wait": 20})
+
+    # Assert: 202 with a pending job, which then succeeds with the number
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    assert job["status"] in ("queued", "running")
+    assert polled.status_code == status.HTTP_200_OK
+    assert polled.json()["status"] == "succeeded"
+    assert polled.json()["numbers"] == ["415-555-0163"]
+
+@pytest.mark.asyncio
+async def test_upload_image_wait_returns_the_numbers(app_client):
+    # Arrange: An image with one number in it
+    image = fake_image("415-555-0164")
+
+    # Act: Upload it and wait for the extraction
+    response = await app_client.post(f"{APP_URL}/upload_image/", params={"wait": True}, content=image, headers={"Content-Type": "image/png"})
+
+    # Assert: The numbers come in the response, as with the base64 upload
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["numbers"] == ["415-555-0164"]
+    assert response.json()["job_id"]
+
+@pytest.mark.asyncio
+async def test_upload_image_retries_a_failed_extraction(app_client, monkeypatch):
+    # Arrange: An extractor that fails twice, and a short backoff
+    from route.features.extract_phone_numbers import extraction_queue
+    monkeypatch.setattr(extraction_queue, "extractor", FlakyExtractor(failures=2))
+    monkeypatch.setattr(extraction_queue, "max_attempts", 3)
+    monkeypatch.setattr(extraction_queue, "retry_backoff", 0.01)
+    image = fake_image("415-555-0167")
+
+    # Act: Upload it and wait for the extraction
+    response = await app_client.post(f"{APP_URL}/upload_image/", params={"wait": True}, content=image, headers={"Content-Type": "image/png"})
+    job = (await app_client.get(f"{APP_URL}/jobs/{response.json()['job_id']}")).json()
+
+    # Assert: The third attempt succeeds
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["numbers"] == ["415-555-0167"]
+    assert job["status"] == "succeeded"
+    assert job["attempts"] == 3
+
+@pytest.mark.asyncio
+async def test_upload_image_fails_after_the_last_attempt(app_client, monkeypatch):
+    # Arrange: An extractor that keeps failing, and a short backoff
+    from route.features.extract_phone_numbers import extraction_queue
+    monkeypatch.setattr(extraction_queue, "extractor", FlakyExtractor(failures=10))
+    monkeypatch.setattr(extraction_queue, "max_attempts", 2)
+    monkeypatch.setattr(extraction_queue, "retry_backoff", 0.01)
+
+    # Act: Upload an image without waiting, then poll the job until it is done
+    response = await app_client.post(f"{APP_URL}/upload_image/", content=fake_image("415-555-0168"), headers={"Content-Type": "image/png"})
+    polled = await app_client.get(f"{APP_URL}/jobs/{response.json()['job']['id']}", params={"wait": 20})
+
+    # Assert: The job fails with the extractor's error once its attempts are used up
+    assert polled.json()["status"] == "failed"
+    assert polled.json()["attempts"] == 2
+    assert polled.json()["error"] == "model unavailable"
+
+@pytest.mark.asyncio
+async def test_upload_image_rejected_past_max_pending(app_client, monkeypatch):
+    # Arrange: A queue of 4 whose extractions take a while, and one more image than that
+    from route.features.extract_phone_numbers import extraction_queue
+    monkeypatch.setattr(extraction_queue, "extractor", FakeExtractor(delay=0.2))
+    monkeypatch.setattr(extraction_queue, "max_pending", 4)
+    images = [fake_image("415-555-0165") for _ in range(5)]
+
+    # Act: Upload them all at once without waiting, then wait for the accepted jobs
+    responses = await asyncio.gather(*(
+        app_client.post(f"{APP_URL}/upload_image/", content=image, headers={"Content-Type": "image/png"})
+        for image in images
+    ))
+    accepted = [response.json()["job"]["id"] for response in responses if response.status_code == status.HTTP_202_ACCEPTED]
+    for job_id in accepted:
+        await app_client.get(f"{APP_URL}/jobs/{job_id}", params={"wait": 20})
+
+    # Assert: The upload past the limit is turned away with a retry hint
+    rejected = [response for response in responses if response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE]
+    assert len(accepted) == 4
+    assert len(rejected) == 1
+    assert rejected[0].headers["Retry-After"] == "5"
+
+@pytest.mark.asyncio
+async def test_upload_image_repeat_is_a_cache_hit(app_client):
+    # Arrange: An image and the cache counters before it is uploaded
+    image = fake_image("415-555-0166")
+    before = (await app_client.get(f"{APP_URL}/extraction_cache/stats")).json()
+
+    # Act: Upload the same image twice, waiting for each, and look at the second job
+    first = await app_client.post(f"{APP_URL}/upload_image/", params={"wait": True}, content=image, headers={"Content-Type": "image/png"})
+    second = await app_client.post(f"{APP_URL}/upload_image/", params={"wait": True}, content=image, headers={"Content-Type": "image/png"})
+    after = (await app_client.get(f"{APP_URL}/extraction_cache/stats")).json()
+    job = (await app_client.get(f"{APP_URL}/jobs/{second.json()['job_id']}")).json()
+
+    # Assert: The repeat is answered from the cache without running the extractor
+    assert first.json()["numbers"] == second.json()["numbers"] == ["415-555-0166"]
+    assert after["hits"] == before["hits"] + 1
+    assert job["cached"] is True
+    assert job["attempts"] == 0
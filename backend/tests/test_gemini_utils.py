@@ -0,0 +1,47 @@
+from gemini_utils import PhoneNumberArrayParser
+
+def test_parser_returns_strings_as_their_chunk_arrives():
+    # Arrange: A flat array streamed in chunks that split the strings
+    parser = PhoneNumberArrayParser()
+    chunks = ['["415-55', '5-0142", "650-555-', '0199"]']
+
+    # Act: Feed the chunks one by one
+    completed = [parser.feed(chunk) for chunk in chunks]
+
+    # Assert: Each string is returned with the chunk holding its closing quote
+    assert completed == [[], [(None, "415-555-0142")], [(None, "650-555-0199")]]
+    assert parser.strings == 2
+    assert parser.text == "".join(chunks)
+
+def test_parser_skips_code_fences_and_prose():
+    # Arrange: An answer wrapped in a code block, with quoted text outside the array
+    parser = PhoneNumberArrayParser()
+    answer = 'Here are the "numbers":\n```json\n["415-555-0142", "a \\"quoted\\" value"]\n```\nDone.'
+
+    # Act: Feed the whole answer at once
+    completed = parser.feed(answer)
+
+    # Assert: Only the array's strings are returned, escapes resolved
+    assert completed == [(None, "415-555-0142"), (None, 'a "quoted" value')]
+
+def test_parser_reports_the_inner_array_of_packed_answers():
+    # Arrange: A packed answer with one array per image, one of them empty
+    parser = PhoneNumberArrayParser()
+
+    # Act: Feed the answer split inside the second array
+    completed = parser.feed('[["415-555-0142"], [') + parser.feed('], ["650-555-0199", "212-555-0100"]]')
+
+    # Assert: Each string comes with the index of its image
+    assert completed == [(0, "415-555-0142"), (2, "650-555-0199"), (2, "212-555-0100")]
+    assert parser.arrays == 3
+
+def test_parser_keeps_strings_completed_before_a_cut():
+    # Arrange: A response cut short in the middle of a string
+    parser = PhoneNumberArrayParser()
+
+    # Act: Feed what arrived
+    completed = parser.feed('["415-555-0142", "650-55')
+
+    # Assert: The completed string is kept, the torn one is not returned
+    assert completed == [(None, "415-555-0142")]
+    assert parser.strings == 1
@@ -0,0 +1,18 @@
+import pytest
+import httpx
+from fastapi import status
+
+# URL for your FastAPI app (change if using different base URL)
+BASE_URL = "http://127.0.0.1:8000"
+
+@pytest.mark.asyncio
+async def test_startup_stats():
+    # Act: Read the startup timings
+    async with httpx.AsyncClient() as client:
+        response = await client.get(f"{BASE_URL}/startup/stats")
+
+    # Assert: The total and each timed phase are exposed
+    assert response.status_code == status.HTTP_200_OK
+    stats = response.json()
+    assert stats["ready_after"] > 0
+    assert {"config", "database", "lifespan"} <= set(stats["phases"])
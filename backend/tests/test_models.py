@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta, timezone
+from models.index import PhoneNumber, UsageCounters, USAGE_WINDOW_DAYS
+
+MONDAY = datetime(2026, 10, 12, 9, 0, tzinfo=timezone.utc)
+
+def epoch_day(timestamp: datetime) -> int:
+    return int(timestamp.timestamp() // 86400)
+
+def test_usage_counters_roll_across_days():
+    # Arrange: Two uses on Monday, one on Wednesday
+    usage = UsageCounters().record_use(MONDAY).record_use(MONDAY + timedelta(hours=5))
+    usage = usage.record_use(MONDAY + timedelta(days=2))
+    monday = epoch_day(MONDAY)
+
+    # Act: Use it again a week after Monday, which pushes Monday out of the ring
+    later = usage.record_use(MONDAY + timedelta(days=USAGE_WINDOW_DAYS))
+
+    # Assert: Counts per day; Monday's slot now holds the new day
+    assert usage.uses_between(monday, monday) == 2
+    assert usage.uses_between(monday, monday + 2) == 3
+    assert later.day == monday + USAGE_WINDOW_DAYS
+    assert later.uses_between(monday, monday) == 0
+    assert later.uses_between(monday + 2, monday + 2) == 1
+    assert later.uses_between(monday, later.day) == 2
+
+def test_usage_counters_reset_after_a_quiet_week():
+    # Arrange: Uses on two days
+    usage = UsageCounters().record_use(MONDAY).record_use(MONDAY + timedelta(days=1))
+
+    # Act: The next use comes more than a window later
+    later = usage.record_use(MONDAY + timedelta(days=10))
+
+    # Assert: Only the new use is left
+    assert later.counts.count(0) == USAGE_WINDOW_DAYS - 1
+    assert later.uses_between(later.day - USAGE_WINDOW_DAYS + 1, later.day) == 1
+
+def test_usage_counters_take_late_uses_inside_the_window_only():
+    # Arrange: A use on Friday
+    usage = UsageCounters().record_use(MONDAY + timedelta(days=4))
+
+    # Act: Record an earlier use within the window, and one from before it
+    within = usage.record_use(MONDAY)
+    too_old = usage.record_use(MONDAY - timedelta(days=USAGE_WINDOW_DAYS))
+
+    # Assert: The late use is counted on its own day; the old one is ignored
+    assert within.day == usage.day
+    assert within.uses_between(epoch_day(MONDAY), epoch_day(MONDAY)) == 1
+    assert too_old is usage
+
+def test_legacy_history_is_counted_into_usage():
+    # Arrange: A record saved before usage counters existed (ISO strings on disk)
+    history = [
+        {"timestamp": MONDAY.isoformat(), "ip": "10.0.0.1"},
+        {"timestamp": (MONDAY + timedelta(days=1)).isoformat(), "ip": "10.0.0.1"},
+        {"timestamp": MONDAY + timedelta(days=1, hours=2), "ip": "10.0.0.1"},
+        {"timestamp": "not a timestamp", "ip": "10.0.0.1"},
+    ]
+
+    # Act: Load it
+    phone = PhoneNumber(number="415-555-0110", has_redeem_value=True, last_used_history=history)
+
+    # Assert: Every readable entry is counted on its UTC day; the history is not written back
+    assert phone.usage.day == epoch_day(MONDAY) + 1
+    assert phone.usage.uses_between(epoch_day(MONDAY), epoch_day(MONDAY)) == 1
+    assert phone.usage.uses_between(phone.usage.day, phone.usage.day) == 2
+    assert "last_used_history" not in phone.dict()
+
+def test_usage_counters_are_not_recounted_from_history():
+    # Arrange: A record that has both counters and (not yet moved) legacy history
+    usage = UsageCounters().record_use(MONDAY)
+    history = [{"timestamp": MONDAY.isoformat(), "ip": "10.0.0.1"}]
+
+    # Act: Load it
+    phone = PhoneNumber(number="415-555-0111", has_redeem_value=True, last_used_history=history, usage=usage)
+
+    # Assert: The counters are kept as they are
+    assert phone.usage.uses_between(epoch_day(MONDAY), epoch_day(MONDAY)) == 1
@@ -0,0 +1,143 @@
+import asyncio
+import threading
+import pytest
+from models.index import PhoneNumber
+from persistence import PersistenceWriter
+
+class FakeStorage:
+    """Records every write; can fail the next one, or hold writes until released."""
+
+    def __init__(self):
+        self.calls = []
+        self.fail_next = False
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def _record(self, call):
+        self.entered.set()
+        self.release.wait()
+        if self.fail_next:
+            self.fail_next = False
+            raise OSError("disk full")
+        self.calls.append(call)
+
+    def save_phone_numbers(self, phone_db, tombstones):
+        self._record(("save", dict(phone_db), dict(tombstones)))
+
+    def apply_phone_number_changes(self, puts, deletes):
+        self._record(("apply", list(puts), list(deletes)))
+
+    def save_gemini_temp(self, gemini_temp):
+        self._record(("gemini_temp", dict(gemini_temp)))
+
+def phone(number: str, **fields) -> PhoneNumber:
+    return PhoneNumber(number=number, has_redeem_value=True, **fields)
+
+def make_writer(storage, phone_db=None, flush_interval=60.0, max_pending=100) -> PersistenceWriter:
+    return PersistenceWriter(
+        storage,
+        lambda: phone_db if phone_db is not None else {},
+        lambda: {},
+        lambda: {},
+        flush_interval,
+        max_pending,
+    )
+
+@pytest.mark.asyncio
+async def test_writes_each_record_once_per_flush():
+    # Arrange: One record updated three times, another added, a third deleted
+    storage = FakeStorage()
+    writer = make_writer(storage)
+    await writer.start()
+    first, second, deleted = phone("415-555-0180"), phone("415-555-0181"), phone("415-555-0182")
+    for notes in ("one", "two", "three"):
+        writer.enqueue_put(first.copy(update={"notes": notes}))
+    writer.enqueue_put(second)
+    writer.enqueue_delete(deleted.id, 5)
+
+    # Act: Flush
+    await writer.flush()
+    await writer.stop()
+
+    # Assert: A single write, with the latest version of each record
+    assert len(storage.calls) == 1
+    operation, puts, deletes = storage.calls[0]
+    assert operation == "apply"
+    assert [(put.id, put.notes) for put in puts] == [(first.id, "three"), (second.id, None)]
+    assert deletes == [(deleted.id, 5)]
+
+@pytest.mark.asyncio
+async def test_requeues_a_failed_batch_behind_newer_changes():
+    # Arrange: A batch whose write fails, with a newer version of one record
+    # enqueued while it is being written
+    storage = FakeStorage()
+    storage.fail_next = True
+    storage.release.clear()
+    writer = make_writer(storage)
+    await writer.start()
+    first, second = phone("415-555-0183", notes="old"), phone("415-555-0184")
+    writer.enqueue_put(first)
+    writer.enqueue_put(second)
+    waiter = asyncio.create_task(writer.wait_for_flush())
+
+    # Act: Flush, update the record mid-write, let the write fail, then flush again
+    flush = asyncio.create_task(writer.flush())
+    await asyncio.to_thread(storage.entered.wait)
+    writer.enqueue_put(first.copy(update={"notes": "new"}))
+    storage.release.set()
+    await flush
+    with pytest.raises(OSError):
+        await waiter
+    await writer.flush()
+    await writer.stop()
+
+    # Assert: Nothing was lost, and the newer version was not overwritten by the retry
+    assert len(storage.calls) == 1
+    operation, puts, _ = storage.calls[0]
+    assert operation == "apply"
+    assert {put.id: put.notes for put in puts} == {first.id: "new", second.id: None}
+
+@pytest.mark.asyncio
+async def test_full_save_supersedes_pending_changes():
+    # Arrange: A per-record change, then a full save, then another change
+    storage = FakeStorage()
+    phone_db = {}
+    writer = make_writer(storage, phone_db)
+    await writer.start()
+    first, second = phone("415-555-0185"), phone("415-555-0186")
+    phone_db[first.id] = first
+    writer.enqueue_put(first)
+    writer.enqueue_full_save()
+    phone_db[second.id] = second
+    writer.enqueue_put(second)
+
+    # Act: Flush
+    await writer.flush()
+    await writer.stop()
+
+    # Assert: One full save of the table as it was at flush time, and no per-record write
+    assert storage.calls == [("save", {first.id: first, second.id: second}, {})]
+
+@pytest.mark.asyncio
+async def test_wait_for_flush_returns_after_the_batch_is_written():
+    # Arrange: A running writer whose storage holds the write until released
+    storage = FakeStorage()
+    storage.release.clear()
+    writer = make_writer(storage, flush_interval=0.01)
+    await writer.start()
+    record = phone("415-555-0187")
+
+    # Act: Enqueue a change and wait for it
+    writer.enqueue_put(record)
+    waiter = asyncio.create_task(writer.wait_for_flush())
+    await asyncio.to_thread(storage.entered.wait)
+    await asyncio.sleep(0.05)
+    waiting_during_write = not waiter.done()
+    storage.release.set()
+    await asyncio.wait_for(waiter, timeout=1)
+    await writer.stop()
+
+    # Assert: The waiter was still waiting while the write ran, and returned after it
+    assert waiting_during_write
+    assert storage.calls == [("apply", [record], [])]
@@ -0,0 +1,55 @@
+import pytest
+from models.phone_normalizer import (
+    format_phone_number_key,
+    normalize_many,
+    normalize_phone_number,
+    phone_number_key,
+    phone_number_key_area_code,
+)
+
+def test_key_ignores_country_code_and_punctuation():
+    # Arrange: The same number written the ways clients and the model send it
+    spellings = ["415-555-0130", "+1 415 555 0130", "(415) 555-0130", "1-415-555-0130", "415.555.0130", "4155550130"]
+
+    # Act: Reduce each to its key
+    keys = [phone_number_key(number) for number in spellings]
+
+    # Assert: One key, formatted back to the canonical form
+    assert keys == [4155550130] * len(spellings)
+    assert format_phone_number_key(keys[0]) == "415-555-0130"
+    assert phone_number_key_area_code(keys[0]) == "415"
+
+def test_key_rejects_what_is_not_a_us_number():
+    # Arrange: Too few digits, a country code other than 1, too many digits, and
+    # a canonical-looking number with a letter in it
+    invalid = ["555-0130", "+2 415 555 0130", "415-555-01301", "415-555-013a", ""]
+
+    # Act: Reduce each to its key
+    keys = [phone_number_key(number) for number in invalid]
+
+    # Assert: None of them is a number
+    assert keys == [None] * len(invalid)
+
+def test_key_keeps_leading_zeros():
+    # Act: Format a number whose area code starts with 0
+    key = phone_number_key("(012) 345-6789")
+
+    # Assert: The key is padded back to 10 digits
+    assert format_phone_number_key(key) == "012-345-6789"
+    assert phone_number_key_area_code(key) == "012"
+
+def test_normalize_phone_number_raises_for_invalid_input():
+    # Act / Assert: Valid input is formatted, invalid input raises ValueError
+    assert normalize_phone_number("+1 (415) 555-0131") == "415-555-0131"
+    with pytest.raises(ValueError):
+        normalize_phone_number("(415) 555-013")
+
+def test_normalize_many_keeps_positions_with_none_for_invalid():
+    # Arrange: A batch with repeats and invalid entries
+    numbers = ["+1 415 555 0132", "not a number", "(415) 555-0132", "415-555-0133", "not a number"]
+
+    # Act: Normalize the batch
+    normalized = normalize_many(numbers)
+
+    # Assert: One result per input, in order
+    assert normalized == ["415-555-0132", None, "415-555-0132", "415-555-0133", None]
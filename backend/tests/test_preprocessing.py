@@ -0,0 +1,107 @@
+import io
+import pytest
+from preprocessing import ImagePreprocessor, preprocess_image
+
+Image = pytest.importorskip("PIL.Image")
+
+def noisy_image(size, format="PNG") -> bytes:
+    # Noise does not compress, so every setting shows in the encoded size
+    output = io.BytesIO()
+    Image.effect_noise(size, 64).convert("RGB").save(output, format=format)
+    return output.getvalue()
+
+def decode(data: bytes):
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    return image
+
+def test_preprocess_image_scales_down_to_max_edge():
+    # Arrange: A landscape photo larger than the bound
+    data = noisy_image((1200, 600))
+
+    # Act: Preprocess it in color
+    processed = decode(preprocess_image(data, max_edge=400, grayscale=False, quality=80))
+
+    # Assert: The longer side is max_edge, the aspect ratio is kept, the result is a color JPEG
+    assert processed.format == "JPEG"
+    assert processed.size == (400, 200)
+    assert processed.mode == "RGB"
+
+def test_preprocess_image_keeps_small_images_size_and_makes_grayscale():
+    # Arrange: An image already within the bound
+    data = noisy_image((300, 200))
+
+    # Act: Preprocess it in grayscale
+    processed = decode(preprocess_image(data, max_edge=400, grayscale=True, quality=80))
+
+    # Assert: Never scaled up; one channel
+    assert processed.size == (300, 200)
+    assert processed.mode == "L"
+
+def test_preprocess_image_encodes_at_the_given_quality():
+    # Arrange: A noisy image
+    data = noisy_image((400, 400))
+
+    # Act: Encode it at low and high quality
+    low = preprocess_image(data, max_edge=400, grayscale=False, quality=20)
+    high = preprocess_image(data, max_edge=400, grayscale=False, quality=95)
+
+    # Assert: Lower quality gives fewer bytes
+    assert len(low) < len(high)
+
+def test_preprocess_image_returns_none_for_undecodable_input():
+    # Act / Assert: Bytes that are not an image (or a truncated one) give None
+    assert preprocess_image(b"\x89PNG\r\n\x1a\nnot really a png", max_edge=400, grayscale=True, quality=80) is None
+    assert preprocess_image(noisy_image((200, 200))[:100], max_edge=400, grayscale=True, quality=80) is None
+
+@pytest.mark.asyncio
+async def test_image_preprocessor_replaces_larger_originals():
+    # Arrange: A large PNG, and a preprocessor with one worker process
+    preprocessor = ImagePreprocessor(True, max_edge=400, grayscale=True, quality=80, processes=1)
+    original = io.BytesIO(noisy_image((1200, 900)))
+
+    # Act: Process it
+    try:
+        processed, mime_type = await preprocessor.process(original, "image/png")
+    finally:
+        preprocessor.close()
+
+    # Assert: A smaller in-memory JPEG replaces it, and the metrics count it
+    assert processed is not original
+    assert mime_type == "image/jpeg"
+    assert decode(processed.getvalue()).size == (400, 300)
+    stats = preprocessor.stats()
+    assert stats["images"] == 1
+    assert stats["bytes_saved"] == len(original.getvalue()) - len(processed.getvalue())
+
+@pytest.mark.asyncio
+async def test_image_preprocessor_keeps_undecodable_originals():
+    # Arrange: Bytes that only look like a PNG
+    preprocessor = ImagePreprocessor(True, max_edge=400, grayscale=True, quality=80, processes=1)
+    original = io.BytesIO(b"\x89PNG\r\n\x1a\nnot really a png")
+
+    # Act: Process it
+    try:
+        processed, mime_type = await preprocessor.process(original, "image/png")
+    finally:
+        preprocessor.close()
+
+    # Assert: The original is uploaded as received
+    assert processed is original
+    assert mime_type == "image/png"
+    assert preprocessor.stats()["skipped"] == 1
+
+@pytest.mark.asyncio
+async def test_disabled_image_preprocessor_does_not_read_the_image():
+    # Arrange: A disabled preprocessor and an image file part way through
+    preprocessor = ImagePreprocessor(False, max_edge=400, grayscale=True, quality=80, processes=1)
+    original = io.BytesIO(noisy_image((1200, 900)))
+    original.seek(5)
+
+    # Act: Process it
+    processed, mime_type = await preprocessor.process(original, "image/png")
+
+    # Assert: Passed through untouched
+    assert processed is original
+    assert original.tell() == 5
+    assert mime_type == "image/png"
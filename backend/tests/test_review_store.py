@@ -0,0 +1,87 @@
+import pytest
+import review_store
+from review_store import ReviewStore
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    # The store reads time.monotonic(); swap the module's `time` for a clock the test moves
+    clock = FakeClock()
+    monkeypatch.setattr(review_store, "time", clock)
+    return clock
+
+def test_sessions_expire_after_the_ttl(clock):
+    # Arrange: Two sessions, one of them read again before the TTL runs out
+    store = ReviewStore(ttl_seconds=60, max_sessions=10, max_bytes=1000)
+    store.add_numbers("10.0.0.1", ["415-555-0101"])
+    store.add_numbers("10.0.0.2", ["415-555-0102"])
+    clock.now += 50
+    assert store["10.0.0.2"] == ["415-555-0102"]  # Renews its TTL
+
+    # Act: Move past the first session's TTL and sweep
+    clock.now += 20
+    removed = store.sweep()
+
+    # Assert: Only the untouched session expired
+    assert removed == 1
+    assert "10.0.0.1" not in store
+    assert store.copy() == {"10.0.0.2": ["415-555-0102"]}
+
+def test_expired_session_starts_over(clock):
+    # Arrange: A session that expires without a sweep
+    store = ReviewStore(ttl_seconds=60, max_sessions=10, max_bytes=1000)
+    store.add_numbers("10.0.0.1", ["415-555-0101"])
+    clock.now += 61
+
+    # Act: The client uploads again
+    added = store.add_numbers("10.0.0.1", ["415-555-0103"])
+
+    # Assert: The old numbers are gone, the new session has only the new one
+    assert added == ["415-555-0103"]
+    assert store["10.0.0.1"] == ["415-555-0103"]
+
+def test_one_session_per_client_without_duplicates(clock):
+    # Arrange: A client uploading overlapping numbers twice
+    store = ReviewStore(ttl_seconds=60, max_sessions=10, max_bytes=1000)
+    store.add_numbers("10.0.0.1", ["415-555-0101", "415-555-0102"])
+
+    # Act: Upload again with one number already under review
+    added = store.add_numbers("10.0.0.1", ["415-555-0102", "415-555-0103"])
+
+    # Assert: Only the new number is added, in upload order
+    assert added == ["415-555-0103"]
+    assert store["10.0.0.1"] == ["415-555-0101", "415-555-0102", "415-555-0103"]
+    assert len(store) == 1
+
+def test_session_cap_evicts_least_recently_used(clock):
+    # Arrange: A full store whose oldest session was read since
+    store = ReviewStore(ttl_seconds=60, max_sessions=2, max_bytes=1000)
+    store.add_numbers("10.0.0.1", ["415-555-0101"])
+    store.add_numbers("10.0.0.2", ["415-555-0102"])
+    store["10.0.0.1"]
+
+    # Act: A third client adds numbers
+    store.add_numbers("10.0.0.3", ["415-555-0103"])
+
+    # Assert: The least recently used session made room
+    assert set(store) == {"10.0.0.1", "10.0.0.3"}
+
+def test_byte_bound_evicts_least_recently_used(clock):
+    # Arrange: Room for two sessions of one number each (8 + 12 bytes apiece)
+    store = ReviewStore(ttl_seconds=60, max_sessions=10, max_bytes=45)
+    store.add_numbers("10.0.0.1", ["415-555-0101"])
+    store.add_numbers("10.0.0.2", ["415-555-0102"])
+
+    # Act: One session grows past the bound
+    store.add_numbers("10.0.0.2", ["415-555-0103"])
+
+    # Assert: The other (older) session is evicted, never the one being written
+    assert set(store) == {"10.0.0.2"}
+    store.add_numbers("10.0.0.2", ["415-555-0104", "415-555-0105"])
+    assert store["10.0.0.2"] == ["415-555-0102", "415-555-0103", "415-555-0104", "415-555-0105"]
@@ -0,0 +1,107 @@
+import importlib.util
+import pytest
+import config
+import storage
+from models.index import PhoneNumber
+
+def load_worker(name: str):
+    # A fresh copy of database.py, as each server worker process has its own
+    spec = importlib.util.spec_from_file_location(name, importlib.util.find_spec("database").origin)
+    worker = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(worker)
+    return worker
+
+@pytest.fixture
+def workers(tmp_path, monkeypatch):
+    # Two workers in multi-process mode over one SQLite file in tmp_path
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(config, "STORAGE_ENGINE", "sqlite")
+    monkeypatch.setattr(config, "SHARED_STORAGE", True)
+    monkeypatch.setattr(config, "PHONE_NUMBERS_HISTORY_FILE", str(tmp_path / "phone_numbers_history.log"))
+    monkeypatch.setattr(config, "EXTRACTION_CACHE_FILE", "")
+    monkeypatch.setattr(storage, "SQLITE_DB_FILE", str(tmp_path / "blazin.db"))
+    first, second = load_worker("database_worker_1"), load_worker("database_worker_2")
+    yield first, second
+    first.storage.close()
+    second.storage.close()
+
+def test_commit_in_one_worker_is_synced_by_the_other(workers):
+    # Arrange: Both workers start from the same (empty) database
+    first, second = workers
+    created = PhoneNumber(number="415-555-0190", has_redeem_value=True)
+    kept = PhoneNumber(number="415-555-0191", has_redeem_value=True)
+
+    # Act: The first worker creates two numbers and deletes one; the second catches up
+    with first.storage_transaction():
+        first.put_phone_number(created)
+        first.put_phone_number(kept)
+    with first.storage_transaction():
+        first.remove_phone_number(created.id)
+    second.sync_from_storage()
+
+    # Assert: The second worker sees the record, the deletion and the change sequence
+    assert set(second.phone_numbers_db) == {kept.id}
+    assert second.find_phone_number_id("415-555-0191") == kept.id
+    assert second.find_phone_number_id("415-555-0190") is None
+    assert second.phone_numbers_tombstones == {created.id: 3}
+    assert second.current_change_seq() == first.current_change_seq() == 3
+
+def test_transaction_assigns_sequences_after_the_other_workers_commit(workers):
+    # Arrange: A number created through the first worker
+    first, second = workers
+    with first.storage_transaction():
+        first.put_phone_number(PhoneNumber(number="415-555-0192", has_redeem_value=True))
+
+    # Act: The second worker writes without syncing first
+    created = PhoneNumber(number="415-555-0193", has_redeem_value=True)
+    with second.storage_transaction():
+        second.put_phone_number(created)
+    first.sync_from_storage()
+
+    # Assert: The transaction caught up before writing, so sequences form 1..N
+    assert created.change_seq == 2
+    assert set(first.phone_numbers_db) == set(second.phone_numbers_db)
+    assert [change_seq for _, change_seq in first.phone_number_changes_since(0)] == [1, 2]
+
+def test_reservation_in_one_worker_is_held_in_the_other(workers):
+    # Arrange: Two eligible numbers, visible to both workers
+    first, second = workers
+    phones = [PhoneNumber(number=f"415-555-019{digit}", has_redeem_value=True) for digit in (4, 5)]
+    with first.storage_transaction():
+        for phone in phones:
+            first.put_phone_number(phone)
+    second.sync_from_storage()
+    assert len(second.suggest_phone_numbers(10)) == 2  # Builds the second worker's queue
+
+    # Act: The first worker reserves one; the second syncs and reserves as many as it can
+    reserved, _ = first.reserve_phone_numbers(1, 60)
+    second.sync_from_storage()
+    suggested = second.suggest_phone_numbers(10)
+    reserved_by_second, _ = second.reserve_phone_numbers(10, 60)
+
+    # Assert: The second worker never hands out the number the first one holds
+    assert len(reserved) == 1
+    assert reserved[0] not in suggested
+    assert [phone.id for phone in reserved_by_second] == [phone.id for phone in phones if phone.id != reserved[0].id]
+
+def test_area_index_follows_local_and_synced_changes(workers):
+    # Arrange: Numbers in two area codes, created through the first worker
+    first, second = workers
+    moved = PhoneNumber(number="415-555-0196", has_redeem_value=True)
+    removed = PhoneNumber(number="415-555-0197", has_redeem_value=True)
+    other = PhoneNumber(number="650-555-0198", has_redeem_value=True)
+    with first.storage_transaction():
+        first.put_phone_numbers([moved, removed, other])
+
+    # Act: Move one number to another area code and delete another; the second worker syncs
+    with first.storage_transaction():
+        first.put_phone_number(moved.copy(update={"number": "808-555-0196"}))
+        first.remove_phone_number(removed.id)
+    second.sync_from_storage()
+
+    # Assert: Both workers list each area's numbers, and drop emptied areas
+    for worker in (first, second):
+        assert set(worker.iter_phone_number_ids_in_area("808")) == {moved.id}
+        assert set(worker.iter_phone_number_ids_in_area("650")) == {other.id}
+        assert list(worker.iter_phone_number_ids_in_area("415")) == []
+        assert "415" not in worker.phone_numbers_by_area
@@ -0,0 +1,74 @@
+import json
+import pytest
+from uuid import uuid4
+from models.index import PhoneNumber
+from snapshot import LazyPhoneNumberDict, encode_phone_number, read_binary_snapshot, write_binary_snapshot
+
+def phones() -> dict:
+    records = [
+        PhoneNumber(number="415-555-0120", has_redeem_value=True, change_seq=3, notes="front desk"),
+        PhoneNumber(number="415-555-0121", has_redeem_value=False, change_seq=7, amount_spent=12.5),
+    ]
+    return {phone.id: phone for phone in records}
+
+def test_binary_snapshot_round_trip(tmp_path):
+    # Arrange: Two records written to a snapshot
+    path = str(tmp_path / "phone_numbers.snap")
+    original = phones()
+    write_binary_snapshot(path, original)
+
+    # Act: Read it back
+    loaded = read_binary_snapshot(path)
+
+    # Assert: Numbers and change sequences come from the table; records hydrate intact
+    assert dict(loaded.numbers()) == {phone_id: phone.number for phone_id, phone in original.items()}
+    assert dict(loaded.change_seqs()) == {phone_id: phone.change_seq for phone_id, phone in original.items()}
+    assert all(isinstance(entry, tuple) for entry in loaded._entries.values())  # Nothing parsed yet
+    assert {phone_id: loaded[phone_id] for phone_id in loaded} == original
+
+def test_rejects_unknown_snapshot_format(tmp_path):
+    # Arrange: A file that is not a snapshot
+    path = tmp_path / "phone_numbers.snap"
+    path.write_bytes(b"NOTASNAP" + bytes(8))
+
+    # Act / Assert: Reading it fails instead of returning garbage
+    with pytest.raises(ValueError):
+        read_binary_snapshot(str(path))
+
+def test_lazy_dict_hydrates_on_first_access():
+    # Arrange: Raw records as a parsed dict and as JSON text
+    phone_db = LazyPhoneNumberDict()
+    first, second = phones().values()
+    phone_db.add_raw(first.id, first.number, first.change_seq, json.loads(encode_phone_number(first)))
+    phone_db.add_raw(second.id, "", second.change_seq, encode_phone_number(second).decode())
+
+    # Act: Read one record and list the numbers
+    hydrated = phone_db[first.id]
+    numbers = dict(phone_db.numbers())
+
+    # Assert: Only accessed records become models (a record without a table number is
+    # hydrated to read it)
+    assert hydrated == first
+    assert phone_db._entries[first.id] is hydrated
+    assert numbers == {first.id: first.number, second.id: second.number}
+
+def test_lazy_dict_copy_and_raw_records():
+    # Arrange: A raw record, and a copy taken before a change
+    phone_db = LazyPhoneNumberDict()
+    phone = next(iter(phones().values()))
+    payload = encode_phone_number(phone)
+    phone_db.add_raw(phone.id, phone.number, phone.change_seq, payload)
+    clone = phone_db.copy()
+
+    # Act: Replace the record and add another in the original
+    updated = phone.copy(update={"notes": "moved", "change_seq": 9})
+    phone_db[phone.id] = updated
+    phone_db[uuid4()] = PhoneNumber(number="415-555-0123", has_redeem_value=True)
+
+    # Assert: The copy is unaffected and still hands out the payload verbatim
+    assert len(clone) == 1
+    assert list(clone.raw_records()) == [(phone.id, phone.number, phone.change_seq, payload)]
+    assert len(phone_db) == 2
+    assert phone_db[phone.id].notes == "moved"
+    del phone_db[phone.id]
+    assert phone.id not in phone_db
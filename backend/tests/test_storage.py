@@ -0,0 +1,261 @@
+import threading
+import time
+from uuid import uuid4
+from models.index import PhoneNumber
+from storage import JsonStorage, SqliteStorage
+
+def phone(number: str, change_seq: int = 0, **fields) -> PhoneNumber:
+    return PhoneNumber(number=number, has_redeem_value=True, change_seq=change_seq, **fields)
+
+def json_storage(directory, phone_db=None, tombstones=None, mode="journal", snapshot_format="binary", checkpoint_every=1000) -> JsonStorage:
+    return JsonStorage(
+        str(directory / "phone_numbers_db.json"),
+        str(directory / "phone_numbers_db.snap"),
+        snapshot_format,
+        str(directory / "phone_numbers_tombstones.json"),
+        str(directory / "gemini_flash8b_temp_db.json"),
+        str(directory / "phone_numbers_db.log"),
+        mode,
+        checkpoint_every,
+        False,
+        lambda: phone_db if phone_db is not None else {},
+        lambda: tombstones if tombstones is not None else {},
+    )
+
+# ------------------------------------------------------
+# SQLite engine
+# ------------------------------------------------------
+def test_sqlite_save_and_load_round_trip(tmp_path):
+    # Arrange: A table, tombstones and a review buffer saved to a database
+    storage = SqliteStorage(str(tmp_path / "blazin.db"))
+    records = [phone("415-555-0140", change_seq=1, notes="front desk"), phone("415-555-0141", change_seq=2)]
+    deleted_id = uuid4()
+    storage.save_phone_numbers({record.id: record for record in records}, {deleted_id: 3})
+    storage.save_gemini_temp({"10.0.0.1": ["415-555-0142"]})
+    storage.close()
+
+    # Act: Reopen the database and load everything
+    reopened = SqliteStorage(str(tmp_path / "blazin.db"))
+    loaded = reopened.load_phone_numbers()
+
+    # Assert: Every record, tombstone and review session comes back
+    assert {phone_id: loaded[phone_id] for phone_id in loaded} == {record.id: record for record in records}
+    assert reopened.load_tombstones() == {deleted_id: 3}
+    assert reopened.load_gemini_temp() == {"10.0.0.1": ["415-555-0142"]}
+    reopened.close()
+
+def test_sqlite_changes_since_include_tombstones_in_order(tmp_path):
+    # Arrange: Two puts, then one of them deleted
+    storage = SqliteStorage(str(tmp_path / "blazin.db"))
+    first, second = phone("415-555-0143", change_seq=1), phone("415-555-0144", change_seq=2)
+    storage.apply_phone_number_changes([first, second], [])
+    storage.apply_phone_number_changes([], [(first.id, 3)])
+
+    # Act: Read the changes after the first sequence number
+    changes = storage.load_changes_since(1)
+
+    # Assert: The put of the second record, then the tombstone of the first (no data)
+    assert [(seq, phone_id) for seq, phone_id, _ in changes] == [(2, second.id), (3, first.id)]
+    assert PhoneNumber.parse_raw(changes[0][2]) == second
+    assert changes[1][2] is None
+    assert storage.load_changes_since(3) == []
+    storage.close()
+
+def test_sqlite_imports_an_existing_json_store_once(tmp_path):
+    # Arrange: A JSON store with a record, a tombstone and a review session
+    record = phone("415-555-0145", change_seq=1)
+    deleted_id = uuid4()
+    source = json_storage(tmp_path)
+    source.save_phone_numbers({record.id: record}, {deleted_id: 2})
+    source.save_gemini_temp({"10.0.0.1": ["415-555-0146"]})
+    storage = SqliteStorage(str(tmp_path / "blazin.db"))
+
+    # Act: Open the new database against it, then again after the database changed
+    imported = storage.import_once(json_storage(tmp_path))
+    storage.apply_phone_number_changes([], [(record.id, 3)])
+    imported_again = storage.import_once(json_storage(tmp_path))
+
+    # Assert: The data is copied over the first time only
+    assert imported is True
+    assert imported_again is False
+    assert len(storage.load_phone_numbers()) == 0
+    assert storage.load_tombstones() == {deleted_id: 2, record.id: 3}
+    assert storage.load_gemini_temp() == {"10.0.0.1": ["415-555-0146"]}
+    storage.close()
+
+def test_sqlite_does_not_import_into_a_database_in_use(tmp_path):
+    # Arrange: A JSON store, and a database that already has records of its own
+    source = json_storage(tmp_path)
+    old = phone("415-555-0147")
+    source.save_phone_numbers({old.id: old}, {})
+    storage = SqliteStorage(str(tmp_path / "blazin.db"))
+    current = phone("415-555-0148")
+    storage.put_phone_number(current)
+
+    # Act: Open it against the JSON store
+    imported = storage.import_once(json_storage(tmp_path))
+
+    # Assert: The database is left as it is
+    assert imported is False
+    assert list(storage.load_phone_numbers()) == [current.id]
+    storage.close()
+
+def test_sqlite_exclusive_serialises_connections(tmp_path):
+    # Arrange: Two connections to one database (as two workers have)
+    path = str(tmp_path / "blazin.db")
+    first, second = SqliteStorage(path), SqliteStorage(path)
+    record = phone("415-555-0149", change_seq=1)
+    inside_first = threading.Event()
+    events = []
+
+    def write_slowly():
+        with first.exclusive():
+            inside_first.set()
+            time.sleep(0.3)
+            first.put_phone_number(record)
+            events.append("first committed")
+
+    # Act: While the first holds the write lock, the second starts its own transaction
+    writer = threading.Thread(target=write_slowly)
+    writer.start()
+    inside_first.wait()
+    with second.exclusive():
+        events.append("second entered")
+        seen = second.load_phone_numbers()
+    writer.join()
+
+    # Assert: The second waited for the first to commit, and read its write
+    assert events == ["first committed", "second entered"]
+    assert list(seen) == [record.id]
+    first.close()
+    second.close()
+
+def test_sqlite_exclusive_rolls_back_on_error(tmp_path):
+    # Arrange: A database
+    storage = SqliteStorage(str(tmp_path / "blazin.db"))
+
+    # Act: Fail halfway through a transaction
+    try:
+        with storage.exclusive():
+            storage.put_phone_number(phone("415-555-0150"))
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+
+    # Assert: Nothing was written
+    assert len(storage.load_phone_numbers()) == 0
+    storage.close()
+
+def test_sqlite_reservations_and_meta(tmp_path):
+    # Arrange: Two connections, reservations made through the first
+    path = str(tmp_path / "blazin.db")
+    first, second = SqliteStorage(path), SqliteStorage(path)
+    held, ended = uuid4(), uuid4()
+    first.save_reservations({held: 2000.0, ended: 1500.0}, now=1000.0)
+    version_before = second.data_version()
+
+    # Act: Save again once one of them ended, and read them from the second
+    first.save_reservations({}, now=1600.0)
+    reservations = second.load_reservations(now=1600.0)
+    first.save_gemini_temp({})
+
+    # Assert: Live reservations only; each save bumped its counter and the data version
+    assert reservations == {held: 2000.0}
+    assert second.load_meta() == {"reservations": 2, "gemini_temp": 1}
+    assert second.data_version() != version_before
+    first.close()
+    second.close()
+
+# ------------------------------------------------------
+# JSON engine: snapshot plus journal
+# ------------------------------------------------------
+def test_journal_replay_skips_a_torn_last_line(tmp_path):
+    # Arrange: Three journaled puts, then a crash in the middle of the next append
+    storage = json_storage(tmp_path)
+    records = [phone(f"415-555-015{digit}", change_seq=digit) for digit in (1, 2, 3)]
+    for record in records:
+        storage.put_phone_number(record)
+    storage.close()
+    with open(tmp_path / "phone_numbers_db.log", "a") as log:
+        log.write('{"op":"put","data":{"id":"')
+
+    # Act: Load the store again
+    loaded = json_storage(tmp_path).load_phone_numbers()
+
+    # Assert: Every complete record is recovered
+    assert {phone_id: loaded[phone_id] for phone_id in loaded} == {record.id: record for record in records}
+
+def test_journal_checkpoints_every_n_records(tmp_path):
+    # Arrange: A store that checkpoints every 3 records, over the dict it persists
+    phone_db = {}
+    storage = json_storage(tmp_path, phone_db, checkpoint_every=3)
+    log_path = tmp_path / "phone_numbers_db.log"
+
+    # Act: Write two records, then a third
+    for digit in (4, 5):
+        record = phone(f"415-555-015{digit}")
+        phone_db[record.id] = record
+        storage.put_phone_number(record)
+    log_before = log_path.read_text().count("\n")
+    record = phone("415-555-0156")
+    phone_db[record.id] = record
+    storage.put_phone_number(record)
+
+    # Assert: The third record folded the log into the snapshot
+    assert log_before == 2
+    assert not log_path.exists()
+    assert (tmp_path / "phone_numbers_db.snap").exists()
+    assert set(json_storage(tmp_path).load_phone_numbers()) == set(phone_db)
+
+def test_journal_replays_deletes_on_both_sides_of_a_checkpoint(tmp_path):
+    # Arrange: Records deleted before and after a checkpoint, as database.py does it
+    phone_db, tombstones = {}, {}
+    storage = json_storage(tmp_path, phone_db, tombstones, checkpoint_every=4)
+    records = [phone(f"415-555-016{digit}", change_seq=digit) for digit in range(5)]
+    for record in records[:3]:
+        phone_db[record.id] = record
+        storage.put_phone_number(record)
+    del phone_db[records[0].id]
+    tombstones[records[0].id] = 5
+    storage.delete_phone_number(records[0].id, 5)  # 4th record: checkpoint
+    for record in records[3:]:
+        phone_db[record.id] = record
+        storage.put_phone_number(record)
+    del phone_db[records[1].id]
+    tombstones[records[1].id] = 6
+    storage.delete_phone_number(records[1].id, 6)
+    storage.close()
+
+    # Act: Load the store again
+    reloaded = json_storage(tmp_path)
+    loaded = reloaded.load_phone_numbers()
+
+    # Assert: Both deletions hold, with their tombstones, and the rest is intact
+    assert set(loaded) == {record.id for record in records[2:]}
+    assert reloaded.load_tombstones() == {records[0].id: 5, records[1].id: 6}
+
+def test_journal_survives_a_crash_during_checkpoint(tmp_path, monkeypatch):
+    # Arrange: Journaled records, and a snapshot write that fails
+    phone_db, tombstones = {}, {}
+    storage = json_storage(tmp_path, phone_db, tombstones, checkpoint_every=3)
+    records = [phone(f"415-555-017{digit}", change_seq=digit) for digit in range(3)]
+    for record in records[:2]:
+        phone_db[record.id] = record
+        storage.put_phone_number(record)
+
+    def crash(path, phone_db):
+        raise OSError("disk full")
+    monkeypatch.setattr("storage.write_binary_snapshot", crash)
+
+    # Act: The third record triggers the checkpoint, which fails
+    phone_db[records[2].id] = records[2]
+    try:
+        storage.put_phone_number(records[2])
+    except OSError:
+        pass
+    storage.close()
+    monkeypatch.undo()
+
+    # Assert: The log was not truncated, so every record is still recovered
+    assert (tmp_path / "phone_numbers_db.log").read_text().count("\n") == 3
+    assert set(json_storage(tmp_path).load_phone_numbers()) == {record.id for record in records}
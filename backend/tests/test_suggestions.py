@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta, timezone
+from typing import Sequence
+from models.index import PhoneNumber, UsageCounters
+from suggestions import SuggestionQueue, DAY_SECONDS
+
+NOW = datetime(2026, 10, 14, 12, 0, tzinfo=timezone.utc)
+LIMITS = [(2, 1)]  # At most 2 uses per UTC day
+
+def phone(number: str, has_redeem_value: bool = True, used_at: Sequence[datetime] = ()) -> PhoneNumber:
+    usage = UsageCounters()
+    for timestamp in used_at:
+        usage = usage.record_use(timestamp)
+    return PhoneNumber(number=number, has_redeem_value=has_redeem_value, last_used=max(used_at, default=None), usage=usage)
+
+def test_orders_by_redeem_value_then_least_recently_used():
+    # Arrange: Numbers with and without redeem value, used at different times
+    queue = SuggestionQueue(LIMITS)
+    no_value = phone("415-555-0101", has_redeem_value=False)
+    recent = phone("415-555-0102", used_at=[NOW - timedelta(hours=1)])
+    older = phone("415-555-0103", used_at=[NOW - timedelta(days=3)])
+    never_used = phone("415-555-0104")
+    for number in (no_value, recent, older, never_used):
+        queue.update(number, NOW.timestamp())
+
+    # Act: Peek at all of them
+    best = queue.peek(10, NOW.timestamp())
+
+    # Assert: Redeem value first, least recently used first within each group
+    assert best == [never_used.id, older.id, recent.id, no_value.id]
+
+def test_number_used_up_today_is_eligible_tomorrow():
+    # Arrange: A number used twice today (the daily limit) and one used once
+    queue = SuggestionQueue(LIMITS)
+    used_up = phone("415-555-0105", used_at=[NOW - timedelta(hours=2), NOW - timedelta(hours=1)])
+    used_once = phone("415-555-0106", used_at=[NOW - timedelta(hours=1)])
+    queue.update(used_up, NOW.timestamp())
+    queue.update(used_once, NOW.timestamp())
+
+    # Act: Peek today, then at the start of the next UTC day
+    today = queue.peek(10, NOW.timestamp())
+    tomorrow = queue.peek(10, (NOW.timestamp() // DAY_SECONDS + 1) * DAY_SECONDS)
+
+    # Assert: The used-up number waits for the next day
+    assert today == [used_once.id]
+    assert set(tomorrow) == {used_up.id, used_once.id}
+
+def test_reserve_never_hands_out_a_number_twice():
+    # Arrange: Three eligible numbers, one of them re-indexed without changing
+    queue = SuggestionQueue(LIMITS)
+    numbers = [phone(f"415-555-010{digit}") for digit in (7, 8, 9)]
+    for number in numbers:
+        queue.update(number, NOW.timestamp())
+    queue.update(numbers[0], NOW.timestamp())
+    until = NOW.timestamp() + 300
+
+    # Act: Two clients reserve two numbers each, then one more once the reservations end
+    first = queue.reserve(2, NOW.timestamp(), until)
+    second = queue.reserve(2, NOW.timestamp(), until)
+    after = queue.peek(10, until)
+
+    # Assert: Reservations are disjoint and end on time
+    assert len(first) == 2
+    assert len(second) == 1
+    assert not set(first) & set(second)
+    assert queue.peek(10, NOW.timestamp()) == []
+    assert sorted(after) == sorted(number.id for number in numbers)
+
+def test_heaps_stay_bounded_under_repeated_updates():
+    # Arrange: 100 numbers
+    queue = SuggestionQueue(LIMITS)
+    numbers = [phone(f"415-555-{index:04d}") for index in range(100)]
+
+    # Act: Re-index each of them 1000 times, then remove half
+    for _ in range(1000):
+        for number in numbers:
+            queue.update(number, NOW.timestamp())
+    for number in numbers[:50]:
+        queue.remove(number.id)
+
+    # Assert: Stale heap items never outnumber live ones more than two to one
+    assert len(queue) == 50
+    assert len(queue._ready) + len(queue._waiting) <= 3 * len(queue)
+    assert sorted(queue.peek(100, NOW.timestamp())) == sorted(number.id for number in numbers[50:])
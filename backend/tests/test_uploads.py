@@ -0,0 +1,112 @@
+import io
+import pytest
+from fastapi import HTTPException
+from uploads import _capped_stream, _write_multipart_files
+
+BOUNDARY = b"----blazin7Xq"
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) + b"\r\n--not the boundary\r\n"
+
+def multipart(*parts: tuple) -> bytes:
+    # parts: (field name, file name or None, content)
+    body = b"preamble ignored by clients\r\n"
+    for name, file_name, content in parts:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{file_name}"' if file_name else "")
+        body += b"--" + BOUNDARY + b"\r\n"
+        body += f"Content-Disposition: {disposition}\r\n".encode()
+        if file_name:
+            body += b"Content-Type: image/png\r\n"
+        body += b"\r\n" + content + b"\r\n"
+    return body + b"--" + BOUNDARY + b"--\r\n"
+
+async def chunked(body: bytes, size: int):
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+async def read_files(body: bytes, chunk_size: int = 64, max_files: int = 10) -> tuple:
+    files = []
+    def open_file(name: str):
+        files.append((name, io.BytesIO()))
+        return files[-1][1]
+    count = await _write_multipart_files(chunked(body, chunk_size), BOUNDARY, open_file, max_files)
+    return count, [(name, buffer.getvalue()) for name, buffer in files]
+
+class FakeRequest:
+    def __init__(self, body: bytes, headers: dict):
+        self.body = body
+        self.headers = headers
+
+    async def stream(self):
+        async for chunk in chunked(self.body, 10):
+            yield chunk
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64])
+async def test_file_part_survives_any_chunking(chunk_size):
+    # Arrange: A form field, then a file whose bytes look like a delimiter in places
+    body = multipart(("note", None, b"front desk"), ("file", "photo.png", PNG))
+
+    # Act: Parse it with the body split into chunks of every size
+    count, files = await read_files(body, chunk_size)
+
+    # Assert: The form field is skipped and the file comes out byte for byte
+    assert count == 1
+    assert files == [("photo.png", PNG)]
+
+@pytest.mark.asyncio
+async def test_reads_every_file_part_in_order():
+    # Arrange: Two files around a form field
+    body = multipart(("file", "first.png", PNG), ("note", None, b"x"), ("file", "second.png", PNG[::-1]))
+
+    # Act: Parse it
+    count, files = await read_files(body, chunk_size=5)
+
+    # Assert: Both files, in order
+    assert count == 2
+    assert files == [("first.png", PNG), ("second.png", PNG[::-1])]
+
+@pytest.mark.asyncio
+async def test_stops_at_max_files():
+    # Arrange: Three files
+    body = multipart(*[("file", f"{index}.png", PNG) for index in range(3)])
+
+    # Act: Parse it, taking two
+    count, files = await read_files(body, max_files=2)
+
+    # Assert: The first two only
+    assert count == 2
+    assert [name for name, _ in files] == ["0.png", "1.png"]
+
+@pytest.mark.asyncio
+async def test_rejects_oversized_part_headers():
+    # Arrange: A part whose headers never end
+    body = b"--" + BOUNDARY + b"\r\nContent-Disposition: form-data; name=\"file\"; filename=\"" + b"a" * (17 * 1024)
+
+    # Act / Assert: Parsing fails with 400 instead of buffering without limit
+    with pytest.raises(HTTPException) as error:
+        await read_files(body)
+    assert error.value.status_code == 400
+
+@pytest.mark.asyncio
+async def test_capped_stream_rejects_a_declared_oversized_body():
+    # Arrange: A body whose Content-Length is over the cap
+    request = FakeRequest(b"x" * 10, {"content-length": "101"})
+
+    # Act / Assert: 413 before anything is read
+    with pytest.raises(HTTPException) as error:
+        await anext(_capped_stream(request, 100))
+    assert error.value.status_code == 413
+
+@pytest.mark.asyncio
+async def test_capped_stream_rejects_an_undeclared_oversized_body():
+    # Arrange: A streamed body without Content-Length, one byte over the cap
+    request = FakeRequest(b"x" * 101, {})
+
+    # Act: Read as much as is allowed
+    received = []
+    with pytest.raises(HTTPException) as error:
+        async for chunk in _capped_stream(request, 100):
+            received.append(chunk)
+
+    # Assert: 413 once the cap is exceeded, after only the chunks within it
+    assert error.value.status_code == 413
+    assert sum(len(chunk) for chunk in received) == 100